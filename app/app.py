@@ -1,4 +1,5 @@
 from flask import jsonify
+import click
 import datetime
 from zoneinfo import ZoneInfo
 from .config import config
@@ -6,6 +7,7 @@ from flask_cors import CORS
 from .services.system import get_service_information
 from .services.core import get_flask_app
 from .services.system import system_check
+from .services.database import release_unit_of_work
 
 app = get_flask_app()
 app.config["SECRET_KEY"] = config.FLASK_SECRET_KEY
@@ -17,6 +19,9 @@ app.config["JWT_COOKIE_HTTPONLY"] = True
 app.config["JWT_COOKIE_CSRF_PROTECT"] = True
 app.url_map.strict_slashes = False
 
+# return the request-scoped database connection to the pool
+app.teardown_appcontext(release_unit_of_work)
+
 # ENDPOINTS FROM BLUEPRINTS
 from .routes.system import bp_system
 app.register_blueprint(bp_system, url_prefix="/")
@@ -45,6 +50,9 @@ app.register_blueprint(bp_equipment_set_components, url_prefix="/equipment_set_c
 from .routes.equipment_set_activity import bp_equipment_set_activity
 app.register_blueprint(bp_equipment_set_activity, url_prefix="/equipment_set_activity")
 
+from .routes.events import bp_events
+app.register_blueprint(bp_events, url_prefix="/events")
+
 # ANALYTICS ENDPOINTS
 from .routes.analytics import bp_analytics
 app.register_blueprint(bp_analytics, url_prefix="/analytics")
@@ -61,6 +69,63 @@ def status():
     }
     return jsonify(data)
 
+# rebuild the analytics rollups from the raw logs: flask --app app.app rebuild-rollups [--days N]
+@app.cli.command("rebuild-rollups")
+@click.option("--days", type=int, default=None, help="Only recount the last N days")
+def rebuild_rollups(days):
+    from .services.rollups import ROLLUP_TABLES, ensure_rollup_tables, rebuild_rollup
+
+    since = (datetime.date.today() - datetime.timedelta(days=days)) if days is not None else None
+    if not ensure_rollup_tables():
+        raise SystemExit(1)
+    for source in ROLLUP_TABLES:
+        if not rebuild_rollup(source, since)['success']:
+            raise SystemExit(1)
+
+
+# re-evaluate the materialized health flag of every equipment set: flask --app app.app rebuild-health
+@app.cli.command("rebuild-health")
+def rebuild_health():
+    from .services.equipment_health import ensure_health_table, rebuild_health
+
+    if not ensure_health_table() or not rebuild_health()['success']:
+        raise SystemExit(1)
+
+
+# move log rows older than RETENTION_HOT_DAYS into monthly archive tables: flask --app app.app archive-logs [--table T]
+@app.cli.command("archive-logs")
+@click.option("--table", "tables", multiple=True, help="Only archive this log table (repeatable)")
+@click.option("--max-batches", type=int, default=None, help="Stop after N batches per table")
+def archive_logs(tables, max_batches):
+    from .services.retention import RETAINED_TABLES, run_archive, drop_expired_archives
+
+    for source in tables or RETAINED_TABLES:
+        if source not in RETAINED_TABLES:
+            raise click.BadParameter(f"must be one of {', '.join(RETAINED_TABLES)}", param_hint="--table")
+        if not run_archive(source, max_batches)['success'] or not drop_expired_archives(source)['success']:
+            raise SystemExit(1)
+
+
+# fold per-field equipment activity rows (live and archived) into one row per edit, after switching
+# ACTIVITY_STORAGE to diff: flask --app app.app migrate-activity-diffs [--batch-size N]
+@app.cli.command("migrate-activity-diffs")
+@click.option("--batch-size", type=int, default=1000, help="Legacy rows per transaction")
+def migrate_activity_diffs(batch_size):
+    from .services.activity_diffs import migrate_legacy_activity
+
+    if not migrate_legacy_activity(batch_size)['success']:
+        raise SystemExit(1)
+
+
+# add the (created_at, id) index the activity listing pages on, once per database: flask --app app.app index-activity
+@app.cli.command("index-activity")
+def index_activity():
+    from .routes.equipment_set_activity import ensure_keyset_index
+
+    if not ensure_keyset_index()['success']:
+        raise SystemExit(1)
+
+
 # setup CORS for all endpoint
 CORS(app, origins=config.WEB_CLIENT_HOSTS, supports_credentials=True)
 
@@ -27,6 +27,15 @@ class Config:
     MAIL_SERVER_PORT = os.environ.get("MAIL_SERVER_PORT", "123")
     MAIL_ADDRESS = os.environ.get("MAIL_ADDRESS", "changeme@example.com")
     MAIL_PASSKEY =  os.environ.get("MAIL_PASSKEY", "XXX XXXX XXX")
+    MAIL_STARTTLS = os.getenv("MAIL_STARTTLS", "true").lower() in ("1", "true", "yes", "on")
+    MAIL_TIMEOUT_SECONDS = os.environ.get("MAIL_TIMEOUT_SECONDS", 30)
+    MAIL_QUEUE_SIZE = os.environ.get("MAIL_QUEUE_SIZE", 1000)
+    MAIL_BATCH_SIZE = os.environ.get("MAIL_BATCH_SIZE", 50)
+    MAIL_MAX_ATTEMPTS = os.environ.get("MAIL_MAX_ATTEMPTS", 5)
+    MAIL_RETRY_BACKOFF_SECONDS = os.environ.get("MAIL_RETRY_BACKOFF_SECONDS", 5)
+    MAIL_RETRY_BACKOFF_MAX_SECONDS = os.environ.get("MAIL_RETRY_BACKOFF_MAX_SECONDS", 300)
+    MAIL_KEEPALIVE_SECONDS = os.environ.get("MAIL_KEEPALIVE_SECONDS", 30)
+    MAIL_IDLE_CLOSE_SECONDS = os.environ.get("MAIL_IDLE_CLOSE_SECONDS", 120)
 
     # default admin email
     ROOT_ADMIN_USERNAME = os.environ.get("ROOT_ADMIN_USERNAME", "root")
@@ -43,6 +52,59 @@ class Config:
     MYSQL_DB = os.environ.get("MYSQL_DATABASE", "system_database")
     MYSQL_USER = os.environ.get("MYSQL_USER", "root")
     MYSQL_PASSWORD = os.environ.get("MYSQL_PASSWORD", "changeme123")
+    MYSQL_STATEMENT_CACHE_SIZE = os.environ.get("MYSQL_STATEMENT_CACHE_SIZE", 64)
+    MYSQL_STREAM_FETCH_SIZE = os.environ.get("MYSQL_STREAM_FETCH_SIZE", 500)
+    MYSQL_POOL_DRAIN_SECONDS = os.environ.get("MYSQL_POOL_DRAIN_SECONDS", 60)
+    MYSQL_BATCH_CHUNK_SIZE = os.environ.get("MYSQL_BATCH_CHUNK_SIZE", 500)
+    ROLLUP_REFRESH_SECONDS = os.environ.get("ROLLUP_REFRESH_SECONDS", 60)
+    ANALYTICS_CACHE_TTL_SECONDS = os.environ.get("ANALYTICS_CACHE_TTL_SECONDS", 60)
+    ANALYTICS_CACHE_MAX_ENTRIES = os.environ.get("ANALYTICS_CACHE_MAX_ENTRIES", 256)
+    TIMESERIES_MAX_BUCKETS = os.environ.get("TIMESERIES_MAX_BUCKETS", 10000)
+    ACTIVE_ACCOUNTS_EXACT = os.getenv("ACTIVE_ACCOUNTS_EXACT", "false").lower() in ("1", "true", "yes", "on")
+    ACTIVE_ACCOUNTS_HLL_PRECISION = os.environ.get("ACTIVE_ACCOUNTS_HLL_PRECISION", 12)
+    ACTIVE_ACCOUNTS_BUCKET_SECONDS = os.environ.get("ACTIVE_ACCOUNTS_BUCKET_SECONDS", 300)
+    ACTIVE_ACCOUNTS_REFRESH_SECONDS = os.environ.get("ACTIVE_ACCOUNTS_REFRESH_SECONDS", 10)
+    ACTIVE_ACCOUNTS_OVERLAP_SECONDS = os.environ.get("ACTIVE_ACCOUNTS_OVERLAP_SECONDS", 60)
+    EVENTS_HISTORY_SIZE = os.environ.get("EVENTS_HISTORY_SIZE", 500)
+    EVENTS_CLIENT_QUEUE_SIZE = os.environ.get("EVENTS_CLIENT_QUEUE_SIZE", 100)
+    EVENTS_POLL_SECONDS = os.environ.get("EVENTS_POLL_SECONDS", 2)
+    EVENTS_HEARTBEAT_SECONDS = os.environ.get("EVENTS_HEARTBEAT_SECONDS", 15)
+    EVENTS_MAX_SUBSCRIBERS = os.environ.get("EVENTS_MAX_SUBSCRIBERS", 16)
+    ACTIVITY_STORAGE = os.environ.get("ACTIVITY_STORAGE", "rows").lower()
+    ACTIVITY_WRITE_BEHIND = os.getenv("ACTIVITY_WRITE_BEHIND", "false").lower() in ("1", "true", "yes", "on")
+    ACTIVITY_QUEUE_SIZE = os.environ.get("ACTIVITY_QUEUE_SIZE", 10000)
+    ACTIVITY_QUEUE_BATCH_SIZE = os.environ.get("ACTIVITY_QUEUE_BATCH_SIZE", 500)
+    ACTIVITY_QUEUE_FLUSH_SECONDS = os.environ.get("ACTIVITY_QUEUE_FLUSH_SECONDS", 1)
+    ACTIVITY_QUEUE_PUT_TIMEOUT_SECONDS = os.environ.get("ACTIVITY_QUEUE_PUT_TIMEOUT_SECONDS", 2)
+    ACTIVITY_JOURNAL_DIR = os.environ.get("ACTIVITY_JOURNAL_DIR", "var/activity_journal")
+    ACTIVITY_JOURNAL_SEGMENT_SIZE = os.environ.get("ACTIVITY_JOURNAL_SEGMENT_SIZE", 5000)
+    RETENTION_HOT_DAYS = os.environ.get("RETENTION_HOT_DAYS", 90)
+    RETENTION_ARCHIVE_MONTHS = os.environ.get("RETENTION_ARCHIVE_MONTHS", 0)
+    RETENTION_BATCH_SIZE = os.environ.get("RETENTION_BATCH_SIZE", 1000)
+    RETENTION_BATCH_PAUSE_SECONDS = os.environ.get("RETENTION_BATCH_PAUSE_SECONDS", 0.5)
+    DASHBOARD_MAX_WORKERS = os.environ.get("DASHBOARD_MAX_WORKERS", 4)
+    DASHBOARD_WIDGET_TIMEOUT_SECONDS = os.environ.get("DASHBOARD_WIDGET_TIMEOUT_SECONDS", 10)
+
+    # read replica (optional, reads use the primary when unset)
+    MYSQL_REPLICA_HOST = os.environ.get("MYSQL_REPLICA_HOST", "")
+    MYSQL_REPLICA_PORT = os.environ.get("MYSQL_REPLICA_PORT") or MYSQL_PORT
+    MYSQL_REPLICA_USER = os.environ.get("MYSQL_REPLICA_USER") or MYSQL_USER
+    MYSQL_REPLICA_PASSWORD = os.environ.get("MYSQL_REPLICA_PASSWORD") or MYSQL_PASSWORD
+    MYSQL_REPLICA_POOL_SIZE = os.environ.get("MYSQL_REPLICA_POOL_SIZE") or MYSQL_POOL_SIZE
+    MYSQL_REPLICA_RETRY_SECONDS = os.environ.get("MYSQL_REPLICA_RETRY_SECONDS", 30)
+
+    # circuit breaker around the primary pool
+    DB_CIRCUIT_FAILURE_THRESHOLD = os.environ.get("DB_CIRCUIT_FAILURE_THRESHOLD", 3)
+    DB_CIRCUIT_PROBE_SECONDS = os.environ.get("DB_CIRCUIT_PROBE_SECONDS", 5)
+    DB_CIRCUIT_PROBE_MAX_SECONDS = os.environ.get("DB_CIRCUIT_PROBE_MAX_SECONDS", 60)
+    DB_CIRCUIT_HALF_OPEN_CALLS = os.environ.get("DB_CIRCUIT_HALF_OPEN_CALLS", 1)
+    DB_CIRCUIT_HALF_OPEN_TIMEOUT_SECONDS = os.environ.get("DB_CIRCUIT_HALF_OPEN_TIMEOUT_SECONDS", 30)
+
+    # slow query log
+    DB_SLOW_QUERY_MS = os.environ.get("DB_SLOW_QUERY_MS", 500)
+    DB_SLOW_QUERY_EXPLAIN = os.getenv("DB_SLOW_QUERY_EXPLAIN", "true").lower() in ("1", "true", "yes", "on")
+    DB_SLOW_QUERY_SAMPLE_RATE = os.environ.get("DB_SLOW_QUERY_SAMPLE_RATE", 0.1)
+    DB_SLOW_QUERY_EXPLAIN_COOLDOWN = os.environ.get("DB_SLOW_QUERY_EXPLAIN_COOLDOWN", 300)
 
     # web client
     WEB_CLIENT_HOSTS = strippers(os.environ.get("WEB_CLIENT_HOSTS"))
@@ -1,18 +1,25 @@
+from datetime import timedelta
 from flask import Blueprint, jsonify, request
 from ..services.jwt import require_access
 from ..services import database
 from flask_jwt_extended import jwt_required
-from ..services.validation import check_order_parameter, common_success_response, common_database_error_response
+from ..services.retention import log_relation
+from ..services.validation import check_order_parameter, check_date_filters, check_export_format, is_columnar_request, common_success_response, common_success_stream_response, common_export_response, common_database_error_response
 from ..config import config
 
 bp_account_logs = Blueprint("account_logs", __name__)
 
-@bp_account_logs.route("/", methods=["GET"])
-@jwt_required()
-@require_access("guest")
-def get():
+def _account_logs_query(start_at, end_at, archives: bool):
+    """Filtered account log query (without ORDER BY) and its params, shared by the listing and the export."""
+    relation, relation_params = ("account_logs", ())
+    if archives:
+        # end_date is inclusive
+        relation, relation_params = log_relation(
+            "account_logs", start_at, end_at + timedelta(microseconds=1) if end_at is not None else None
+        )
+
     # setup base query
-    base_query = """
+    base_query = f"""
         SELECT
             al.id,
             al.account_id,
@@ -20,20 +27,20 @@ def get():
             al.created_at,
             a.username AS account_username,
             CONCAT_WS(' ', a.first_name, a.middle_name, a.last_name) AS account_full_name
-        FROM account_logs AS al
+        FROM {relation} AS al
         INNER JOIN accounts AS a
-            ON al.account_id = a.id;
+            ON al.account_id = a.id
     """
 
     # CONDITIONALS
     conditional_query = []
-    conditional_params = []
+    conditional_params = list(relation_params)
 
 
     # filter by id
     if 'id' in request.args and request.args.get('id').isdigit():
         conditional_query.append("al.id = %s")
-        conditional_params.append()
+        conditional_params.append(request.args.get('id'))
 
     
     # filter by account id
@@ -48,10 +55,34 @@ def get():
         conditional_params.append(request.args.get('action'))
 
 
+    # filter by date, end_date inclusive
+    if start_at is not None:
+        conditional_query.append("al.created_at >= %s")
+        conditional_params.append(start_at)
+    if end_at is not None:
+        conditional_query.append("al.created_at <= %s")
+        conditional_params.append(end_at)
+
+
     # build conditional query
     if conditional_query:
         base_query += " WHERE " + " AND ".join(conditional_query)
-        
+
+    return base_query, conditional_params
+
+
+@bp_account_logs.route("/", methods=["GET"])
+@jwt_required()
+@require_access("guest")
+def get():
+    (start_at, end_at), error_response = check_date_filters()
+    if error_response:
+        return error_response
+
+    # only a date filter reaches into the archive months
+    base_query, conditional_params = _account_logs_query(
+        start_at, end_at, archives=start_at is not None or end_at is not None
+    )
 
     # ORDERING OF RECORDS BY RECENTLY CREATED
     if 'order' in request.args:
@@ -61,15 +92,43 @@ def get():
     # closing statements
     base_query += ";"
 
-    # execute query
-    account_logs_fetch = database.fetch_all(base_query, tuple(conditional_params))
+    # execute query (streamed, the log has no upper bound)
+    columnar = is_columnar_request()
+    account_logs_fetch = database.fetch_iter(base_query, tuple(conditional_params), compact=columnar)
 
     # query fails
     if not account_logs_fetch['success']:
         return common_database_error_response(account_logs_fetch)
 
     # success
-    return common_success_response(account_logs_fetch['data'])
+    rows = account_logs_fetch['data']
+    return common_success_stream_response(rows, columns=rows.column_names if columnar else None)
+
+
+
+@bp_account_logs.route("/export", methods=["GET"])
+@jwt_required()
+@require_access("guest")
+def export():
+    (start_at, end_at), error_response = check_date_filters()
+    if error_response:
+        return error_response
+
+    export_format, error_response = check_export_format()
+    if error_response:
+        return error_response
+
+    # full history: archived months included, oldest first
+    base_query, conditional_params = _account_logs_query(start_at, end_at, archives=True)
+    base_query += " ORDER BY al.created_at, al.id;"
+
+    account_logs_fetch = database.fetch_iter(base_query, tuple(conditional_params), compact=True)
+
+    # query fails
+    if not account_logs_fetch['success']:
+        return common_database_error_response(account_logs_fetch)
+
+    return common_export_response(account_logs_fetch['data'], "account_logs", export_format)
 
 
 
@@ -88,12 +147,16 @@ def get_recent_account_logs():
     """
 
     # execute query
-    account_logs_fetch_recent = database.fetch_all(base_query)
+    columnar = is_columnar_request()
+    account_logs_fetch_recent = database.fetch_all(base_query, compact=columnar)
 
     # query fails
     if not account_logs_fetch_recent["success"]:
         return common_database_error_response(account_logs_fetch_recent)
 
+    if columnar:
+        return common_success_response(account_logs_fetch_recent["data"])
+
     # fetch rows
     data = account_logs_fetch_recent["data"]
 
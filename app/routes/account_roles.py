@@ -5,6 +5,7 @@ from ..services import database
 from flask_jwt_extended import jwt_required
 from ..config import config
 from ..services.validation import check_json_payload, check_required_fields, check_order_parameter, common_success_response, common_error_response, common_database_error_response
+from ..services.analytics_cache import invalidates
 
 bp_account_roles = Blueprint("account_roles", __name__)
 
@@ -65,6 +66,7 @@ def get():
 
 @bp_account_roles.route("/", methods=["POST"])
 @require_access('root', exact=True)
+@invalidates("account_roles")
 def add():
     # Validate JSON payload
     data, error_response = check_json_payload()
@@ -125,6 +127,7 @@ def add():
 
 @bp_account_roles.route("/<id>", methods=["PUT"])
 @require_access('root')
+@invalidates("account_roles")
 def edit(id):
     data = request.get_json()
 
@@ -177,6 +180,7 @@ def edit(id):
 # hard delete
 @bp_account_roles.route("/<id>", methods=["DELETE"])
 @require_access('root')
+@invalidates("account_roles")
 def delete(id):
 
     target_role_check = database.fetch_scalar('select access_level from account_roles where account_roles.id = %s;', (id, ))
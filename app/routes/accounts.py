@@ -5,7 +5,10 @@ from ..services.security import generate_id, generate_username, generate_default
 from werkzeug.security import generate_password_hash
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from ..config import config
-from ..services.validation import check_json_payload, check_required_fields, check_order_parameter, common_success_response, common_error_response, common_database_error_response
+from datetime import timedelta
+from ..services.validation import check_json_payload, check_required_fields, check_order_parameter, is_columnar_request, common_success_response, common_error_response, common_database_error_response
+from ..services.analytics_cache import cached, invalidates
+from ..services.distinct_counter import count_active_accounts
 
 bp_accounts = Blueprint("accounts", __name__)
 
@@ -78,7 +81,7 @@ def get(id=None):
     base_query += ";"
 
     # execute query
-    accounts_fetch = database.fetch_all(base_query, tuple(conditional_params))
+    accounts_fetch = database.fetch_all(base_query, tuple(conditional_params), compact=is_columnar_request())
 
     # query fails
     if not accounts_fetch['success']:
@@ -90,6 +93,7 @@ def get(id=None):
 
 @bp_accounts.route("/", methods=["POST"])
 @require_access('admin')
+@invalidates("accounts")
 def add():
     # Validate JSON payload
     data, error_response = check_json_payload()
@@ -169,6 +173,7 @@ def add():
 @bp_accounts.route("/", methods=["PUT"])
 @bp_accounts.route("/<id>", methods=["PUT"])
 @require_access('root')
+@invalidates("accounts")
 def edit(id=None):
     # Validate JSON payload
     data, error_response = check_json_payload()
@@ -245,6 +250,7 @@ def edit(id=None):
 # handle delete
 @bp_accounts.route("/<id>", methods=["DELETE"])
 @require_access('root')
+@invalidates("accounts")
 def delete(id):
 
     current_user_id = get_jwt_identity()
@@ -282,6 +288,7 @@ def delete(id):
 # ANALYTICSSSSS ==================================================================
 
 @bp_accounts.route("/analytics/total", methods=["GET"])
+@cached("accounts")
 def analytics_total():
     query = """
         SELECT COUNT(id) AS data
@@ -299,16 +306,11 @@ def analytics_total():
     return common_success_response(accounts_analytics_fetch_total['data'])
 
 @bp_accounts.route("/analytics/total_active", methods=["GET"])
+@cached("account_logs")
 def analytics_total_active():
-    query = """
-        SELECT COUNT(DISTINCT account_id) AS total
-        FROM account_logs
-        WHERE action = 'login'
-          AND created_at >= NOW() - INTERVAL 1 HOUR;
-    """
-
-    # execute query
-    accounts_analytics_fetch_total_active = database.fetch_scalar(query)
+    # distinct accounts that logged in during the last hour (?exact=true skips the sketch)
+    exact = request.args.get("exact", "").lower() in ("1", "true")
+    accounts_analytics_fetch_total_active = count_active_accounts(timedelta(hours=1), logins_only=True, exact=exact)
 
     # query fails
     if not accounts_analytics_fetch_total_active['success']:
@@ -319,19 +321,15 @@ def analytics_total_active():
 
 
 @bp_accounts.route("/analytics/total_activity", methods=["GET"])
+@cached("account_logs")
 def analytics_total_activity():
-    query = """
-        SELECT COUNT(DISTINCT account_id) AS total
-        FROM account_logs
-        WHERE created_at >= NOW() - INTERVAL 24 HOUR;
-    """
-
-    # execute query
-    accounts_analytics_fetch_total_activity = database.fetch_scalar(query)
+    # distinct accounts with any activity during the last 24 hours
+    exact = request.args.get("exact", "").lower() in ("1", "true")
+    accounts_analytics_fetch_total_activity = count_active_accounts(timedelta(hours=24), exact=exact)
 
     # query fails
     if not accounts_analytics_fetch_total_activity['success']:
         return common_database_error_response(accounts_analytics_fetch_total_activity)
     
     # success
-    return common_success_response(accounts_analytics_fetch_total_activity['data'])
\ No newline at end of file
+    return common_success_response(accounts_analytics_fetch_total_activity['data'])
@@ -1,33 +1,30 @@
-from flask import Blueprint, jsonify, request
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from flask import Blueprint, current_app, jsonify, request, url_for
 from .. services import database
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from ..config import config
 from datetime import datetime, timedelta
+from ..services.log import log
+from ..services.equipment_health import count_with_issues, location_breakdown
+from ..services.timeseries import fetch_timeseries, parse_range
+from ..services.rollups import ACCOUNT_LOGS, EQUIPMENT_SET_ACTIVITY, fetch_daily_totals
 from ..services.validation import check_json_payload, check_required_fields, check_order_parameter, common_success_response, common_error_response, common_database_error_response
+from ..services.analytics_cache import cached
 
 bp_analytics = Blueprint("analytics", __name__)
 
 @bp_analytics.route("/line/account-logins/week", methods=["GET"])
+@cached("account_logs")
 def account_logins_week():
     start_date = (datetime.now() - timedelta(days=6)).date()
 
-    query = f"""
-        SELECT 
-            DATE(created_at) AS day,
-            COUNT(*) AS logins
-        FROM account_logs
-        WHERE action = 'login'
-          AND DATE(created_at) >= '{start_date}'
-        GROUP BY DATE(created_at)
-        ORDER BY DATE(created_at)
-    """
-
-    results = database.fetch_all(query)
+    results = fetch_daily_totals(ACCOUNT_LOGS, start_date, action="login")
     if not results or "data" not in results:
         return common_error_response("Result not found")
 
     labels = [r["day"].strftime("%a") for r in results["data"]]
-    data = [r["logins"] for r in results["data"]]
+    data = [int(r["total"]) for r in results["data"]]
 
     return common_success_response(data={
         "labels": labels,
@@ -42,25 +39,16 @@ def account_logins_week():
 
 
 @bp_analytics.route("/line/account-activities/week", methods=["GET"])
+@cached("account_logs")
 def account_activities_week():
     start_date = (datetime.now() - timedelta(days=6)).date()
 
-    query = f"""
-        SELECT 
-            DATE(created_at) AS day,
-            COUNT(*) AS activities
-        FROM account_logs
-        WHERE DATE(created_at) >= '{start_date}'
-        GROUP BY DATE(created_at)
-        ORDER BY DATE(created_at)
-    """
-
-    results = database.fetch_all(query)
+    results = fetch_daily_totals(ACCOUNT_LOGS, start_date)
     if not results or "data" not in results:
         return common_error_response("Result not found")
 
     labels = [r["day"].strftime("%a") for r in results["data"]]
-    data = [r["activities"] for r in results["data"]]
+    data = [int(r["total"]) for r in results["data"]]
 
     return common_success_response(data={
         "labels": labels,
@@ -75,25 +63,16 @@ def account_activities_week():
 
 
 @bp_analytics.route("/line/equipment-activities/week", methods=["GET"])
+@cached("equipment_set_activity")
 def equipment_activities_week():
     start_date = (datetime.now() - timedelta(days=6)).date()
 
-    query = f"""
-        SELECT 
-            DATE(created_at) AS day,
-            COUNT(*) AS activities
-        FROM equipment_set_activity
-        WHERE DATE(created_at) >= '{start_date}'
-        GROUP BY DATE(created_at)
-        ORDER BY DATE(created_at)
-    """
-
-    results = database.fetch_all(query)
+    results = fetch_daily_totals(EQUIPMENT_SET_ACTIVITY, start_date)
     if not results or "data" not in results:
         return common_error_response("Result not found")
 
     labels = [r["day"].strftime("%a") for r in results["data"]]
-    data = [r["activities"] for r in results["data"]]
+    data = [int(r["total"]) for r in results["data"]]
 
     return common_success_response(data={
         "labels": labels,
@@ -108,25 +87,16 @@ def equipment_activities_week():
 
 
 @bp_analytics.route("/bar/equipment-activities/daily", methods=["GET"])
+@cached("equipment_set_activity")
 def equipment_activities_daily():
     start_date = (datetime.now() - timedelta(days=6)).date()
 
-    query = f"""
-        SELECT 
-            DATE(created_at) AS day,
-            COUNT(*) AS total_updates
-        FROM equipment_set_activity
-        WHERE DATE(created_at) >= '{start_date}'
-        GROUP BY DATE(created_at)
-        ORDER BY DATE(created_at)
-    """
-
-    results = database.fetch_all(query)
+    results = fetch_daily_totals(EQUIPMENT_SET_ACTIVITY, start_date)
     if not results or "data" not in results:
         return common_error_response("Result not found")
 
     labels = [r["day"].strftime("%a") for r in results["data"]]
-    data = [r["total_updates"] for r in results["data"]]
+    data = [int(r["total"]) for r in results["data"]]
 
     return common_success_response(data={
         "labels": labels,
@@ -139,6 +109,7 @@ def equipment_activities_daily():
 
 
 @bp_analytics.route("/bar/equipment/location", methods=["GET"])
+@cached("equipment_sets", "locations")
 def equipment_per_location():
     query = """
         SELECT 
@@ -168,45 +139,16 @@ def equipment_per_location():
 
 
 @bp_analytics.route("/pie/equipment/issues-ratio", methods=["GET"])
+@cached("equipment_sets", "equipment_set_components")
 def equipment_issues_ratio():
-    query = """
-        SELECT
-            COUNT(DISTINCT es.id) AS total_equipment_sets,
-            COUNT(DISTINCT CASE
-                WHEN 
-                    es.plugged_power_cable = FALSE
-                    OR es.plugged_display_cable = FALSE
-                    OR es.connectivity = 'unstable'
-                    OR es.performance = 'unstable'
-                    OR es.status = 'maintenance'
-                    OR es.issue IS NOT NULL
-                    OR (
-                        esc.system_unit_name IS NULL OR esc.system_unit_name = '' 
-                        OR esc.system_unit_serial_number IS NULL OR esc.system_unit_serial_number = ''
-                        OR esc.monitor_name IS NULL OR esc.monitor_name = '' 
-                        OR esc.monitor_serial_number IS NULL OR esc.monitor_serial_number = ''
-                        OR esc.keyboard_name IS NULL OR esc.keyboard_name = '' 
-                        OR esc.keyboard_serial_number IS NULL OR esc.keyboard_serial_number = ''
-                        OR esc.mouse_name IS NULL OR esc.mouse_name = '' 
-                        OR esc.mouse_serial_number IS NULL OR esc.mouse_serial_number = ''
-                        OR (es.requires_avr = TRUE AND (esc.avr_name IS NULL OR esc.avr_name = '' OR esc.avr_serial_number IS NULL OR esc.avr_serial_number = ''))
-                        OR (es.requires_headset = TRUE AND (esc.headset_name IS NULL OR esc.headset_name = '' OR esc.headset_serial_number IS NULL OR esc.headset_serial_number = ''))
-                    )
-                THEN es.id
-            END) AS equipment_sets_with_issues
-        FROM equipment_sets AS es
-        LEFT JOIN equipment_set_components AS esc
-            ON es.id = esc.equipment_set_id;
-    """
-
-    result = database.fetch_one(query)
+    result = count_with_issues()
     
     if not result or "data" not in result or not result["data"]:
         return common_error_response("Result not found")
 
     data_row = result["data"]
-    total = data_row.get("total_equipment_sets", 0)
-    with_issue = data_row.get("equipment_sets_with_issues", 0)
+    total = data_row.get("total", 0)
+    with_issue = data_row.get("issues", 0)
     complete = total - with_issue
     ratio = round(with_issue / total, 2) if total > 0 else 0.0
 
@@ -221,4 +163,150 @@ def equipment_issues_ratio():
             "total_equipment_sets": total,
             "ratio_with_issues": ratio
         }
-    })
\ No newline at end of file
+    })
+
+
+@bp_analytics.route("/locations/health", methods=["GET"])
+@cached("equipment_sets", "equipment_set_components", "locations")
+def locations_health():
+    results = location_breakdown()
+    if not results['success']:
+        return common_database_error_response(results)
+
+    return common_success_response(data=results['data'])
+
+
+@bp_analytics.route("/timeseries/<source>", methods=["GET"])
+@cached("account_logs", "equipment_set_activity", "equipment_sets")
+def timeseries(source):
+    try:
+        start_at, end_at = parse_range(request.args.get("start"), request.args.get("end"))
+        results = fetch_timeseries(
+            source,
+            start_at,
+            end_at,
+            bucket=request.args.get("bucket", "day"),
+            group_by=request.args.get("group_by") or None
+        )
+    except ValueError as err:
+        return common_error_response(str(err))
+
+    if not results['success']:
+        return common_database_error_response(results)
+
+    return common_success_response(data=results['data'])
+
+
+# DASHBOARD ==================================================================
+
+# widget name -> endpoint that renders it
+DASHBOARD_WIDGETS = {
+    "accounts_total": "accounts.analytics_total",
+    "accounts_total_active": "accounts.analytics_total_active",
+    "accounts_total_activity": "accounts.analytics_total_activity",
+    "locations_total": "locations.analytics_total",
+    "equipment_sets_total": "equipment_sets.analytics_total",
+    "equipment_sets_ratio": "equipment_sets.analytics_ratio_issues",
+    "equipment_sets_issues_total": "equipment_sets.analytics_issues_total",
+    "account_logins_week": "analytics.account_logins_week",
+    "account_activities_week": "analytics.account_activities_week",
+    "equipment_activities_week": "analytics.equipment_activities_week",
+    "equipment_activities_daily": "analytics.equipment_activities_daily",
+    "equipment_per_location": "analytics.equipment_per_location",
+    "equipment_issues_ratio": "analytics.equipment_issues_ratio",
+    "locations_health": "analytics.locations_health",
+    "recent_account_logs": "account_logs.get_recent_account_logs",
+    "recent_equipment_activity": "equipment_set_activity.get_recent_equipment_activity",
+}
+
+# bounded so a dashboard load never holds more than this many pool connections
+_dashboard_executor = ThreadPoolExecutor(max_workers=int(config.DASHBOARD_MAX_WORKERS), thread_name_prefix="dashboard-widget")
+
+
+def _render_widget(app, endpoint: str, path: str, headers: dict, query_string: dict):
+    # a fresh request context per widget: its own `g`, so its own pooled connection, matched
+    # on the widget's own path so request.endpoint and view_args are the widget's
+    with app.test_request_context(path, headers=headers, query_string=query_string):
+        started = time.perf_counter()
+        try:
+            response = app.make_response(app.view_functions[endpoint](**(request.view_args or {})))
+            body = response.get_json(silent=True) or {}
+            widget = {
+                "success": response.status_code < 400 and body.get("success", True),
+                "status": response.status_code,
+                "data": body.get("data"),
+            }
+            if not widget["success"]:
+                widget["error"] = body.get("error") or body.get("msg")
+        except Exception as err:
+            log.error("DASHBOARD", f"Widget {endpoint} failed: {err!r}")
+            widget = {"success": False, "status": 500, "data": None, "error": str(err)}
+
+        widget["ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return widget
+
+
+@bp_analytics.route("/dashboard", methods=["GET"])
+def dashboard():
+    requested = request.args.get("widgets")
+    names = [name.strip() for name in requested.split(",") if name.strip()] if requested else list(DASHBOARD_WIDGETS)
+
+    unknown = [name for name in names if name not in DASHBOARD_WIDGETS]
+    if unknown:
+        return common_error_response(
+            message="Unknown dashboard widget/s",
+            details={"unknown": unknown, "available": list(DASHBOARD_WIDGETS)}
+        )
+
+    app = current_app._get_current_object()
+    headers = {key: value for key, value in request.headers.items() if key.lower() in ("authorization", "cookie")}
+    query_string = {key: value for key, value in request.args.items() if key != "widgets"}
+
+    started = time.perf_counter()
+    timeout = float(config.DASHBOARD_WIDGET_TIMEOUT_SECONDS)
+    submitted = time.monotonic()
+    started_at = {}
+    paths = {name: url_for(DASHBOARD_WIDGETS[name]) for name in names}
+
+    def render(name: str):
+        started_at[name] = time.monotonic()
+        return _render_widget(app, DASHBOARD_WIDGETS[name], paths[name], headers, query_string)
+
+    futures = {name: _dashboard_executor.submit(render, name) for name in dict.fromkeys(names)}
+
+    # each widget gets the whole timeout from when a worker picks it up, and may wait
+    # in the shared queue at most as long; queued ones past that are cancelled
+    expired = set()
+    while True:
+        now = time.monotonic()
+        deadlines = {}
+        for name, future in futures.items():
+            if future.done() or name in expired:
+                continue
+            deadline = started_at.get(name, submitted) + timeout
+            if deadline > now:
+                deadlines[future] = deadline
+            elif name in started_at or future.cancel():
+                expired.add(name)
+            else:
+                # picked up just now
+                deadlines[future] = now + timeout
+        if not deadlines:
+            break
+        wait(deadlines, timeout=min(deadlines.values()) - now, return_when=FIRST_COMPLETED)
+
+    # one slow or failing widget never fails the whole dashboard
+    widgets = {}
+    for name, future in futures.items():
+        if future.cancelled():
+            widgets[name] = {"success": False, "status": 503, "data": None, "error": "Dashboard busy, widget not started"}
+        elif future.done():
+            widgets[name] = future.result()
+        else:
+            # still running: it finishes in the background and frees its worker then
+            widgets[name] = {"success": False, "status": 504, "data": None, "error": "Widget timed out"}
+
+    return common_success_response(data={
+        "widgets": widgets,
+        "ms": round((time.perf_counter() - started) * 1000, 2)
+    })
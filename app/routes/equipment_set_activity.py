@@ -1,14 +1,82 @@
+from datetime import timedelta
 from flask import Blueprint, request
+from ..config import config
 from ..services import database
+from ..services.activity_queue import activity_queue
+from ..services.log import log
+from ..services.rollups import EQUIPMENT_SET_ACTIVITY, record_activity
+from ..services.equipment_health import refresh_health
+from ..services.event_stream import publish_equipment_activity
+from ..services.activity_digest import LAST_EMAILED_TABLE, record_emailed
+from ..services.retention import log_relation
+from ..services.activity_diffs import EDITS_TABLE, FIELD_SLOTS, activity_source, expand, storing_diffs, record_edit, mark_emailed
 from flask_jwt_extended import jwt_required
-from ..services.validation import common_success_response, common_error_response, common_database_error_response, check_json_payload
+from ..services.validation import is_columnar_request, check_date_filters, check_export_format, check_page_limit, encode_cursor, decode_cursor, common_success_response, common_export_response, common_error_response, common_database_error_response, check_json_payload
+from ..services.analytics_cache import invalidates
 
 bp_equipment_set_activity = Blueprint("equipment_set_activity", __name__)
 
-@bp_equipment_set_activity.route("/", methods=["GET"])
-@jwt_required()
-def get_equipment_set_activities():
-    base_query = """
+def _end_bound(end_at):
+    # end_date is inclusive
+    return end_at + timedelta(microseconds=1) if end_at is not None else None
+
+
+def _paged_edits(start_at, end_at, archives: bool, position, limit: int):
+    """Diff storage: one page of edit rows, picked on the edits' own (created_at, id) index, then expanded.
+
+    Expanded rows sort like (edit created_at, edit id, field position), so the
+    cursor's edit is id DIV FIELD_SLOTS. Every edit expands to at least one
+    row: limit + 1 edits past the cursor's own edit always hold the page and
+    its lookahead row.
+    """
+    relation, params = (EDITS_TABLE, ())
+    if archives:
+        relation, params = log_relation(EDITS_TABLE, start_at, _end_bound(end_at))
+    params = list(params)
+
+    # the listing's filters that edit rows answer themselves
+    predicates = []
+    if request.args.get('id'):
+        predicates.append(f"e.id = %s DIV {FIELD_SLOTS}")
+        params.append(request.args.get('id'))
+    if request.args.get('account_id'):
+        predicates.append("e.performed_by_account_id = %s")
+        params.append(request.args.get('account_id'))
+    if request.args.get('equipment_set_id'):
+        predicates.append("e.equipment_set_id = %s")
+        params.append(request.args.get('equipment_set_id'))
+    if request.args.get('location_id'):
+        predicates.append("e.equipment_set_id IN (SELECT id FROM equipment_sets WHERE location_id = %s)")
+        params.append(request.args.get('location_id'))
+    if start_at is not None:
+        predicates.append("e.created_at >= %s")
+        params.append(start_at)
+    if end_at is not None:
+        predicates.append("e.created_at <= %s")
+        params.append(end_at)
+    if position is not None:
+        predicates.append(f"e.created_at <= %s AND (e.created_at, e.id) <= (%s, %s DIV {FIELD_SLOTS})")
+        params.extend([position[0], position[0], position[1]])
+
+    where = f" WHERE {' AND '.join(predicates)}" if predicates else ""
+    page = f"(SELECT * FROM {relation} AS e{where} ORDER BY e.created_at DESC, e.id DESC LIMIT %s)"
+    params.append(limit + 2 if position is not None else limit + 1)
+    return expand(page), tuple(params)
+
+
+def _activity_query(start_at, end_at, archives: bool, relation=None):
+    """Filtered activity log query (without ORDER BY) and its params, shared by the listing and the export.
+
+    `relation` replaces the activity source with another (relation, params) pair.
+    """
+    if relation is not None:
+        relation, relation_params = relation
+    elif archives:
+        relation, relation_params = log_relation("equipment_set_activity", start_at, _end_bound(end_at))
+    else:
+        relation, relation_params = (activity_source(), ())
+
+    base_query = f"""
         SELECT 
             eqsa.id AS id,
             eqsa.action,
@@ -21,7 +89,7 @@ def get_equipment_set_activities():
             es.id AS equipment_set_id,
             l.name AS location_name,
             l.id AS location_id
-        FROM equipment_set_activity AS eqsa
+        FROM {relation} AS eqsa
         JOIN accounts AS a ON eqsa.performed_by_account_id = a.id
         JOIN equipment_sets AS es ON eqsa.equipment_set_id = es.id
         JOIN locations AS l ON es.location_id = l.id
@@ -29,58 +97,133 @@ def get_equipment_set_activities():
 
     # --- CONDITIONALS ---
     conditional_query = []
-    conditional_params = {}
+    conditional_params = list(relation_params)
 
     # Optional filters
     if 'id' in request.args and request.args.get('id'):
-        conditional_query.append("eqsa.id = :id")
-        conditional_params['id'] = request.args.get('id')
+        conditional_query.append("eqsa.id = %s")
+        conditional_params.append(request.args.get('id'))
 
     if 'account_id' in request.args and request.args.get('account_id'):
-        conditional_query.append("eqsa.performed_by_account_id = :account_id")
-        conditional_params['account_id'] = request.args.get('account_id')
+        conditional_query.append("eqsa.performed_by_account_id = %s")
+        conditional_params.append(request.args.get('account_id'))
 
     if 'equipment_set_id' in request.args and request.args.get('equipment_set_id'):
-        conditional_query.append("eqsa.equipment_set_id = :equipment_set_id")
-        conditional_params['equipment_set_id'] = request.args.get('equipment_set_id')
+        conditional_query.append("eqsa.equipment_set_id = %s")
+        conditional_params.append(request.args.get('equipment_set_id'))
 
     if 'location_id' in request.args and request.args.get('location_id'):
-        conditional_query.append("l.id = :location_id")
-        conditional_params['location_id'] = request.args.get('location_id')
-
-    # --- Date filtering ---
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-
-    if start_date and end_date:
-        conditional_query.append("eqsa.created_at BETWEEN :start_date AND :end_date")
-        conditional_params['start_date'] = start_date
-        conditional_params['end_date'] = end_date
-    elif start_date:
-        conditional_query.append("eqsa.created_at >= :start_date")
-        conditional_params['start_date'] = start_date
-    elif end_date:
-        conditional_query.append("eqsa.created_at <= :end_date")
-        conditional_params['end_date'] = end_date
+        conditional_query.append("es.location_id = %s")
+        conditional_params.append(request.args.get('location_id'))
+
+    if start_at is not None:
+        conditional_query.append("eqsa.created_at >= %s")
+        conditional_params.append(start_at)
+    if end_at is not None:
+        conditional_query.append("eqsa.created_at <= %s")
+        conditional_params.append(end_at)
+
+    return base_query, conditional_query, conditional_params
+
+
+@bp_equipment_set_activity.route("/", methods=["GET"])
+@jwt_required()
+def get_equipment_set_activities():
+    (start_at, end_at), error_response = check_date_filters()
+    if error_response:
+        return error_response
+
+    # --- Paging: only when asked for, unpaged requests keep the full list response ---
+    paged = 'cursor' in request.args or 'limit' in request.args
+    limit, error_response = check_page_limit()
+    if error_response:
+        return error_response
+
+    position = None
+    cursor = request.args.get('cursor')
+    if cursor:
+        position = decode_cursor(cursor)
+        if position is None:
+            return common_error_response(message="Invalid cursor")
+
+    # only a date filter reaches into the archive months
+    archives = start_at is not None or end_at is not None
+    relation = _paged_edits(start_at, end_at, archives, position, limit) if paged and storing_diffs() else None
+    base_query, conditional_query, conditional_params = _activity_query(start_at, end_at, archives, relation)
+
+    # --- Keyset: continue after the last row of the previous page ---
+    if position is not None:
+        # the plain created_at bound gives the range scan on (created_at, id) something to seek on
+        conditional_query.append("eqsa.created_at <= %s AND (eqsa.created_at, eqsa.id) < (%s, %s)")
+        conditional_params.extend([position[0], position[0], position[1]])
 
     # --- Build WHERE clause ---
     if conditional_query:
         base_query += " WHERE " + " AND ".join(conditional_query)
 
-    # --- Sort and finalize ---
-    base_query += " ORDER BY eqsa.created_at DESC;"
+    # --- Sort and finalize (one extra row tells whether another page exists) ---
+    base_query += " ORDER BY eqsa.created_at DESC, eqsa.id DESC"
+    if paged:
+        base_query += " LIMIT %s"
+        conditional_params.append(limit + 1)
 
-    # --- Execute query ---
-    equipment_set_fetch = database.fetch_all(base_query, conditional_params)
+    columnar = is_columnar_request()
+    equipment_set_fetch = database.fetch_all(base_query + ";", tuple(conditional_params), compact=columnar)
 
     if not equipment_set_fetch['success']:
         return common_database_error_response(equipment_set_fetch)
 
-    return common_success_response(equipment_set_fetch['data'])
+    if not paged:
+        return common_success_response(equipment_set_fetch['data'])
+
+    if columnar:
+        page = equipment_set_fetch['data']
+        rows = page['rows']
+        position = page['columns'].index('created_at'), page['columns'].index('id')
+    else:
+        page = {}
+        rows = equipment_set_fetch['data']
+        position = 'created_at', 'id'
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last[position[0]], last[position[1]])
+
+    page['rows'] = rows
+    page['next_cursor'] = next_cursor
+    return common_success_response(page)
+
+
+@bp_equipment_set_activity.route("/export", methods=["GET"])
+@jwt_required()
+def export_equipment_set_activities():
+    (start_at, end_at), error_response = check_date_filters()
+    if error_response:
+        return error_response
+
+    export_format, error_response = check_export_format()
+    if error_response:
+        return error_response
+
+    # full history: archived months included, oldest first
+    base_query, conditional_query, conditional_params = _activity_query(start_at, end_at, archives=True)
+    if conditional_query:
+        base_query += " WHERE " + " AND ".join(conditional_query)
+    base_query += " ORDER BY eqsa.created_at, eqsa.id;"
+
+    equipment_set_fetch = database.fetch_iter(base_query, tuple(conditional_params), compact=True)
+
+    if not equipment_set_fetch['success']:
+        return common_database_error_response(equipment_set_fetch)
+
+    return common_export_response(equipment_set_fetch['data'], "equipment_set_activity", export_format)
 
 
 
 @bp_equipment_set_activity.route("/clear", methods=["POST"])
+@invalidates("equipment_set_activity")
 def clear_activities():
 
     data, error_response = check_json_payload()
@@ -94,6 +237,16 @@ def clear_activities():
             message="No Activities Provided"
         )
 
+    # ids are numeric; diff storage decodes them into edit row and field position
+    try:
+        if not isinstance(activity_list, list):
+            raise ValueError
+        activity_list = [int(activity_id) for activity_id in activity_list]
+    except (TypeError, ValueError):
+        return common_error_response(
+            message="cleared_activities must be a list of activity ids"
+        )
+
     # generate placeholders for each ID
     placeholders = ", ".join(["%s"] * len(activity_list))
 
@@ -105,10 +258,16 @@ def clear_activities():
         WHERE id IN ({placeholders})
     """
 
-    result = database.execute_single(query, tuple(activity_list))
+    # mark emailed and move the last-emailed values the digest compares against
+    with database.transaction() as tx:
+        if storing_diffs():
+            mark_emailed(activity_list)
+        else:
+            database.execute_single(query, tuple(activity_list))
+        record_emailed(activity_list)
 
-    if not result["success"]:
-        return common_database_error_response(result)
+    if not tx.success:
+        return common_database_error_response(tx.error)
 
     return common_success_response(
         data=True
@@ -118,7 +277,7 @@ def clear_activities():
 
 @bp_equipment_set_activity.route("/today/<location_id>", methods=["GET"])
 def get_today_logged_activities(location_id):
-    query = """
+    query = f"""
         SELECT 
             eqsa.id AS id,
             eqsa.action,
@@ -138,38 +297,39 @@ def get_today_logged_activities(location_id):
             es.id AS equipment_set_id,
             l.name AS location_name,
             l.id AS location_id
-        FROM equipment_set_activity AS eqsa
+        FROM {activity_source()} AS eqsa
         JOIN accounts AS a 
             ON eqsa.performed_by_account_id = a.id
         JOIN equipment_sets AS es 
             ON eqsa.equipment_set_id = es.id
         JOIN locations AS l 
             ON es.location_id = l.id
-        LEFT JOIN equipment_set_activity AS emailed_prev 
-            ON emailed_prev.id = (
-                SELECT ep2.id
-                FROM equipment_set_activity AS ep2
-                WHERE 
-                    ep2.equipment_set_id = eqsa.equipment_set_id
-                    AND ep2.action = eqsa.action
-                    AND ep2.status = 'emailed'
-                    AND ep2.created_at < eqsa.created_at
-                ORDER BY ep2.created_at DESC, ep2.id DESC
-                LIMIT 1
-            )
+        LEFT JOIN {LAST_EMAILED_TABLE} AS emailed_prev
+            ON emailed_prev.equipment_set_id = eqsa.equipment_set_id
+            AND emailed_prev.action = eqsa.action
         WHERE 
+            -- latest pending row per (set, action), looking at today's rows of this location only
             eqsa.id IN (
-                SELECT MAX(sub.id)
-                FROM equipment_set_activity AS sub
-                WHERE sub.status <> 'emailed'
-                GROUP BY sub.equipment_set_id, sub.action
+                SELECT latest.id FROM (
+                    SELECT MAX(sub.id) AS id
+                    FROM {activity_source()} AS sub
+                    JOIN equipment_sets AS sub_es
+                        ON sub.equipment_set_id = sub_es.id
+                    WHERE
+                        sub_es.location_id = %s
+                        AND sub.status <> 'emailed'
+                        AND sub.created_at >= CURDATE()
+                        AND sub.created_at < CURDATE() + INTERVAL 1 DAY
+                    GROUP BY sub.equipment_set_id, sub.action
+                ) AS latest
             )
+            -- same bound as the subquery, so the outer read is a created_at range too
+            AND eqsa.created_at >= CURDATE()
+            AND eqsa.created_at < CURDATE() + INTERVAL 1 DAY
             AND (
                 emailed_prev.value IS NULL  -- no previous emailed record
                 OR eqsa.value <> emailed_prev.value  -- value changed since last emailed
             )
-            AND DATE(eqsa.created_at) = CURDATE()
-            AND l.id = %s
         ORDER BY eqsa.created_at DESC;
     """
 
@@ -185,13 +345,13 @@ def get_today_logged_activities(location_id):
 @bp_equipment_set_activity.route("/recent", methods=["GET"])
 def get_recent_equipment_activity():
     # setup base query
-    base_query = """
+    base_query = f"""
     SELECT
         es.name AS equipment_set_name,
         a.username AS performed_by,
         esa.action,
         esa.value
-    FROM equipment_set_activity AS esa
+    FROM {activity_source()} AS esa
     JOIN accounts AS a
         ON esa.performed_by_account_id = a.id
     JOIN equipment_sets AS es
@@ -201,12 +361,16 @@ def get_recent_equipment_activity():
     """
 
     # execute query
-    equipment_set_activity_fetch_recent = database.fetch_all(base_query)
+    columnar = is_columnar_request()
+    equipment_set_activity_fetch_recent = database.fetch_all(base_query, compact=columnar)
 
     # query fails
     if not equipment_set_activity_fetch_recent["success"]:
         return common_database_error_response(equipment_set_activity_fetch_recent)
 
+    if columnar:
+        return common_success_response(equipment_set_activity_fetch_recent["data"])
+
     # fetch rows
     data = equipment_set_activity_fetch_recent["data"]
 
@@ -224,54 +388,107 @@ def get_recent_equipment_activity():
 
 # ================================================== Helper Functions
 
-def log_equipment_set_changes(account_id: str, equipment_set_id: str, old: dict, new: dict):
-
-    logs = []
-    log_types = [
-        'name'
-        'system_unit_name',
-        'monitor_name',
-        'keyboard_name',
-        'mouse_name',
-        'avr_name',
-        'headset_name',
-        'system_unit_serial',
-        'monitor_serial',
-        'keyboard_serial',
-        'mouse_serial',
-        'avr_serial',
-        'headset_serial',
-        'requires_avr',
-        'requires_headset',
-        'plugged_display_cable',
-        'plugged_power_cable',
-        'connectivity',
-        'performance',
-        'issue',
-        'status'
-    ]
-    updates = get_updates(old, new)
-    print(updates)
-
-    for key, value in updates:
-        if key not in log_types:
-            print("> ERROR LOG TYPE ISSUE")
-        logs.append(("insert into equipment_set_activity (performed_by_account_id, equipment_set_id, action, value) values (%s, %s, %s, %s)", (account_id, equipment_set_id, key, value)))
-
-    return log_to_database(logs)
-
-def log_equipment_component(data):
-    pass
+# backs the listing's keyset pages: ORDER BY created_at DESC, id DESC resuming after (created_at, id)
+KEYSET_INDEX = "idx_activity_created_at_id"
+
+
+def ensure_keyset_index() -> dict:
+    """Add the keyset index to equipment_set_activity unless information_schema already lists it.
+
+    Run as a deploy step (flask index-activity), not at startup: building it
+    reads the whole log. The build is online, so writers are not blocked.
+    """
+    present = database.fetch_scalar(
+        """
+            SELECT 1 FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+            LIMIT 1;
+        """,
+        ("equipment_set_activity", KEYSET_INDEX)
+    )
+    if not present['success'] or present['data'] is not None:
+        return present
+
+    created = database.execute_single(
+        f"ALTER TABLE equipment_set_activity ADD INDEX {KEYSET_INDEX} (created_at, id), ALGORITHM=INPLACE, LOCK=NONE;"
+    )
+    if not created['success']:
+        log.error("EQUIPMENT-ACTIVITY", f"Failed to create {KEYSET_INDEX}: {created['msg']}")
+        return created
+
+    log.inform("EQUIPMENT-ACTIVITY", f"Created {KEYSET_INDEX} on equipment_set_activity")
+    return created
+
+
+ACTIVITY_INSERT_QUERY = "insert into equipment_set_activity (performed_by_account_id, equipment_set_id, action, value) values (%s, %s, %s, %s)"
+
+
+def update_with_activity(account_id: str, equipment_set_id: str, table: str, key_column: str, changes: dict):
+    """Edit one row and record its activity in a single transaction.
+
+    The row is read with SELECT ... FOR UPDATE, diffed against `changes` in Python,
+    and only the changed columns are written. `data` is None when the row does
+    not exist, otherwise the list of (column, value) pairs that changed.
+    """
+    columns = list(changes)
+
+    with database.transaction() as tx:
+        locked = database.fetch_one(
+            f"select {', '.join(columns)} from {table} where {key_column} = %s for update;",
+            (equipment_set_id, )
+        )
+        current = locked.get('data')
+
+        updates = get_updates(current, changes) if current is not None else []
+
+        # no-op edits commit the read and nothing else
+        if updates:
+            assignments = ", ".join(f"{column} = %s" for column, _ in updates)
+            database.execute_single(
+                f"update {table} set {assignments} where {key_column} = %s;",
+                tuple(value for _, value in updates) + (equipment_set_id, )
+            )
+            if storing_diffs():
+                # a single row, written with the edit itself
+                record_edit(account_id, equipment_set_id, updates, current)
+                record_activity(EQUIPMENT_SET_ACTIVITY, [column for column, _ in updates])
+            elif not config.ACTIVITY_WRITE_BEHIND:
+                database.execute_many(
+                    ACTIVITY_INSERT_QUERY,
+                    [(account_id, equipment_set_id, column, value) for column, value in updates]
+                )
+                record_activity(EQUIPMENT_SET_ACTIVITY, [column for column, _ in updates])
+            refresh_health([equipment_set_id])
+
+    if not tx.success:
+        return tx.error
+
+    if config.ACTIVITY_WRITE_BEHIND and not storing_diffs() and updates:
+        # the edit is committed either way; the audit rows follow in the next batch
+        now = database.database_now()
+        queued = activity_queue.submit([(account_id, equipment_set_id, column, value, now) for column, value in updates])
+        if not queued['success']:
+            log.error("EQUIPMENT-ACTIVITY", f"Failed to log activity of {equipment_set_id}: {queued['msg']}")
+
+    publish_equipment_activity(account_id, equipment_set_id, updates)
+    return {"success": True, "data": updates if current is not None else None}
     
 
-def log_to_database(logs: list) -> bool:
-    return database.execute_transaction(logs)
+def _comparable(value):
+    # payloads send booleans and numbers where the database hands back ints and strings
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, str) and value.lower() in ("true", "false"):
+        return str(int(value.lower() == "true"))
+    return str(value)
 
 
 def get_updates(old_data: dict, new_data: dict):
     updated = []
     for key, new_value in new_data.items():
         old_value = old_data.get(key)
-        if old_value != new_value:
+        if _comparable(old_value) != _comparable(new_value):
             updated.append((key, new_value))
     return updated
@@ -2,11 +2,13 @@ from flask import Blueprint, jsonify, request
 from ..services.jwt import require_access
 from ..services.security import generate_id
 from ..services import database
+from ..services.equipment_health import refresh_health, count_with_issues
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from ..config import config
-from .equipment_set_components import initialize_equipment_set_components
-from .equipment_set_activity import log_equipment_set_changes
-from ..services.validation import check_json_payload, check_required_fields, common_success_response, common_error_response, common_database_error_response
+from .equipment_set_components import initialize_equipment_set_components, initialize_equipment_set_components_batch
+from .equipment_set_activity import update_with_activity
+from ..services.validation import check_json_payload, check_required_fields, is_columnar_request, common_success_response, common_error_response, common_database_error_response
+from ..services.analytics_cache import cached, invalidates
 
 bp_equipment_sets = Blueprint("equipment_sets", __name__)
 
@@ -69,7 +71,7 @@ def get():
     base_query += ";"
 
     # execute query
-    equipment_set_fetch = database.fetch_all(base_query, tuple(conditional_params))
+    equipment_set_fetch = database.fetch_all(base_query, tuple(conditional_params), compact=is_columnar_request())
 
     # query fails
     if not equipment_set_fetch['success']:
@@ -127,7 +129,7 @@ def get_full_location(location_id):
         ORDER BY CAST(REGEXP_REPLACE(eq_set.name, '[^0-9]', '') AS UNSIGNED);
     """
 
-    equipment_set_full_fetch = database.fetch_all(base_query, (location_id, ))
+    equipment_set_full_fetch = database.fetch_all(base_query, (location_id, ), compact=is_columnar_request())
 
     if not equipment_set_full_fetch['success']:
         return common_database_error_response(equipment_set_full_fetch)
@@ -138,6 +140,7 @@ def get_full_location(location_id):
 @bp_equipment_sets.route("/single", methods=["POST"])
 @jwt_required()
 @require_access('admin')
+@invalidates("equipment_sets", "equipment_set_components")
 def add_single():
     # Validate JSON payload
     data, error_response = check_json_payload()
@@ -178,12 +181,13 @@ def add_single():
         requires_headset
     )
 
-    equipment_set_added = database.execute_single(base_query, base_params)
+    with database.transaction() as tx:
+        database.execute_single(base_query, base_params)
+        initialize_equipment_set_components(id, data)
+        refresh_health([id])
 
-    initialize_equipment_set_components(id, data)
-
-    if not equipment_set_added['success']:
-        return common_database_error_response(equipment_set_added)
+    if not tx.success:
+        return common_database_error_response(tx.error)
 
     return common_success_response(
         data=True,
@@ -194,6 +198,7 @@ def add_single():
 @bp_equipment_sets.route("/batch", methods=["POST"])
 @jwt_required()
 @require_access('admin')
+@invalidates("equipment_sets", "equipment_set_components")
 def add_batch():
     # Validate JSON payload
     data, error_response = check_json_payload()
@@ -209,12 +214,18 @@ def add_batch():
     # Setup and fetch data
     location_id = data['location_id']
     prefix = data['prefix']
-    count = int(data['count'])
+
+    try:
+        count = int(data['count'])
+    except (TypeError, ValueError):
+        count = 0
+    if count < 1:
+        return common_error_response(message="count must be a positive integer")
 
     requires_avr = "true" if data.get('requires_avr') else "false"
     requires_headset = "true" if data.get('requires_headset') else "false"
 
-    # SQL query template
+    # SQL query template (batched into multi-row inserts by execute_many)
     base_query = """
         INSERT INTO equipment_sets
             (id, location_id, name, requires_avr, requires_headset)
@@ -222,50 +233,41 @@ def add_batch():
             (%s, %s, %s, %s, %s);
     """
 
-    added_sets = []
-    failed_sets = []
-
+    # locks the location's sets so concurrent batches cannot pick the same numbers
     query_fetch_latest_num = """
         SELECT COUNT(*) AS total_count
         FROM equipment_sets
-        WHERE equipment_sets.location_id = %s;
+        WHERE equipment_sets.location_id = %s
+        FOR UPDATE;
     """
 
-    highest = database.fetch_scalar(query_fetch_latest_num, (location_id, ))['data']
-
-    # Loop to add multiple equipment sets
-    for i in range(highest+1, highest + count + 1):
-        name = f"{prefix}{i}"
-        set_id = generate_id()
-
-        print(name)
-
-        params = (
-            set_id,
-            location_id,
-            name,
-            requires_avr,
-            requires_headset
-        )
-
-        result = database.execute_single(base_query, params)
-
-        if result['success']:
-            if initialize_equipment_set_components(set_id, data):
-                added_sets.append(name)
-        else:
-            failed_sets.append({
-                "name": name,
-                "error": result.get("error", "Unknown error")
-            })
-
-    # Generate response summary
-    if failed_sets:
-        return common_error_response(
-            message=f"Added {len(added_sets)} equipment sets successfully, "
-                    f"but {len(failed_sets)} failed.",
-            data={"added": added_sets, "failed": failed_sets}
-        )
+    # all or nothing: sets and their components commit together
+    with database.transaction() as tx:
+        highest = database.fetch_scalar(query_fetch_latest_num, (location_id, )).get('data') or 0
+
+        set_ids = []
+        added_sets = []
+        params_list = []
+        for i in range(highest + 1, highest + count + 1):
+            set_id = generate_id()
+            name = f"{prefix}{i}"
+
+            set_ids.append(set_id)
+            added_sets.append(name)
+            params_list.append((
+                set_id,
+                location_id,
+                name,
+                requires_avr,
+                requires_headset
+            ))
+
+        database.execute_many(base_query, params_list)
+        initialize_equipment_set_components_batch(set_ids, data)
+        refresh_health(set_ids)
+
+    if not tx.success:
+        return common_database_error_response(tx.error)
 
     return common_success_response(
         data={"added": added_sets},
@@ -275,6 +277,7 @@ def add_batch():
 
 @bp_equipment_sets.route("/<id>", methods=["PUT"])
 @require_access('admin')
+@invalidates("equipment_sets", "equipment_set_components", "equipment_set_activity")
 def edit(id):
     # Validate JSON payload
     data, error_response = check_json_payload()
@@ -298,65 +301,39 @@ def edit(id):
     issue = data.get('issue', '')
     
 
-    # prepare query and parameters
-    base_query = """
-        update equipment_sets set
-            equipment_sets.location_id = %s,
-            equipment_sets.name = %s,
-            equipment_sets.requires_avr = %s,
-            equipment_sets.requires_headset = %s,
-            equipment_sets.plugged_power_cable = %s,
-            equipment_sets.plugged_display_cable = %s,
-            equipment_sets.connectivity = %s,
-            equipment_sets.performance = %s,
-            equipment_sets.status = %s,
-            equipment_sets.issue = %s
-        
-        where
-            equipment_sets.id = %s
-    """
-
-    base_params = (
-        location_id,
-        name,
-        requires_avr,
-        requires_headset,
-        plugged_power_cable,
-        plugged_display_cable,
-        connectivity,
-        performance,
-        status,
-        issue,
-        id    
-    )
-    
-    old_data_fetched, old_data = fetch_equipment_sets(id)
-
-    equipment_set_updated = database.execute_single(base_query, base_params)
-
-    new_data_fetched, new_data = fetch_equipment_sets(id)
+    changes = {
+        "location_id": location_id,
+        "name": name,
+        "requires_avr": requires_avr,
+        "requires_headset": requires_headset,
+        "plugged_power_cable": plugged_power_cable,
+        "plugged_display_cable": plugged_display_cable,
+        "connectivity": connectivity,
+        "performance": performance,
+        "status": status,
+        "issue": issue,
+    }
+
+    # lock, diff, update and log in one transaction
+    account_id = get_jwt_identity()
+    equipment_set_updated = update_with_activity(account_id, id, "equipment_sets", "id", changes)
 
     if not equipment_set_updated['success']:
         return common_database_error_response(equipment_set_updated)
-    
-    if old_data_fetched and new_data_fetched and equipment_set_updated['success']:
-        account_id = get_jwt_identity()
-        logging = log_equipment_set_changes(account_id, id, old_data, new_data)
 
-        if(logging['success']):
-            print("Logging Complete", "- "*50)
-    else:
-        print("Logging Failed", "! "*50)
+    if equipment_set_updated['data'] is None:
+        return common_error_response(message="Equipment Set Not Found", status_code=404)
 
     return common_success_response(
         data=True,
-        message="Updated Equipment Set"
+        message="Updated Equipment Set" if equipment_set_updated['data'] else "No Changes to Equipment Set"
     )
 
 
 # hard delete
 @bp_equipment_sets.route("/<id>", methods=["DELETE"])
 @require_access('admin')
+@invalidates("equipment_sets", "equipment_set_components", "equipment_set_activity")
 def delete(id):
 
     # prepare query and parameters
@@ -368,12 +345,14 @@ def delete(id):
     base_params = (id, )
 
     # execute query
-    account_roles_deleted = database.execute_single(base_query, base_params)
+    with database.transaction() as tx:
+        database.execute_single(base_query, base_params)
+        refresh_health([id])
 
     # if fail
-    if not account_roles_deleted['success']:
+    if not tx.success:
         result = jsonify({
-            "msg": account_roles_deleted['msg']
+            "msg": tx.error['msg']
         })
         return result, 400
 
@@ -384,38 +363,10 @@ def delete(id):
     return result, 200
 
 
-def fetch_equipment_sets(id: str):
-    base_query = """
-        select
-            eq_set.id,
-            eq_set.location_id,
-            eq_set.name,
-            eq_set.requires_avr,
-            eq_set.requires_headset,
-            eq_set.plugged_power_cable,
-            eq_set.plugged_display_cable,
-            eq_set.connectivity,
-            eq_set.performance,
-            eq_set.status,
-            eq_set.issue
-        from equipment_sets as eq_set
-        where eq_set.id = %s;
-    """
-
-    # execute query
-    equipment_set_fetch = database.fetch_one(base_query, (id, ))
-
-    # query fails
-    if not equipment_set_fetch['success']:
-        return False, None
-
-    # success
-    return True, equipment_set_fetch['data']
-
-
 # ANALYTICSSSSS ==================================================================
 
 @bp_equipment_sets.route("/analytics/total", methods=["GET"])
+@cached("equipment_sets")
 def analytics_total():
     query = """
         SELECT COUNT(id) AS data
@@ -435,6 +386,7 @@ def analytics_total():
     return common_success_response(data=equipment_sets_analytics_fetch_total['data'])
 
 @bp_equipment_sets.route("/analytics/total/location/<location_id>", methods=["GET"])
+@cached("equipment_sets")
 def analytics_total_per_location(location_id):
     query = """
         SELECT COUNT(id) AS data
@@ -454,42 +406,10 @@ def analytics_total_per_location(location_id):
 
 
 @bp_equipment_sets.route("/analytics/ratio", methods=["GET"])
+@cached("equipment_sets", "equipment_set_components")
 def analytics_ratio_issues():
-    query = """
-        SELECT
-            (SELECT COUNT(id) FROM equipment_sets) AS total,
-
-            (
-                SELECT COUNT(DISTINCT es.id)
-                FROM equipment_sets AS es
-                LEFT JOIN equipment_set_components AS esc 
-                    ON es.id = esc.equipment_set_id
-                WHERE 
-                    -- Missing component name or serial
-                    (
-                        esc.system_unit_name IS NULL OR esc.system_unit_name = '' OR
-                        esc.system_unit_serial_number IS NULL OR esc.system_unit_serial_number = '' OR
-                        esc.monitor_name IS NULL OR esc.monitor_name = '' OR
-                        esc.monitor_serial_number IS NULL OR esc.monitor_serial_number = '' OR
-                        esc.keyboard_name IS NULL OR esc.keyboard_name = '' OR
-                        esc.keyboard_serial_number IS NULL OR esc.keyboard_serial_number = '' OR
-                        esc.mouse_name IS NULL OR esc.mouse_name = '' OR
-                        esc.mouse_serial_number IS NULL OR esc.mouse_serial_number = '' OR
-                        esc.avr_name IS NULL OR esc.avr_name = '' OR
-                        esc.avr_serial_number IS NULL OR esc.avr_serial_number = '' OR
-                        esc.headset_name IS NULL OR esc.headset_name = '' OR
-                        esc.headset_serial_number IS NULL OR esc.headset_serial_number = ''
-                    )
-                    OR es.plugged_power_cable = FALSE
-                    OR es.plugged_display_cable = FALSE
-                    OR es.performance = 'unstable'
-                    OR es.connectivity = 'unstable'
-                    OR (es.issue IS NOT NULL AND es.issue <> '')
-            ) AS issues;
-    """
-
     # execute query
-    equipment_sets_analytics_fetch_ratio_issues = database.fetch_one(query)
+    equipment_sets_analytics_fetch_ratio_issues = count_with_issues()
 
     # query fails
     if not equipment_sets_analytics_fetch_ratio_issues['success']:
@@ -500,87 +420,29 @@ def analytics_ratio_issues():
 
 
 @bp_equipment_sets.route("/analytics/issues/total", methods=["GET"])
+@cached("equipment_sets", "equipment_set_components")
 def analytics_issues_total():
-    query = """
-        SELECT COUNT(DISTINCT es.id) AS equipment_sets_with_issues
-        FROM equipment_sets AS es
-        LEFT JOIN equipment_set_components AS esc
-            ON es.id = esc.equipment_set_id
-        WHERE 
-            -- Basic equipment set issue conditions
-            es.plugged_power_cable = 'false'
-            OR es.plugged_display_cable = 'false'
-            OR es.connectivity = 'unstable'
-            OR es.performance = 'unstable'
-            OR es.status = 'maintenance'
-            OR es.issue IS NOT NULL
-            -- Component-based issues
-            OR (
-                (esc.system_unit_name IS NULL OR esc.system_unit_name = '' 
-                OR esc.system_unit_serial_number IS NULL OR esc.system_unit_serial_number = '')
-                OR (esc.monitor_name IS NULL OR esc.monitor_name = '' 
-                OR esc.monitor_serial_number IS NULL OR esc.monitor_serial_number = '')
-                OR (esc.keyboard_name IS NULL OR esc.keyboard_name = '' 
-                OR esc.keyboard_serial_number IS NULL OR esc.keyboard_serial_number = '')
-                OR (esc.mouse_name IS NULL OR esc.mouse_name = '' 
-                OR esc.mouse_serial_number IS NULL OR esc.mouse_serial_number = '')
-                OR (es.requires_avr = TRUE AND (esc.avr_name IS NULL OR esc.avr_name = '' 
-                OR esc.avr_serial_number IS NULL OR esc.avr_serial_number = ''))
-                OR (es.requires_headset = TRUE AND (esc.headset_name IS NULL OR esc.headset_name = '' 
-                OR esc.headset_serial_number IS NULL OR esc.headset_serial_number = ''))
-            );
-    """
-
     # execute query
-    equipment_sets_analytics_fetch_issues_total = database.fetch_scalar(query)
+    equipment_sets_analytics_fetch_issues_total = count_with_issues()
 
     # query fails
     if not equipment_sets_analytics_fetch_issues_total['success']:
         return common_database_error_response(equipment_sets_analytics_fetch_issues_total)
     
     # success
-    return common_success_response(equipment_sets_analytics_fetch_issues_total['data'])
+    return common_success_response(equipment_sets_analytics_fetch_issues_total['data']['issues'])
 
 
 
 @bp_equipment_sets.route("/analytics/issues/total/location/<id>", methods=["GET"])
+@cached("equipment_sets", "equipment_set_components")
 def analytics_issues_total_location(id):
-    query = """
-        SELECT COUNT(DISTINCT es.id) AS equipment_sets_with_issues
-        FROM equipment_sets AS es
-        LEFT JOIN equipment_set_components AS esc
-            ON es.id = esc.equipment_set_id
-        WHERE 
-            es.location_id = %s
-            AND (
-                es.plugged_power_cable = FALSE
-                OR es.plugged_display_cable = FALSE
-                OR es.connectivity = 'unstable'
-                OR es.performance = 'unstable'
-                OR es.status = 'maintenance'
-                OR es.issue IS NOT NULL
-                OR (
-                    esc.system_unit_name IS NULL OR esc.system_unit_name = '' 
-                    OR esc.system_unit_serial_number IS NULL OR esc.system_unit_serial_number = ''
-                    OR esc.monitor_name IS NULL OR esc.monitor_name = '' 
-                    OR esc.monitor_serial_number IS NULL OR esc.monitor_serial_number = ''
-                    OR esc.keyboard_name IS NULL OR esc.keyboard_name = '' 
-                    OR esc.keyboard_serial_number IS NULL OR esc.keyboard_serial_number = ''
-                    OR esc.mouse_name IS NULL OR esc.mouse_name = '' 
-                    OR esc.mouse_serial_number IS NULL OR esc.mouse_serial_number = ''
-                    OR (es.requires_avr = TRUE AND (esc.avr_name IS NULL OR esc.avr_name = '' OR esc.avr_serial_number IS NULL OR esc.avr_serial_number = ''))
-                    OR (es.requires_headset = TRUE AND (esc.headset_name IS NULL OR esc.headset_name = '' OR esc.headset_serial_number IS NULL OR esc.headset_serial_number = ''))
-                )
-            );
-
-    """
-
     # execute query
-    equipment_sets_analytics_fetch_issues_total_location = database.fetch_scalar(query, (id, ))
+    equipment_sets_analytics_fetch_issues_total_location = count_with_issues(id)
 
     # query fails
     if not equipment_sets_analytics_fetch_issues_total_location['success']:
         return common_database_error_response(equipment_sets_analytics_fetch_issues_total_location)
     
     # success
-    return common_success_response(equipment_sets_analytics_fetch_issues_total_location['data'])
\ No newline at end of file
+    return common_success_response(equipment_sets_analytics_fetch_issues_total_location['data']['issues'])
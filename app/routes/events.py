@@ -0,0 +1,27 @@
+from flask import Blueprint, Response, request
+from flask_jwt_extended import jwt_required
+from ..services.event_stream import stream
+from ..services.validation import common_error_response
+
+bp_events = Blueprint("events", __name__)
+
+
+@bp_events.route("/activity", methods=["GET"])
+@jwt_required()
+def activity():
+    # pushes `account_log` and `equipment_activity` events, same shape as the /recent feeds
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+
+    # every stream holds a worker thread; past the cap clients retry instead of starving other requests
+    events = stream(last_event_id)
+    if events is None:
+        return common_error_response("Too many open event streams, try again later", 503)
+
+    return Response(
+        events,
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        }
+    )
@@ -4,7 +4,9 @@ from ..services.security import generate_id
 from ..services import database
 from flask_jwt_extended import jwt_required
 from ..config import config
-from ..services.validation import check_json_payload, check_required_fields, common_error_response, common_success_response, common_database_error_response
+from ..services.validation import check_json_payload, check_required_fields, is_columnar_request, common_error_response, common_success_response, common_database_error_response
+from ..services.analytics_cache import cached, invalidates
+from ..services.equipment_health import refresh_location_health
 
 bp_locations = Blueprint("locations", __name__)
 
@@ -49,7 +51,7 @@ def get():
     base_query += ";"
 
     # execute query
-    locations_fetch = database.fetch_all(base_query, tuple(conditional_params))
+    locations_fetch = database.fetch_all(base_query, tuple(conditional_params), compact=is_columnar_request())
 
     # query fails
     if not locations_fetch['success']:
@@ -61,6 +63,7 @@ def get():
 
 @bp_locations.route("/", methods=["POST"])
 @require_access('admin')
+@invalidates("locations", "equipment_sets")
 def add():
     # Validate JSON payload
     data, error_response = check_json_payload()
@@ -110,6 +113,7 @@ def add():
 
 @bp_locations.route("/<id>", methods=["PUT"])
 @require_access('admin')
+@invalidates("locations", "equipment_sets")
 def edit(id):
     data, error_response = check_json_payload()
     if error_response:
@@ -140,10 +144,12 @@ def edit(id):
 
     base_params = (name, description, id)
 
-    location_updated = database.execute_single(base_query, base_params)
+    with database.transaction() as tx:
+        database.execute_single(base_query, base_params)
+        refresh_location_health(id)
 
-    if not location_updated['success']:
-        common_database_error_response(location_updated)
+    if not tx.success:
+        return common_database_error_response(tx.error)
 
     return common_success_response(data=True)
 
@@ -151,6 +157,7 @@ def edit(id):
 # hard delete
 @bp_locations.route("/<id>", methods=["DELETE"])
 @require_access('admin')
+@invalidates("locations", "equipment_sets")
 def delete(id):
 
     # prepare query and parameters
@@ -161,12 +168,14 @@ def delete(id):
     """
     base_params = (id, )
 
-    # execute query
-    location_deleted = database.execute_single(base_query, base_params)
+    # execute query; the health rows of its sets go in the same transaction
+    with database.transaction() as tx:
+        database.execute_single(base_query, base_params)
+        refresh_location_health(id)
 
     # if fail
-    if not location_deleted['success']:
-        common_database_error_response(location_deleted)
+    if not tx.success:
+        return common_database_error_response(tx.error)
 
     # confirm deletion
     return common_success_response(data=True)
@@ -175,6 +184,7 @@ def delete(id):
 # ANALYTICSSSSS ==================================================================
 
 @bp_locations.route("/analytics/total", methods=["GET"])
+@cached("locations")
 def analytics_total():
     query = """
         SELECT COUNT(id) AS data
@@ -4,7 +4,7 @@ from ..services.security import generate_id
 from ..services import database
 from flask_jwt_extended import jwt_required
 from ..config import config
-from ..services.validation import check_json_payload, check_required_fields, check_order_parameter, common_success_response, common_database_error_response
+from ..services.validation import check_json_payload, check_required_fields, check_order_parameter, common_success_response, common_error_response, common_database_error_response
 from ..services.security import generate_username, generate_default_password, generate_uuid
 
 bp_system = Blueprint("system", __name__)
@@ -42,4 +42,49 @@ def generate_uuid_endpoint():
 
     return common_success_response(
         data=generate_uuid()
-    )
\ No newline at end of file
+    )
+
+
+@bp_system.route("/health/database", methods=["GET"])
+def database_health():
+    from ..services.core import database_breaker, get_replica_pool
+    from ..services.statement_cache import statement_cache_stats
+
+    data = {
+        "circuit": database_breaker.snapshot(),
+        "replica": {
+            "configured": bool(config.MYSQL_REPLICA_HOST),
+            "available": get_replica_pool() is not None,
+        },
+        "statement_cache": statement_cache_stats(),
+    }
+
+    # anything but a closed circuit means requests may be refused
+    if data["circuit"]["state"] != database_breaker.CLOSED:
+        return common_error_response("Database unavailable", 503, details=data)
+
+    return common_success_response(data)
+
+
+@bp_system.route("/health/analytics-cache", methods=["GET"])
+def analytics_cache_health():
+    from ..services.analytics_cache import analytics_cache
+    from ..services.distinct_counter import active_accounts
+
+    data = analytics_cache.snapshot()
+    data["active_accounts"] = active_accounts.snapshot()
+    return common_success_response(data)
+
+
+@bp_system.route("/health/activity-queue", methods=["GET"])
+def activity_queue_health():
+    from ..services.activity_queue import activity_queue
+
+    return common_success_response(activity_queue.snapshot())
+
+
+@bp_system.route("/health/mail", methods=["GET"])
+def mail_health():
+    from ..services.mail_dispatcher import mail_dispatcher
+
+    return common_success_response(mail_dispatcher.snapshot())
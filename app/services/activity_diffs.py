@@ -0,0 +1,259 @@
+import json
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from ..config import config
+from . import database
+from .log import log
+
+LEGACY_TABLE = "equipment_set_activity"
+EDITS_TABLE = "equipment_set_edits"
+EXPANDED_VIEW = "equipment_set_activity_expanded"
+
+# one edit row holds at most this many fields; expanded ids are edit_id * FIELD_SLOTS + field position
+FIELD_SLOTS = 32
+
+# per-action rows of a relation of edits, shaped like the legacy equipment_set_activity table
+_EXPANDED_SELECT = f"""
+    SELECT
+        e.id * {FIELD_SLOTS} + d.position - 1 AS id,
+        e.performed_by_account_id,
+        e.equipment_set_id,
+        CONVERT(d.action USING utf8mb4) AS action,
+        CONVERT(d.value USING utf8mb4) AS value,
+        CONVERT(d.old_value USING utf8mb4) AS old_value,
+        IF(e.emailed_mask & (1 << (d.position - 1)), 'emailed', 'pending') AS status,
+        IF(e.emailed_mask & (1 << (d.position - 1)), e.emailed_at, NULL) AS emailed_at,
+        e.created_at
+    FROM {{edits}} AS e,
+    JSON_TABLE(e.diff, '$[*]' COLUMNS (
+        position FOR ORDINALITY,
+        action VARCHAR(64) PATH '$.a',
+        old_value TEXT PATH '$.o',
+        value TEXT PATH '$.n'
+    )) AS d
+"""
+
+
+def storing_diffs() -> bool:
+    return config.ACTIVITY_STORAGE == "diff"
+
+
+def activity_source() -> str:
+    """Table or view to read per-action equipment activity rows from."""
+    return EXPANDED_VIEW if storing_diffs() else LEGACY_TABLE
+
+
+def expand(edits_relation: str) -> str:
+    """Per-action relation over any relation of edit rows (the live table or a union with its archives)."""
+    return f"({_EXPANDED_SELECT.format(edits=edits_relation)})"
+
+
+def activity_rows(activity_ids: Sequence[int]) -> Tuple[str, tuple]:
+    """Relation of the per-action rows with these ids, and its parameters.
+
+    The view's computed id has no index, so in diff mode the edit rows are
+    picked by primary key (id DIV FIELD_SLOTS) before they are expanded.
+    """
+    ids = tuple(activity_ids)
+    placeholders = ", ".join(["%s"] * len(ids))
+    if not storing_diffs():
+        return f"(SELECT * FROM {LEGACY_TABLE} WHERE id IN ({placeholders}))", ids
+
+    edit_ids = tuple(sorted({activity_id // FIELD_SLOTS for activity_id in ids}))
+    edits = f"(SELECT * FROM {EDITS_TABLE} WHERE id IN ({', '.join(['%s'] * len(edit_ids))}))"
+    return f"(SELECT * FROM {expand(edits)} AS expanded WHERE id IN ({placeholders}))", edit_ids + ids
+
+
+def ensure_edits_storage() -> bool:
+    created = database.execute_single(f"""
+        CREATE TABLE IF NOT EXISTS {EDITS_TABLE} (
+            id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+            performed_by_account_id VARCHAR(64) NOT NULL,
+            equipment_set_id VARCHAR(64) NOT NULL,
+            diff JSON NOT NULL,
+            emailed_mask INT UNSIGNED NOT NULL DEFAULT 0,
+            emailed_at DATETIME NULL,
+            created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_edits_created_at (created_at, id),
+            INDEX idx_edits_set_created_at (equipment_set_id, created_at)
+        );
+    """)
+    if not created['success']:
+        log.error("ACTIVITY-DIFFS", f"Failed to create {EDITS_TABLE}: {created['msg']}")
+        return False
+
+    viewed = database.execute_single(
+        f"CREATE OR REPLACE VIEW {EXPANDED_VIEW} AS {_EXPANDED_SELECT.format(edits=EDITS_TABLE)};"
+    )
+    if not viewed['success']:
+        log.error("ACTIVITY-DIFFS", f"Failed to create {EXPANDED_VIEW}: {viewed['msg']}")
+        return False
+    return True
+
+
+def _stored(value: Any) -> Optional[str]:
+    # the text the legacy VARCHAR column ends up holding for the same parameter
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return str(value)
+
+
+def encode_diff(changes: Sequence[Tuple[str, Any, Any]]) -> str:
+    """Compact JSON of (field, old, new) changes; absent keys read back as NULL."""
+    entries = []
+    for field, old, new in changes:
+        entry = {"a": field}
+        if _stored(old) is not None:
+            entry["o"] = _stored(old)
+        if _stored(new) is not None:
+            entry["n"] = _stored(new)
+        entries.append(entry)
+    return json.dumps(entries, separators=(",", ":"))
+
+
+_INSERT_QUERY = f"""
+    INSERT INTO {{table}} (performed_by_account_id, equipment_set_id, diff, emailed_mask, emailed_at, created_at)
+    VALUES (%s, %s, %s, %s, %s, COALESCE(%s, CURRENT_TIMESTAMP))
+"""
+
+
+def record_edit(account_id: str, equipment_set_id: str, updates: List[Tuple[str, Any]], previous: Optional[Dict[str, Any]] = None):
+    """One edit row for all changed fields (more rows only past FIELD_SLOTS); joins the caller's transaction."""
+    previous = previous or {}
+    changes = [(field, previous.get(field), value) for field, value in updates]
+
+    return database.execute_many(_INSERT_QUERY.format(table=EDITS_TABLE), [
+        (account_id, equipment_set_id, encode_diff(changes[start:start + FIELD_SLOTS]), 0, None, None)
+        for start in range(0, len(changes), FIELD_SLOTS)
+    ])
+
+
+def mark_emailed(activity_ids: Sequence) -> dict:
+    """Flag expanded activity ids as emailed; joins the caller's transaction."""
+    masks: Dict[int, int] = defaultdict(int)
+    for activity_id in activity_ids:
+        edit_id, position = divmod(int(activity_id), FIELD_SLOTS)
+        masks[edit_id] |= 1 << position
+
+    return database.execute_many(
+        f"UPDATE {EDITS_TABLE} SET emailed_mask = emailed_mask | %s, emailed_at = CURRENT_TIMESTAMP WHERE id = %s;",
+        [(mask, edit_id) for edit_id, mask in masks.items()]
+    )
+
+
+# ------------------------------------------------------------------------ migration
+
+def _migrate_table(source: str, target: str, batch_size: int):
+    """Fold per-field rows of `source` into edit rows of `target`, deleting them as each batch commits.
+
+    Consecutive rows by the same account on the same set with the same
+    created_at were written by one edit and become one row. The old value of a
+    field is the value of its previous row; the first change of each field
+    seen by this run has none.
+    """
+    stream = database.fetch_iter(
+        f"""
+            SELECT id, performed_by_account_id, equipment_set_id, action, value, status, emailed_at, created_at
+            FROM {source}
+            ORDER BY id;
+        """,
+        compact=True,
+        # rows are deleted on the primary as they are copied, so read them there too
+        role=database.PRIMARY
+    )
+    if not stream['success']:
+        return stream
+
+    rows = stream['data']
+    last_values: Dict[Tuple[Any, str], Any] = {}
+    edits: List[list] = []
+    legacy_ids: List[Any] = []
+    migrated = 0
+
+    def flush():
+        params_list = [
+            (account_id, equipment_set_id, encode_diff(changes), mask, emailed_at, created_at)
+            for account_id, equipment_set_id, created_at, changes, mask, emailed_at in edits
+        ]
+        with database.transaction() as tx:
+            database.execute_many(_INSERT_QUERY.format(table=target), params_list)
+            for start in range(0, len(legacy_ids), int(config.MYSQL_BATCH_CHUNK_SIZE)):
+                chunk = legacy_ids[start:start + int(config.MYSQL_BATCH_CHUNK_SIZE)]
+                database.execute_single(
+                    f"DELETE FROM {source} WHERE id IN ({', '.join(['%s'] * len(chunk))});", tuple(chunk)
+                )
+        return tx
+
+    try:
+        for legacy_id, account_id, equipment_set_id, action, value, status, emailed_at, created_at in rows:
+            edit = edits[-1] if edits else None
+            if edit is None or edit[:3] != [account_id, equipment_set_id, created_at] or len(edit[3]) >= FIELD_SLOTS:
+                edit = [account_id, equipment_set_id, created_at, [], 0, None]
+                edits.append(edit)
+
+            if status == "emailed":
+                edit[4] |= 1 << len(edit[3])
+                edit[5] = max(filter(None, (edit[5], emailed_at)), default=None)
+            edit[3].append((action, last_values.get((equipment_set_id, action)), value))
+            last_values[(equipment_set_id, action)] = value
+            legacy_ids.append(legacy_id)
+
+            # only cut between edits so one edit never spans two rows
+            if len(legacy_ids) >= batch_size and len(edits) > 1:
+                current = edits.pop()
+                current_ids = legacy_ids[len(legacy_ids) - len(current[3]):]
+                del legacy_ids[len(legacy_ids) - len(current[3]):]
+
+                tx = flush()
+                if not tx.success:
+                    return tx.error
+                migrated += len(legacy_ids)
+                edits, legacy_ids = [current], current_ids
+
+        if legacy_ids:
+            tx = flush()
+            if not tx.success:
+                return tx.error
+            migrated += len(legacy_ids)
+    finally:
+        rows.close()
+
+    return {"success": True, "data": migrated}
+
+
+def migrate_legacy_activity(batch_size: int):
+    """Convert every per-field activity row, live and archived, into edit rows."""
+    from .retention import archive_table, archived_months
+
+    if not ensure_edits_storage():
+        return {"success": False, "msg": f"Could not create {EDITS_TABLE}"}
+
+    result = _migrate_table(LEGACY_TABLE, EDITS_TABLE, batch_size)
+    if not result['success']:
+        return result
+    total = result['data']
+    log.inform("ACTIVITY-DIFFS", f"Migrated {total} {LEGACY_TABLE} row/s")
+
+    # archived months go to the matching edits archive, which then replaces them
+    for month, legacy_archive in sorted(archived_months(LEGACY_TABLE, refresh=True).items()):
+        target = archive_table(EDITS_TABLE, month)
+        created = database.execute_single(f"CREATE TABLE IF NOT EXISTS {target} LIKE {EDITS_TABLE};")
+        if not created['success']:
+            return created
+
+        result = _migrate_table(legacy_archive, target, batch_size)
+        if not result['success']:
+            return result
+        total += result['data']
+
+        database.execute_single(f"DROP TABLE IF EXISTS {legacy_archive};")
+        log.inform("ACTIVITY-DIFFS", f"Migrated {result['data']} row/s of {legacy_archive} into {target}")
+
+    archived_months(LEGACY_TABLE, refresh=True)
+    archived_months(EDITS_TABLE, refresh=True)
+    return {"success": True, "data": total}
@@ -0,0 +1,54 @@
+from typing import Sequence
+from . import database
+from .activity_diffs import activity_rows, activity_source
+from .log import log
+
+LAST_EMAILED_TABLE = "equipment_set_activity_emailed"
+
+
+def ensure_last_emailed_table() -> bool:
+    created = database.execute_single(f"""
+        CREATE TABLE IF NOT EXISTS {LAST_EMAILED_TABLE} (
+            equipment_set_id VARCHAR(64) NOT NULL,
+            action VARCHAR(64) NOT NULL,
+            activity_id BIGINT NOT NULL,
+            value TEXT NULL,
+            created_at DATETIME NOT NULL,
+            emailed_at DATETIME NULL,
+            PRIMARY KEY (equipment_set_id, action)
+        );
+    """)
+    if not created['success']:
+        log.error("ACTIVITY-DIGEST", f"Failed to create {LAST_EMAILED_TABLE}: {created['msg']}")
+        return False
+
+    # first deploy: seed from the activity already emailed
+    populated = database.fetch_scalar(f"SELECT 1 FROM {LAST_EMAILED_TABLE} LIMIT 1;")
+    if populated['success'] and populated['data'] is None:
+        seeded = database.execute_single(_UPSERT_QUERY.format(source=f"""
+            {activity_source()}
+            WHERE status = 'emailed'
+        """))
+        if seeded['success']:
+            log.inform("ACTIVITY-DIGEST", f"Seeded {LAST_EMAILED_TABLE}")
+    return True
+
+
+# newest emailed row per (equipment_set_id, action) wins; the position columns are assigned
+# last because later assignments see the already updated values
+_UPSERT_QUERY = f"""
+    INSERT INTO {LAST_EMAILED_TABLE} (equipment_set_id, action, activity_id, value, created_at, emailed_at)
+    SELECT equipment_set_id, action, id, value, created_at, emailed_at
+    FROM {{source}}
+    ON DUPLICATE KEY UPDATE
+        value = IF((VALUES(created_at), VALUES(activity_id)) >= (created_at, activity_id), VALUES(value), value),
+        emailed_at = IF((VALUES(created_at), VALUES(activity_id)) >= (created_at, activity_id), VALUES(emailed_at), emailed_at),
+        activity_id = IF((VALUES(created_at), VALUES(activity_id)) >= (created_at, activity_id), VALUES(activity_id), activity_id),
+        created_at = GREATEST(VALUES(created_at), created_at);
+"""
+
+
+def record_emailed(activity_ids: Sequence[int]) -> dict:
+    """Move the last-emailed value of every cleared row's (set, action); joins the caller's transaction."""
+    relation, params = activity_rows(activity_ids)
+    return database.execute_single(_UPSERT_QUERY.format(source=f"{relation} AS cleared"), params)
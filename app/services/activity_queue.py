@@ -0,0 +1,289 @@
+import atexit
+import fcntl
+import glob
+import json
+import os
+import queue
+import threading
+import time
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from ..config import config
+from . import database
+from .log import log
+from .rollups import EQUIPMENT_SET_ACTIVITY, record_activity
+
+# created_at is taken when the edit happens (on the database clock, see database_now), not when the batch lands
+WRITE_BEHIND_INSERT_QUERY = """
+    insert into equipment_set_activity (performed_by_account_id, equipment_set_id, action, value, created_at)
+    values (%s, %s, %s, %s, %s)
+"""
+
+# (performed_by_account_id, equipment_set_id, action, value, created_at)
+Record = Tuple[Any, Any, str, Any, datetime]
+
+
+class _Segment:
+    """One journal file, held under an exclusive lock while this process owns it."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "a", encoding="utf-8")
+        fcntl.flock(self.file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self.written = 0
+        self.outstanding = 0
+
+    def append(self, records: Sequence[Record]) -> None:
+        for record in records:
+            self.file.write(json.dumps(list(record[:4]) + [record[4].isoformat()], default=str) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.written += len(records)
+        self.outstanding += len(records)
+
+    def remove(self) -> None:
+        os.remove(self.path)
+        self.file.close()
+
+
+class ActivityWriteBehind:
+    """Bounded in-process queue of equipment activity rows with a background flusher.
+
+    Records are journaled to disk before they are queued, and a journal segment
+    is deleted only once every record in it is committed, so a crash loses
+    nothing: the next start replays the leftover segments. Replay is at least
+    once; a crash between a commit and the segment delete writes that batch
+    again. A full queue blocks the writer for up to
+    ACTIVITY_QUEUE_PUT_TIMEOUT_SECONDS, then the rows are written inline.
+    """
+
+    def __init__(self, max_size: int, batch_size: int, flush_interval: float, put_timeout: float, journal_dir: str, segment_size: int):
+        self.queue: "queue.Queue[Tuple[_Segment, Record]]" = queue.Queue(maxsize=max_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.journal_dir = journal_dir
+        self.segment_size = segment_size
+        self.stats = {"enqueued": 0, "flushed": 0, "batches": 0, "failed_batches": 0, "inline_writes": 0, "replayed": 0}
+        self.segment: Optional[_Segment] = None
+        self._segment_number = 0
+        self._journal_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._retry: List[Tuple[_Segment, Record]] = []
+
+    # ---------------------------------------------------------------- writers
+
+    def submit(self, records: Sequence[Record]) -> Dict[str, Any]:
+        """Journal and queue activity rows; returns once they are durable on disk."""
+        if not records:
+            return {"success": True, "data": 0}
+        self._ensure_flusher()
+
+        try:
+            with self._journal_lock:
+                segment = self._current_segment()
+                segment.append(records)
+        except OSError as err:
+            log.error("ACTIVITY-QUEUE", f"Journal write failed, writing inline: {err}")
+            return self._write_inline(records)
+
+        deadline = time.monotonic() + self.put_timeout
+        for position, record in enumerate(records):
+            try:
+                self.queue.put((segment, record), timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Full:
+                # backpressure gave up: write the rest now, their journal lines are settled below
+                log.warn("ACTIVITY-QUEUE", f"Queue full, writing {len(records) - position} row/s inline")
+                self.stats["enqueued"] += position
+                written = self._write_inline(records[position:])
+                if written['success']:
+                    self._settle([segment] * (len(records) - position))
+                return written
+
+        self.stats["enqueued"] += len(records)
+        return {"success": True, "data": len(records)}
+
+    def _write_inline(self, records: Sequence[Record]) -> Dict[str, Any]:
+        self.stats["inline_writes"] += len(records)
+        return _insert(records)
+
+    # ---------------------------------------------------------------- journal
+
+    def _current_segment(self) -> _Segment:
+        if self.segment is None or self.segment.written >= self.segment_size:
+            os.makedirs(self.journal_dir, exist_ok=True)
+            self._segment_number += 1
+            self.segment = _Segment(os.path.join(
+                self.journal_dir, f"activity-{os.getpid()}-{int(time.time())}-{self._segment_number}.jsonl"
+            ))
+        return self.segment
+
+    def _settle(self, segments: List[_Segment]) -> None:
+        """Drop journal segments whose records are all committed."""
+        with self._journal_lock:
+            for segment in segments:
+                segment.outstanding -= 1
+            for segment in set(segments):
+                if segment.outstanding:
+                    continue
+                if segment is self.segment:
+                    # caught up: the next write starts a fresh file
+                    self.segment = None
+                segment.remove()
+
+    def recover(self) -> int:
+        """Replay journal segments left behind by processes that are gone."""
+        replayed = 0
+        for path in sorted(glob.glob(os.path.join(self.journal_dir, "activity-*.jsonl"))):
+            try:
+                handle = open(path, "r+", encoding="utf-8")
+            except FileNotFoundError:
+                continue
+
+            try:
+                # still locked: a live worker owns it
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                handle.close()
+                continue
+
+            try:
+                records = []
+                for line in handle:
+                    try:
+                        account_id, equipment_set_id, action, value, created_at = json.loads(line)
+                    except ValueError:
+                        # torn final line from the crash
+                        continue
+                    records.append((account_id, equipment_set_id, action, value, datetime.fromisoformat(created_at)))
+
+                inserted = _insert(records) if records else {"success": True}
+                if not inserted['success']:
+                    log.error("ACTIVITY-QUEUE", f"Failed to replay {path}: {inserted['msg']}")
+                    continue
+
+                os.remove(path)
+                replayed += len(records)
+            finally:
+                handle.close()
+
+        if replayed:
+            self.stats["replayed"] += replayed
+            log.inform("ACTIVITY-QUEUE", f"Replayed {replayed} journaled activity row/s")
+        return replayed
+
+    # ---------------------------------------------------------------- flusher
+
+    def _ensure_flusher(self) -> None:
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="activity-write-behind", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._flush_batch(wait=True)
+
+    def _flush_batch(self, wait: bool) -> int:
+        """Collect up to batch_size rows (waiting at most flush_interval for the first) and insert them."""
+        batch, self._retry = self._retry, []
+        deadline = time.monotonic() + self.flush_interval
+
+        while len(batch) < self.batch_size:
+            try:
+                if wait:
+                    batch.append(self.queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                else:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+
+        if not batch:
+            return 0
+
+        records = [record for _, record in batch]
+        inserted = _insert(records)
+        if not inserted['success']:
+            # kept for the next pass; still journaled if the process dies first
+            self._retry = batch
+            self.stats["failed_batches"] += 1
+            log.error("ACTIVITY-QUEUE", f"Failed to flush {len(records)} activity row/s: {inserted['msg']}")
+            if wait:
+                self._stopping.wait(self.flush_interval)
+            return 0
+
+        self.stats["flushed"] += len(records)
+        self.stats["batches"] += 1
+        self._settle([segment for segment, _ in batch])
+        return len(records)
+
+    def flush(self) -> int:
+        """Write everything queued right now."""
+        total = 0
+        while self._retry or not self.queue.empty():
+            flushed = self._flush_batch(wait=False)
+            if not flushed:
+                break
+            total += flushed
+        return total
+
+    def shutdown(self) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+        flushed = self.flush()
+        if flushed:
+            log.inform("ACTIVITY-QUEUE", f"Flushed {flushed} activity row/s on shutdown")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": bool(config.ACTIVITY_WRITE_BEHIND),
+            "depth": self.queue.qsize() + len(self._retry),
+            "capacity": self.queue.maxsize,
+            "journal_segment": os.path.basename(self.segment.path) if self.segment else None,
+            **self.stats,
+        }
+
+
+def _insert(records: Sequence[Record]) -> Dict[str, Any]:
+    """Multi-row insert of activity rows plus their rollup counts, in one transaction."""
+    from .analytics_cache import analytics_cache
+
+    # late flushes and journal replays count towards the day the edit happened
+    by_day: Dict[date, List[str]] = {}
+    for record in records:
+        by_day.setdefault(record[4].date(), []).append(record[2])
+
+    with database.transaction() as tx:
+        database.execute_many(WRITE_BEHIND_INSERT_QUERY, list(records))
+        for day, actions in by_day.items():
+            record_activity(EQUIPMENT_SET_ACTIVITY, actions, day)
+
+    if not tx.success:
+        return tx.error
+
+    # the edit's own invalidation ran before these rows existed
+    analytics_cache.invalidate(EQUIPMENT_SET_ACTIVITY)
+    return {"success": True, "data": len(records)}
+
+
+activity_queue = ActivityWriteBehind(
+    max_size=int(config.ACTIVITY_QUEUE_SIZE),
+    batch_size=int(config.ACTIVITY_QUEUE_BATCH_SIZE),
+    flush_interval=float(config.ACTIVITY_QUEUE_FLUSH_SECONDS),
+    put_timeout=float(config.ACTIVITY_QUEUE_PUT_TIMEOUT_SECONDS),
+    journal_dir=config.ACTIVITY_JOURNAL_DIR,
+    segment_size=int(config.ACTIVITY_JOURNAL_SEGMENT_SIZE),
+)
+
+if config.ACTIVITY_WRITE_BEHIND:
+    atexit.register(activity_queue.shutdown)
+
+if config.ENABLE_PROMETRICS:
+    from prometheus_client import Gauge
+    Gauge("activity_queue_depth", "Equipment activity rows waiting to be written").set_function(activity_queue.queue.qsize)
+    _queue_gauge = Gauge("activity_queue_events", "Equipment activity write-behind counters", ["event"])
+    for _event in activity_queue.stats:
+        _queue_gauge.labels(_event).set_function(lambda event=_event: activity_queue.stats[event])
@@ -0,0 +1,153 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Dict, Tuple
+from flask import Response, request
+from ..config import config
+
+
+class AnalyticsCache:
+    """TTL + LRU cache of rendered responses, tagged with the tables they read.
+
+    Writers bump a tag's generation on invalidation; a response computed while
+    one of its tags was invalidated is not stored, so a slow read can never put
+    pre-write numbers back into the cache.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: "OrderedDict[Any, Tuple[float, Tuple[str, ...], Any]]" = OrderedDict()
+        self.tagged: Dict[str, set] = {}
+        self.generations: Dict[str, int] = {}
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+
+            expires_at, tags, value = entry
+            if expires_at <= time.monotonic():
+                self._drop(key, tags)
+                self.stats["expirations"] += 1
+                self.stats["misses"] += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return value
+
+    def generation(self, tags: Tuple[str, ...]) -> Tuple[int, ...]:
+        with self._lock:
+            return tuple(self.generations.get(tag, 0) for tag in tags)
+
+    def put(self, key, tags: Tuple[str, ...], value, generation: Tuple[int, ...]) -> None:
+        with self._lock:
+            if tuple(self.generations.get(tag, 0) for tag in tags) != generation:
+                return
+
+            if key in self.entries:
+                self._drop(key, self.entries[key][1])
+            self.entries[key] = (time.monotonic() + self.ttl, tags, value)
+            for tag in tags:
+                self.tagged.setdefault(tag, set()).add(key)
+
+            while len(self.entries) > self.max_entries:
+                old_key, (_, old_tags, _) = next(iter(self.entries.items()))
+                self._drop(old_key, old_tags)
+                self.stats["evictions"] += 1
+
+    def invalidate(self, *tags: str) -> None:
+        with self._lock:
+            for tag in tags:
+                self.generations[tag] = self.generations.get(tag, 0) + 1
+                for key in self.tagged.pop(tag, set()):
+                    entry = self.entries.pop(key, None)
+                    if entry is not None:
+                        self.stats["invalidations"] += 1
+                        for other in entry[1]:
+                            if other != tag:
+                                self.tagged.get(other, set()).discard(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.entries.clear()
+            self.tagged.clear()
+
+    def _drop(self, key, tags: Tuple[str, ...]) -> None:
+        self.entries.pop(key, None)
+        for tag in tags:
+            self.tagged.get(tag, set()).discard(key)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.stats,
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+            }
+
+
+analytics_cache = AnalyticsCache(
+    max_entries=int(config.ANALYTICS_CACHE_MAX_ENTRIES),
+    ttl=float(config.ANALYTICS_CACHE_TTL_SECONDS),
+)
+
+
+def cached(*tables: str):
+    """Cache a GET view's successful responses per view function and arguments, tagged by `tables`."""
+    tags = tuple(tables)
+
+    def decorator(fn):
+        # not request.endpoint: dashboard widgets may render outside their own URL
+        view = f"{fn.__module__}.{fn.__qualname__}"
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if analytics_cache.ttl <= 0:
+                return fn(*args, **kwargs)
+
+            key = (view, tuple(sorted(request.args.items(multi=True))), tuple(sorted(kwargs.items())))
+            hit = analytics_cache.get(key)
+            if hit is not None:
+                body, status, mimetype = hit
+                return Response(body, status=status, mimetype=mimetype)
+
+            generation = analytics_cache.generation(tags)
+            rv = fn(*args, **kwargs)
+
+            response, status = (rv[0], rv[1]) if isinstance(rv, tuple) else (rv, None)
+            if isinstance(response, Response) and not response.is_streamed:
+                status = status or response.status_code
+                if status == 200:
+                    analytics_cache.put(key, tags, (response.get_data(), status, response.mimetype), generation)
+            return rv
+        return wrapper
+    return decorator
+
+
+def invalidates(*tables: str):
+    """Drop cached analytics reading `tables` once a write view has run."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                analytics_cache.invalidate(*tables)
+        return wrapper
+    return decorator
+
+
+if config.ENABLE_PROMETRICS:
+    from prometheus_client import Gauge
+    _cache_gauge = Gauge("analytics_cache_events", "Analytics response cache counters", ["event"])
+    for _event in ("hits", "misses", "evictions", "expirations", "invalidations"):
+        _cache_gauge.labels(_event).set_function(lambda event=_event: analytics_cache.stats[event])
+    Gauge("analytics_cache_entries", "Analytics responses currently cached").set_function(lambda: len(analytics_cache.entries))
@@ -0,0 +1,157 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+from .log import log
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker with a single background reconnect prober.
+
+    closed     every request may use the resource; consecutive failures are counted
+    open       requests fail fast; one daemon thread probes with exponential backoff
+    half_open  the probe succeeded; a few trial requests decide between closed and open
+
+    Every `allow_request` that takes a trial slot must be followed by
+    `record_success`, `record_failure`, `trip` or `release`. Slots that never
+    report back still expire: after `half_open_timeout` seconds without a
+    verdict the circuit opens again and the prober restarts.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(
+        self,
+        name: str,
+        probe: Callable[[], bool],
+        failure_threshold: int = 3,
+        probe_interval: float = 5.0,
+        max_probe_interval: float = 60.0,
+        half_open_max_calls: int = 1,
+        half_open_timeout: float = 30.0,
+    ):
+        self.name = name
+        self.probe = probe
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self.max_probe_interval = max_probe_interval
+        self.half_open_max_calls = half_open_max_calls
+        self.half_open_timeout = half_open_timeout
+
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trial_calls = 0
+        self.opened_at: Optional[float] = None
+        self.half_opened_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.probe_attempts = 0
+        self.times_opened = 0
+
+        self._lock = threading.Lock()
+        self._prober: Optional[threading.Thread] = None
+
+    def allow_request(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN:
+                if self.trial_calls < self.half_open_max_calls:
+                    self.trial_calls += 1
+                    return True
+                # the trial requests never reported back
+                if time.monotonic() - self.half_opened_at > self.half_open_timeout:
+                    self.last_error = f"No trial request outcome within {self.half_open_timeout:.0f} seconds"
+                    self._open()
+            return False
+
+    def release(self) -> None:
+        """Give a trial slot back without a verdict, e.g. when the request failed before reaching the resource."""
+        if self.state != self.HALF_OPEN:
+            return
+
+        with self._lock:
+            if self.state == self.HALF_OPEN and self.trial_calls > 0:
+                self.trial_calls -= 1
+
+    def record_success(self) -> None:
+        # hot path: nothing to reset while healthy
+        if self.state == self.CLOSED and self.failures == 0:
+            return
+
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                log.inform(self.name, "Circuit closed, trial request succeeded")
+            if self.state != self.OPEN:
+                self.state = self.CLOSED
+                self.failures = 0
+                self.trial_calls = 0
+
+    def record_failure(self, reason: str) -> None:
+        with self._lock:
+            self.failures += 1
+            self.last_error = reason
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self._open()
+
+    def trip(self, reason: str) -> None:
+        """Open immediately, e.g. when the resource is known to be missing."""
+        with self._lock:
+            self.last_error = reason
+            self._open()
+
+    def _open(self) -> None:
+        if self.state != self.OPEN:
+            log.error(self.name, f"Circuit opened: {self.last_error}")
+            self.state = self.OPEN
+            self.opened_at = time.time()
+            self.times_opened += 1
+        self.trial_calls = 0
+
+        if self._prober is None or not self._prober.is_alive():
+            self._prober = threading.Thread(target=self._probe_loop, name=f"{self.name}-prober", daemon=True)
+            self._prober.start()
+
+    def _probe_loop(self) -> None:
+        delay = self.probe_interval
+        while True:
+            time.sleep(delay)
+            self.probe_attempts += 1
+
+            try:
+                healthy = self.probe()
+            except Exception as err:
+                log.warn(self.name, f"Probe raised: {err}")
+                healthy = False
+
+            with self._lock:
+                if healthy:
+                    log.inform(self.name, f"Probe succeeded after {self.probe_attempts} attempt/s, circuit half-open")
+                    self.state = self.HALF_OPEN
+                    self.half_opened_at = time.monotonic()
+                    self.failures = 0
+                    self.trial_calls = 0
+                    self.probe_attempts = 0
+                    self._prober = None
+                    return
+
+            log.warn(self.name, f"Probe failed, next attempt in {delay:.1f} seconds")
+            delay = min(delay * 2, self.max_probe_interval)
+
+    def state_code(self) -> int:
+        return self.STATE_CODES[self.state]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "opened_at": self.opened_at,
+            "times_opened": self.times_opened,
+            "probe_attempts": self.probe_attempts,
+            "last_error": self.last_error,
+        }
@@ -2,10 +2,12 @@ import mysql.connector
 from ..config import config
 import json
 import smtplib
+import threading
 import time
 from flask_jwt_extended import JWTManager
 from flask import Flask
 from .log import log
+from .circuit_breaker import CircuitBreaker
 from prometheus_flask_exporter import PrometheusMetrics
 
 # instance of flask and jwt
@@ -26,29 +28,130 @@ def get_jwt_manager():
 # global connection pool variable
 connection_pool = None
 
-# creates new connection pool
-def create_connection_pool():
-    global connection_pool
-    
-    try:
-        connection_pool = mysql.connector.pooling.MySQLConnectionPool(
-            pool_name="conn-pool-auth",
-            pool_size=int(config.MYSQL_POOL_SIZE),
-            host=config.MYSQL_HOST,
-            port=int(config.MYSQL_PORT),
-            user=config.MYSQL_USER,
-            password=config.MYSQL_PASSWORD,
-            database=config.MYSQL_DB,
-            use_pure=True
-        )
-        log.inform("DATABASE", "Connection pool created successfully")
-        return True
-        
-    except mysql.connector.Error as err:
-        log.error("DATABASE", f"Error creating connection pool: {err}")
-        connection_pool = None
+# bumped on every pool swap; lets concurrent failures share one rebuild
+pool_generation = 0
+_pool_rebuild_lock = threading.Lock()
+
+# closes the connections of a replaced pool as they are checked back in
+def _drain_pool(pool, label):
+    if pool is None:
+        return
+
+    def drain():
+        deadline = time.monotonic() + float(config.MYSQL_POOL_DRAIN_SECONDS)
+        closed = 0
+        try:
+            while closed < pool.pool_size and time.monotonic() < deadline:
+                # the connector has no public close for pools
+                closed += pool._remove_connections()
+                if closed < pool.pool_size:
+                    time.sleep(1)
+            log.inform(label, f"Drained {closed}/{pool.pool_size} connection/s of replaced pool")
+        except Exception as err:
+            log.warn(label, f"Error draining old pool: {err}")
+
+    threading.Thread(target=drain, name=f"{label.lower()}-drain", daemon=True).start()
+
+# creates new connection pool.
+# observed_generation: the generation whose connections failed; when the pool has
+# been rebuilt since, the caller reuses that rebuild instead of starting another.
+def create_connection_pool(observed_generation=None):
+    global connection_pool, pool_generation
+
+    with _pool_rebuild_lock:
+        if observed_generation is not None and observed_generation != pool_generation:
+            log.inform("DATABASE", "Connection pool already rebuilt by another thread")
+            return connection_pool is not None
+
+        old_pool = connection_pool
+        try:
+            connection_pool = mysql.connector.pooling.MySQLConnectionPool(
+                pool_name="conn-pool-auth",
+                pool_size=int(config.MYSQL_POOL_SIZE),
+                # keep sessions across checkouts so cached prepared statements survive
+                pool_reset_session=False,
+                # transactions are opened explicitly by the database helpers
+                autocommit=True,
+                host=config.MYSQL_HOST,
+                port=int(config.MYSQL_PORT),
+                user=config.MYSQL_USER,
+                password=config.MYSQL_PASSWORD,
+                database=config.MYSQL_DB,
+                use_pure=True
+            )
+            log.inform("DATABASE", "Connection pool created successfully")
+            created = True
+
+        except mysql.connector.Error as err:
+            log.error("DATABASE", f"Error creating connection pool: {err}")
+            connection_pool = None
+            created = False
+
+        pool_generation += 1
+
+    _drain_pool(old_pool, "DATABASE")
+    return created
+
+# global replica pool, only used when MYSQL_REPLICA_HOST is set
+replica_pool = None
+replica_unavailable_until = 0.0
+_replica_lock = threading.RLock()
+
+# creates the read replica connection pool
+def create_replica_pool():
+    global replica_pool
+
+    if not config.MYSQL_REPLICA_HOST:
         return False
 
+    with _replica_lock:
+        # another thread rebuilt it while this one waited
+        if replica_pool is not None:
+            return True
+
+        try:
+            replica_pool = mysql.connector.pooling.MySQLConnectionPool(
+                pool_name="conn-pool-replica",
+                pool_size=int(config.MYSQL_REPLICA_POOL_SIZE),
+                pool_reset_session=False,
+                autocommit=True,
+                host=config.MYSQL_REPLICA_HOST,
+                port=int(config.MYSQL_REPLICA_PORT),
+                user=config.MYSQL_REPLICA_USER,
+                password=config.MYSQL_REPLICA_PASSWORD,
+                database=config.MYSQL_DB,
+                use_pure=True
+            )
+            log.inform("DATABASE-REPLICA", "Replica connection pool created successfully")
+            return True
+
+        except mysql.connector.Error as err:
+            log.error("DATABASE-REPLICA", f"Error creating replica connection pool: {err}")
+            mark_replica_unavailable()
+            return False
+
+# stops routing reads to the replica for a while
+def mark_replica_unavailable():
+    global replica_pool, replica_unavailable_until
+
+    with _replica_lock:
+        old_pool, replica_pool = replica_pool, None
+        replica_unavailable_until = time.monotonic() + float(config.MYSQL_REPLICA_RETRY_SECONDS)
+    log.warn("DATABASE-REPLICA", f"Reads fall back to primary for {config.MYSQL_REPLICA_RETRY_SECONDS} seconds")
+    _drain_pool(old_pool, "DATABASE-REPLICA")
+
+# replica pool for reads, or None when reads should go to the primary
+def get_replica_pool():
+    if not config.MYSQL_REPLICA_HOST:
+        return None
+
+    if replica_pool is None:
+        if time.monotonic() < replica_unavailable_until:
+            return None
+        create_replica_pool()
+
+    return replica_pool
+
 # initialize database connection w/ retry mechanism.
 def initialize_database_with_retry(max_attempts=10, total_duration_minutes=3):
     
@@ -89,47 +192,90 @@ except Exception as e:
     log.error("DATABASE", f"Initial connection pool creation failed: {e}")
     connection_pool = None
 
-# get database connection from pool w/ automatic retry if pool is null.
+try:
+    create_replica_pool()
+except Exception as e:
+    log.error("DATABASE-REPLICA", f"Initial replica pool creation failed: {e}")
+    replica_pool = None
+
+# background reconnect probe for the circuit breaker: rebuild the pool and ping it
+def probe_database():
+    if not create_connection_pool():
+        return False
+
+    conn = connection_pool.get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+        cursor.close()
+        return True
+    finally:
+        conn.close()
+
+# breaker around primary pool acquisition; requests fail fast while it is open
+database_breaker = CircuitBreaker(
+    name="DATABASE-CIRCUIT",
+    probe=probe_database,
+    failure_threshold=int(config.DB_CIRCUIT_FAILURE_THRESHOLD),
+    probe_interval=float(config.DB_CIRCUIT_PROBE_SECONDS),
+    max_probe_interval=float(config.DB_CIRCUIT_PROBE_MAX_SECONDS),
+    half_open_max_calls=int(config.DB_CIRCUIT_HALF_OPEN_CALLS),
+    half_open_timeout=float(config.DB_CIRCUIT_HALF_OPEN_TIMEOUT_SECONDS),
+)
+
+if config.ENABLE_PROMETRICS:
+    from prometheus_client import Gauge
+    Gauge(
+        "db_circuit_state",
+        "Database circuit breaker state (0 closed, 1 half-open, 2 open)"
+    ).set_function(database_breaker.state_code)
+
+# get database connection from pool, failing fast while the circuit is open.
 def get_db_connection():
     global connection_pool
-    
-    # if connection pool is null, try to initialize it with retry
+
+    if not database_breaker.allow_request():
+        log.warn("DATABASE", "Database circuit is open, skipping connection attempt")
+        return None
+
+    # if connection pool is null, let the breaker's prober rebuild it
     if connection_pool is None:
-        log.warn("DATABASE", "Connection pool is not available. Attempting to initialize with retry...")
-        if not initialize_database_with_retry():
-            log.error("DATABASE", "Failed to initialize connection pool after retry attempts")
-            return None
-        
+        database_breaker.trip("Connection pool is not available")
+        return None
+
     try:
         conn = connection_pool.get_connection()
+        database_breaker.record_success()
         return conn
-        
+
     except mysql.connector.Error as err:
         log.error("DATABASE", f"Error getting connection from pool: {err}")
 
-        log.warn("DATABASE", "Attempting to recreate connection pool...")
-        if create_connection_pool():
-            try:
-                conn = connection_pool.get_connection()
-                return conn
-            except mysql.connector.Error as retry_err:
-                log.error("DATABASE", f"Error getting connection after pool recreation: {retry_err}")
+        # an exhausted pool is load, not an outage; only lost servers count
+        if getattr(err, "errno", None) in (2003, 2006, 2013):
+            database_breaker.record_failure(str(err))
+        else:
+            database_breaker.release()
         return None
 
+    except Exception:
+        database_breaker.release()
+        raise
+
 
 def reset_connection_pool():
     """Reset the connection pool (useful for manual reconnection)."""
-    global connection_pool
-    
-    if connection_pool:
-        try:
-            log.inform("DATABASE", "Closing existing connection pool...")
-            connection_pool = None
-            log.inform("DATABASE", "Connection pool reset successfully")
-        except Exception as e:
-            log.error("DATABASE", f"Error resetting connection pool: {e}")
-    
-    connection_pool = None
+    global connection_pool, pool_generation
+
+    with _pool_rebuild_lock:
+        old_pool, connection_pool = connection_pool, None
+        pool_generation += 1
+
+    if old_pool:
+        log.inform("DATABASE", "Closing existing connection pool...")
+        _drain_pool(old_pool, "DATABASE")
+        log.inform("DATABASE", "Connection pool reset successfully")
 
 # check if db is connected
 def is_database_connected():
@@ -158,9 +304,12 @@ def force_reconnect_database():
 # fetching mail server
 def get_mail_server():
     try:
-        server = smtplib.SMTP(config.MAIL_SERVER_ADDRESS, int(config.MAIL_SERVER_PORT))
-        server.starttls()
-        server.login(config.MAIL_ADDRESS, config.MAIL_PASSKEY)
+        server = smtplib.SMTP(config.MAIL_SERVER_ADDRESS, int(config.MAIL_SERVER_PORT), timeout=float(config.MAIL_TIMEOUT_SECONDS))
+        # a local debugging server (MAIL_STARTTLS=false, empty MAIL_PASSKEY) takes plain unauthenticated mail
+        if config.MAIL_STARTTLS:
+            server.starttls()
+        if config.MAIL_PASSKEY:
+            server.login(config.MAIL_ADDRESS, config.MAIL_PASSKEY)
         return server
     except smtplib.SMTPException as e:
         log.error("MAIL_SRV-ERR", f"SMTP error: {str(e)}")
@@ -1,5 +1,13 @@
-from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+from flask import g, has_app_context
+from ..config import config
 from .log import log
+from .statement_cache import open_cursor
+from .query_metrics import TimedCursor
 from mysql.connector import Error, MySQLConnection
 from mysql.connector.cursor import MySQLCursor
 
@@ -70,120 +78,428 @@ def is_database_available() -> bool:
         return False
 
 
-def _db_executionist(executionLogic, isWrite: bool = False) -> ApiResponse:
+# connection roles
+PRIMARY = "primary"
+REPLICA = "replica"
+
+# errnos meaning the socket to the server is gone
+CONNECTION_ERRNOS = (2003, 2006, 2013)
+
+
+def _close_quietly(conn: Optional[MySQLConnection]) -> None:
+    """Return a connection to the pool, ignoring failures from dead sockets."""
+    if not conn:
+        return
+
+    try:
+        # the pool keeps sessions (and their prepared statements) alive, so an
+        # implicit read transaction must not leak into the next checkout
+        if conn.in_transaction and conn.is_connected():
+            conn.rollback()
+    except Exception:
+        log.warn("db-executionist", "failed to roll back connection")
+
+    try:
+        # dead connections go back too: the pool reconnects them on checkout,
+        # whereas dropping them would shrink the pool for good
+        conn.close()
+    except Exception:
+        log.warn("db-executionist", "failed to close connection")
+
+
+def _acquire_replica_connection() -> Optional[MySQLConnection]:
+    """Check a connection out of the replica pool, or None when reads should use the primary."""
+    from .core import get_replica_pool, mark_replica_unavailable
+
+    replica_pool = get_replica_pool()
+    if not replica_pool:
+        return None
+
+    try:
+        return replica_pool.get_connection()
+    except Error as err:
+        log.warn("db-replica", f"Replica unavailable, reading from primary: {_format_db_error(err)}")
+        mark_replica_unavailable()
+        return None
+
+
+def _acquire_connection(role: str = PRIMARY) -> Tuple[Optional[MySQLConnection], Optional[ApiResponse]]:
+    """Check a connection out of the pool, or return a 503-style failure while the circuit is open.
+
+    Replica requests fall back to the primary when no replica is configured or
+    it cannot hand out a connection.
+    """
+    if role == REPLICA:
+        conn = _acquire_replica_connection()
+        if conn is not None:
+            return conn, None
+
+    # fail fast while the breaker's background prober reconnects
+    from .core import database_breaker
+    if not database_breaker.allow_request():
+        return None, _unavailable_response()
+
     # Get current connection pool dynamically
     current_pool = _get_connection_pool()
-    
-    # Check if connection pool is available
+
+    # a missing pool means the database is down; the prober rebuilds it
     if not current_pool:
-        # Try to initialize connection pool with retry
-        from .core import initialize_database_with_retry
-        log.warn("db-executionist", "Connection pool not available, attempting to initialize with retry...")
-        
-        if not initialize_database_with_retry():
-            msg = "Database connection failed after retry attempts"
-            log.error("db-executionist", msg)
-            return {"success": False, "msg": msg, "errno": None, "sqlstate": None}
-        
-        # Get the newly created pool
-        current_pool = _get_connection_pool()
-        if not current_pool:
-            msg = "Failed to establish database connection pool"
-            log.error("db-executionist", msg)
-            return {"success": False, "msg": msg, "errno": None, "sqlstate": None}
+        database_breaker.trip("Connection pool is not available")
+        return None, _unavailable_response()
+
+    # every checkout reports back, or a half-open trial slot would stay taken;
+    # the pool pings connections on checkout, so getting one proves the server is up
+    try:
+        conn = current_pool.get_connection()
+    except Error as err:
+        if getattr(err, "errno", None) in CONNECTION_ERRNOS:
+            database_breaker.record_failure(_format_db_error(err))
         else:
-            log.inform("db-executionist", "Connection pool successfully established after retry")
+            # e.g. an exhausted pool: load, not an outage
+            database_breaker.release()
+        raise
+    except BaseException:
+        database_breaker.release()
+        raise
+
+    database_breaker.record_success()
+    return conn, None
+
+
+# request-scoped unit of work ==================================================
+
+class UnitOfWork:
+    """Pooled connections shared by every helper call within a request.
+
+    At most one connection per role (primary, replica) is checked out, lazily on
+    first use, and returned to the pool by `release_unit_of_work`, which is
+    registered as an app-context teardown hook. Pool sessions run in autocommit
+    mode, so outside of `transaction()` blocks reads never hold a snapshot and each
+    write helper commits on its own.
+
+    Once the unit has written, later reads stay on the primary so the request sees
+    its own writes regardless of replica lag.
+    """
+
+    def __init__(self):
+        self.conns: Dict[str, MySQLConnection] = {}
+        self.generation: Optional[int] = None
+        self.depth = 0
+        self.failure: Optional[ApiResponse] = None
+        self.wrote = False
+
+    @property
+    def in_transaction(self) -> bool:
+        return self.depth > 0
+
+    def route(self, isWrite: bool) -> str:
+        if isWrite or self.wrote or self.in_transaction:
+            return PRIMARY
+        return REPLICA
+
+    def connection(self, role: str = PRIMARY) -> Tuple[Optional[MySQLConnection], Optional[ApiResponse]]:
+        conn = self.conns.get(role)
+        if conn is not None:
+            return conn, None
+
+        if role == REPLICA:
+            conn = _acquire_replica_connection()
+            if conn is not None:
+                self.conns[REPLICA] = conn
+                return conn, None
+
+            # no replica: share the primary connection instead of taking a second one
+            return self.connection(PRIMARY)
+
+        # remember which pool the checkout went to, for single-flight rebuilds
+        from .core import pool_generation
+        self.generation = pool_generation
+        conn, failure = _acquire_connection(PRIMARY)
+        if failure:
+            return None, failure
+        self.conns[PRIMARY] = conn
+        return conn, None
+
+    def role_of(self, conn: Optional[MySQLConnection]) -> Optional[str]:
+        for role, held in self.conns.items():
+            if held is conn:
+                return role
+        return None
+
+    def discard(self, role: str = PRIMARY) -> None:
+        """Drop a broken connection so the next call checks out a fresh one."""
+        _close_quietly(self.conns.pop(role, None))
+
+    def release(self) -> None:
+        for role, conn in list(self.conns.items()):
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+                    log.warn("db-unit-of-work", "Uncommitted transaction rolled back on release")
+            except Exception as err:
+                log.warn("db-unit-of-work", _format_db_error(err))
+            self.discard(role)
 
-    conn: Optional[MySQLConnection] = None
+        self.depth = 0
+        self.failure = None
+        self.wrote = False
+
+
+# units of work used outside of an application context (startup, worker threads)
+_thread_units = threading.local()
+
+
+def _get_unit_of_work(create: bool = True) -> Optional[UnitOfWork]:
+    """Return the unit of work bound to the current request (or thread, inside `transaction()`)."""
+    unit = getattr(_thread_units, "unit", None)
+    if unit is not None:
+        return unit
+
+    if not has_app_context():
+        return None
+
+    unit = g.get("db_unit_of_work")
+    if unit is None and create:
+        unit = UnitOfWork()
+        g.db_unit_of_work = unit
+    return unit
+
+
+def release_unit_of_work(exc: Optional[BaseException] = None) -> None:
+    """Teardown hook: hands the request connections back to the pool."""
+    unit = g.pop("db_unit_of_work", None)
+    if unit is not None:
+        unit.release()
+
+
+class Transaction:
+    """Outcome of a `transaction()` block; `error` holds the first failed helper result."""
 
+    def __init__(self):
+        self.success = True
+        self.error: Optional[ApiResponse] = None
+
+
+@contextmanager
+def transaction() -> Iterator[Transaction]:
+    """Run every helper call in the block on one primary connection and commit them together.
+
+    A helper that fails inside the block marks the transaction rollback-only: later
+    helpers return the same failure without touching the database, and the block
+    rolls back on exit. Nested blocks join the outermost transaction.
+    """
+    state = Transaction()
+    unit = _get_unit_of_work()
+    thread_owned = unit is None
+    if thread_owned:
+        unit = UnitOfWork()
+        _thread_units.unit = unit
+
+    outermost = unit.depth == 0
     try:
-        conn = current_pool.get_connection()
+        if outermost:
+            unit.failure = None
+            conn, failure = unit.connection(PRIMARY)
+            if failure:
+                unit.failure = failure
+            else:
+                try:
+                    conn.start_transaction()
+                except Error as err:
+                    unit.discard(PRIMARY)
+                    unit.failure = _failure_response(err)
+
+        unit.depth += 1
+        try:
+            yield state
+        except BaseException:
+            if outermost:
+                _end_transaction(unit, commit=False)
+            raise
+        finally:
+            unit.depth -= 1
+
+        if outermost:
+            _end_transaction(unit, commit=unit.failure is None)
+
+        if unit.failure is not None:
+            state.success = False
+            state.error = unit.failure
+    finally:
+        if outermost:
+            unit.failure = None
+        if thread_owned:
+            _thread_units.unit = None
+            unit.release()
 
-        # for execute queries
-        if isWrite and getattr(conn, "autocommit", None) is True:
-            conn.autocommit = False
 
-        # execute current setup
-        with conn.cursor(dictionary=True, buffered=True) as cursor:
-            result_data = executionLogic(cursor)
+def _end_transaction(unit: UnitOfWork, commit: bool) -> None:
+    conn = unit.conns.get(PRIMARY)
+    if conn is None:
+        return
 
-        # commit the executed queries
-        if isWrite:
+    try:
+        if commit:
             conn.commit()
             log.inform("db-executionist", "Transaction committed successfully")
+        else:
+            conn.rollback()
+            log.inform("db-executionist-rollback", "Transaction rolled back due to error")
+    except Error as err:
+        log.error("db-executionist", _format_db_error(err))
+        if unit.failure is None:
+            unit.failure = _failure_response(err)
+        unit.discard(PRIMARY)
+
+
+def _unavailable_response() -> ApiResponse:
+    return {
+        "success": False,
+        "msg": "Database temporarily unavailable",
+        "errno": None,
+        "sqlstate": None,
+        "unavailable": True,
+    }
 
-        # return paldo
+
+def _failure_response(err: Exception) -> ApiResponse:
+    return {
+        "success": False,
+        "msg": _format_db_message(err),
+        "errno": getattr(err, "errno", None),
+        "sqlstate": getattr(err, "sqlstate", None),
+    }
+
+
+def _run_logic(conn: MySQLConnection, executionLogic, isWrite: bool, manage_transaction: bool, role: str = PRIMARY, dictionary: bool = True):
+    """Execute the logic on a connection, wrapping writes in their own transaction when asked."""
+    if isWrite and manage_transaction:
+        conn.start_transaction()
+
+    with TimedCursor(open_cursor(conn, dictionary), role) as cursor:
+        result_data = executionLogic(cursor)
+
+    if isWrite and manage_transaction:
+        conn.commit()
+        log.inform("db-executionist", "Transaction committed successfully")
+
+    return result_data
+
+
+def _record_reachable(role: Optional[str]) -> None:
+    if role == PRIMARY:
+        from .core import database_breaker
+        database_breaker.record_success()
+
+
+def _execute_in_unit(unit: UnitOfWork, executionLogic, isWrite: bool, dictionary: bool = True) -> ApiResponse:
+    # a failed statement already doomed the surrounding transaction
+    if unit.in_transaction and unit.failure is not None:
+        return unit.failure
+
+    role = unit.route(isWrite)
+    conn = None
+
+    try:
+        conn, failure = unit.connection(role)
+        if failure:
+            if unit.in_transaction:
+                unit.failure = failure
+            return failure
+
+        result_data = _run_logic(conn, executionLogic, isWrite, not unit.in_transaction, unit.role_of(conn) or role, dictionary)
+        if isWrite:
+            unit.wrote = True
+        _record_reachable(unit.role_of(conn))
         return {"success": True, "data": result_data}
 
     except Error as err:
-        # Check if it's a connection-related error and try to recover
         errno = getattr(err, "errno", None)
-        if errno in [2003, 2006, 2013]:  # Connection errors
+
+        # replica checkout errors are absorbed by the fallback, so a failed
+        # checkout always came from the primary pool
+        role = unit.role_of(conn) if conn is not None else PRIMARY
+
+        # the server answered, even if with an error
+        if errno not in CONNECTION_ERRNOS and conn is not None:
+            _record_reachable(role)
+
+        # a dropped connection can be retried once, unless earlier statements of an
+        # explicit transaction were lost with it
+        if errno in CONNECTION_ERRNOS and not unit.in_transaction:
             log.warn("db-executionist", f"Connection error detected (errno: {errno}), attempting recovery...")
-            
-            # Try to recreate connection pool
-            from .core import create_connection_pool
-            if create_connection_pool():
-                log.inform("db-executionist", "Connection pool recreated, retrying operation...")
-                # Retry the operation once with new pool
+            unit.discard(role)
+
+            recovered = True
+            if role == REPLICA:
+                # let the primary serve reads until the replica comes back
+                from .core import mark_replica_unavailable
+                mark_replica_unavailable()
+                role = PRIMARY
+            else:
+                from .core import create_connection_pool, database_breaker
+                # checkout failures were already counted by _acquire_connection
+                if conn is not None:
+                    database_breaker.record_failure(_format_db_error(err))
+
+                # concurrent failures on the same pool wait for one rebuild and reuse it
+                # (a state check, not allow_request: the retry's own checkout takes any trial slot)
+                recovered = database_breaker.state != database_breaker.OPEN and create_connection_pool(unit.generation)
+
+            if recovered:
+                log.inform("db-executionist", "Connection recovered, retrying operation...")
                 try:
-                    new_pool = _get_connection_pool()
-                    if new_pool:
-                        conn = new_pool.get_connection()
-                        
-                        if isWrite and getattr(conn, "autocommit", None) is True:
-                            conn.autocommit = False
-                        
-                        with conn.cursor(dictionary=True, buffered=True) as cursor:
-                            result_data = executionLogic(cursor)
-                        
-                        if isWrite:
-                            conn.commit()
-                            log.inform("db-executionist", "Transaction committed successfully after retry")
-                        
-                        return {"success": True, "data": result_data}
-                        
+                    conn, failure = unit.connection(role)
+                    if failure:
+                        return failure
+                    return {"success": True, "data": _run_logic(conn, executionLogic, isWrite, True, unit.role_of(conn) or role, dictionary)}
                 except Error as retry_err:
                     log.error("db-executionist", f"Retry failed: {_format_db_error(retry_err)}")
-                    err = retry_err  # Use the retry error for final response
-        
+                    err = retry_err
+
         # rollback if something went wrong
-        if isWrite and conn:
+        conn = unit.conns.get(role)
+        if isWrite and not unit.in_transaction and conn is not None:
             try:
                 conn.rollback()
                 log.inform("db-executionist-rollback", "Transaction rolled back due to error")
             except Exception as rollback_err:
                 log.warn("db-executionist-rollback", _format_db_error(rollback_err))
+                unit.discard(role)
 
-        # formats the error trace
-        formatted_err = _format_db_error(err)
+        log.error("db-executionist", _format_db_error(err))
 
-        # log the error on system
-        log.error("db-executionist", formatted_err)
+        response = _failure_response(err)
+        if unit.in_transaction:
+            unit.failure = response
+        return response
 
-        return {
-            "success": False,
-            "msg": _format_db_message(err),
-            "errno": getattr(err, "errno", None),
-            "sqlstate": getattr(err, "sqlstate", None),
-        }
 
+def _db_executionist(executionLogic, isWrite: bool = False, dictionary: bool = True) -> ApiResponse:
+    # reuse the request (or transaction) connections when there are any
+    unit = _get_unit_of_work()
+    if unit is not None:
+        return _execute_in_unit(unit, executionLogic, isWrite, dictionary)
+
+    # outside of a request: a throwaway unit checks out and returns per call
+    unit = UnitOfWork()
+    try:
+        return _execute_in_unit(unit, executionLogic, isWrite, dictionary)
     finally:
-        # close connection after performing the opration
-        if conn and getattr(conn, "is_connected", lambda: False)():
-            try:
-                conn.close()
-            except Exception:
-                log.warn("db-executionist", "failed to close connection")
-                pass
+        unit.release()
 
 
 # fetches all the record
-def fetch_all(query: str, parameters: Optional[Params] = None) -> ApiResponse:
+# compact: tuple rows returned as {"columns": [...], "rows": [[...]]}, which skips
+# building a dict per row and repeating every column name in the JSON output
+def fetch_all(query: str, parameters: Optional[Params] = None, compact: bool = False) -> ApiResponse:
     def logic(cursor: MySQLCursor):
         cursor.execute(query, parameters or ())
-        return cursor.fetchall()
-    return _db_executionist(logic)
+        rows = cursor.fetchall()
+        if compact:
+            return {"columns": list(cursor.column_names), "rows": rows}
+        return rows
+    return _db_executionist(logic, dictionary=not compact)
 
 
 # fetches the first record
@@ -194,6 +510,89 @@ def fetch_one(query: str, parameters: Optional[Params] = None) -> ApiResponse:
     return _db_executionist(logic)
 
 
+# streams the records of one query
+class RowStream:
+    """Rows of an unbuffered query, read `fetch_size` at a time from a dedicated connection.
+
+    The connection is not the request's unit of work: an unbuffered result keeps the
+    socket busy until the last row is read, which may be long after the view returns.
+    """
+
+    def __init__(self, conn: MySQLConnection, cursor: MySQLCursor, fetch_size: int):
+        self.conn = conn
+        self.cursor = cursor
+        self.fetch_size = fetch_size
+        self.exhausted = False
+        self.closed = False
+
+    @property
+    def column_names(self) -> Tuple[str, ...]:
+        return tuple(self.cursor.column_names)
+
+    def __iter__(self):
+        try:
+            while True:
+                rows = self.cursor.fetchmany(self.fetch_size)
+                if not rows:
+                    break
+                yield from rows
+            self.exhausted = True
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+
+        if self.exhausted:
+            try:
+                self.cursor.close()
+            except Error as err:
+                log.warn("db-stream", _format_db_error(err))
+            _close_quietly(self.conn)
+            return
+
+        # unread rows are still on the wire; dropping the socket is cheaper than
+        # draining them, and the pool reconnects it on the next checkout
+        log.warn("db-stream", "Stream closed before the last row, discarding connection")
+        try:
+            getattr(self.conn, "_cnx", self.conn).disconnect()
+        except Exception as err:
+            log.warn("db-stream", _format_db_error(err))
+        try:
+            self.conn.close()
+        except Exception:
+            log.warn("db-stream", "failed to return connection to pool")
+
+
+def fetch_iter(query: str, parameters: Optional[Params] = None, fetch_size: Optional[int] = None, compact: bool = False, role: str = REPLICA) -> ApiResponse:
+    """Executes the query eagerly and returns a `RowStream` of its records as data.
+
+    With `compact` the stream yields tuples; `RowStream.column_names` names them.
+    Streams read from the replica unless `role` is PRIMARY, which callers that
+    write back what they read need so replica lag cannot hide rows from them.
+    """
+    conn: Optional[MySQLConnection] = None
+    try:
+        conn, failure = _acquire_connection(role)
+        if failure:
+            return failure
+
+        cursor = TimedCursor(conn.cursor(dictionary=not compact), role)
+        cursor.execute(query, parameters or ())
+
+        return {
+            "success": True,
+            "data": RowStream(conn, cursor, fetch_size or int(config.MYSQL_STREAM_FETCH_SIZE))
+        }
+
+    except Error as err:
+        log.error("db-stream", _format_db_error(err))
+        _close_quietly(conn)
+        return _failure_response(err)
+
+
 # runs one query
 def execute_single(query: str, params: Optional[Params] = None) -> ApiResponse:
     def logic(cursor: MySQLCursor):
@@ -206,12 +605,22 @@ def execute_single(query: str, params: Optional[Params] = None) -> ApiResponse:
 
 
 # runs multiple queries
-def execute_many(query: str, params_list: Sequence[Params]) -> ApiResponse:
+def execute_many(query: str, params_list: Sequence[Params], chunk_size: Optional[int] = None) -> ApiResponse:
+    """Batch an INSERT into multi-row statements of at most `chunk_size` rows, all in one transaction."""
+    size = max(1, int(chunk_size or config.MYSQL_BATCH_CHUNK_SIZE))
+
     def logic(cursor: MySQLCursor):
-        cursor.executemany(query, params_list)
+        total_rowcount = 0
+        last_id = None
+        for start in range(0, len(params_list), size):
+            cursor.executemany(query, params_list[start:start + size])
+            total_rowcount += cursor.rowcount
+            if cursor.lastrowid:
+                last_id = cursor.lastrowid
         return {
-            "rowcount": cursor.rowcount,
-            "lastrowid": cursor.lastrowid
+            "rowcount": total_rowcount,
+            "lastrowid": last_id,
+            "chunks": -(-len(params_list) // size)
         }
     return _db_executionist(logic, isWrite=True)
 
@@ -248,6 +657,31 @@ def fetch_scalar(query: str, params: Optional[Params] = None) -> ApiResponse:
     return {"success": True, "data": None}
 
 
+# database clock minus this process's clock, in seconds, and when it was last measured
+_clock_offset: Optional[Tuple[float, float]] = None
+_CLOCK_RESYNC_SECONDS = 300
+
+
+def database_now() -> datetime:
+    """The database's NOW() without a round trip, for timestamps taken before a row is written.
+
+    Rows written later (e.g. by the activity write-behind queue) are stamped with
+    this so they agree with CURRENT_TIMESTAMP and CURDATE(), whatever the time
+    zones of the two hosts. Falls back to the local clock until one read succeeds.
+    """
+    global _clock_offset
+
+    if _clock_offset is None or time.monotonic() - _clock_offset[1] > _CLOCK_RESYNC_SECONDS:
+        sent = time.time()
+        result = fetch_scalar("SELECT NOW(6)")
+        if result['success'] and result['data'] is not None:
+            _clock_offset = (result['data'].timestamp() - (sent + time.time()) / 2, time.monotonic())
+
+    if _clock_offset is None:
+        return datetime.now()
+    return datetime.fromtimestamp(time.time() + _clock_offset[0])
+
+
 def test_database_connection() -> ApiResponse:
     try:
         result = fetch_one("SELECT 1 as test_value")
@@ -0,0 +1,204 @@
+import hashlib
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional
+import numpy as np
+from ..config import config
+from . import database
+from .log import log
+
+
+class HyperLogLog:
+    """Fixed-memory distinct counter (Flajolet et al.) with 2**precision registers.
+
+    Standard error is 1.04 / sqrt(2**precision): about 1.6% at the default
+    precision of 12 (4 KiB per sketch). Adding the same value twice is a no-op,
+    and sketches of the same precision merge by taking register maxima, so
+    per-bucket sketches combine without double counting.
+    """
+
+    def __init__(self, precision: int = 12, registers: Optional[np.ndarray] = None):
+        if not 4 <= precision <= 16:
+            raise ValueError("precision must be between 4 and 16")
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = registers if registers is not None else np.zeros(self.m, dtype=np.uint8)
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / np.sqrt(self.m)
+
+    def add(self, value: Any) -> None:
+        hashed = int.from_bytes(hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).digest(), "big")
+        index = hashed >> (64 - self.precision)
+        remainder = hashed & ((1 << (64 - self.precision)) - 1)
+        # position of the first set bit in the remaining 64 - precision bits
+        rank = (64 - self.precision) - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values: Iterable[Any]) -> None:
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        if other.precision != self.precision:
+            raise ValueError("cannot merge sketches of different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    @classmethod
+    def union(cls, sketches: Iterable["HyperLogLog"], precision: int = 12) -> "HyperLogLog":
+        merged = cls(precision)
+        for sketch in sketches:
+            merged.merge(sketch)
+        return merged
+
+    def count(self) -> int:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int32)))
+
+        # small range correction: linear counting while registers are still empty
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        return bytes([self.precision]) + self.registers.tobytes()
+
+    @classmethod
+    def from_bytes(cls, payload: bytes) -> "HyperLogLog":
+        return cls(payload[0], np.frombuffer(payload[1:], dtype=np.uint8).copy())
+
+
+class ActiveAccountsTracker:
+    """Per time-bucket sketches of the account ids seen in account_logs.
+
+    account_logs is written by another service, so the sketches are fed by
+    tailing the table from a created_at watermark at most once every
+    ACTIVE_ACCOUNTS_REFRESH_SECONDS. created_at is set when a row is written,
+    not when it commits, so each read starts `overlap` before the watermark to
+    pick up rows that committed late; re-reading rows is harmless because
+    sketch inserts are idempotent.
+
+    The sketches live in this process only and are not merged across gunicorn
+    workers; every worker tails account_logs and keeps its own copy.
+    """
+
+    def __init__(self, bucket_seconds: int, retention: timedelta, precision: int, overlap: timedelta):
+        self.bucket_seconds = bucket_seconds
+        self.retention = retention
+        self.precision = precision
+        self.overlap = overlap
+        # bucket number -> {"all": sketch, "login": sketch}
+        self.buckets: Dict[int, Dict[str, HyperLogLog]] = {}
+        self.watermark: Optional[datetime] = None
+        self.now: Optional[datetime] = None
+        self.refreshed_at = 0.0
+        self._lock = threading.Lock()
+
+    def _bucket(self, moment: datetime) -> int:
+        return int(moment.timestamp()) // self.bucket_seconds
+
+    def observe(self, account_id: Any, action: str, created_at: datetime) -> None:
+        sketches = self.buckets.get(self._bucket(created_at))
+        if sketches is None:
+            sketches = {"all": HyperLogLog(self.precision), "login": HyperLogLog(self.precision)}
+            self.buckets[self._bucket(created_at)] = sketches
+
+        sketches["all"].add(account_id)
+        if action == "login":
+            sketches["login"].add(account_id)
+
+    def refresh(self) -> bool:
+        if time.monotonic() - self.refreshed_at < float(config.ACTIVE_ACCOUNTS_REFRESH_SECONDS):
+            return True
+
+        with self._lock:
+            if time.monotonic() - self.refreshed_at < float(config.ACTIVE_ACCOUNTS_REFRESH_SECONDS):
+                return True
+
+            now = database.fetch_scalar("SELECT NOW();")
+            if not now['success']:
+                return False
+
+            since = self.watermark - self.overlap if self.watermark else now['data'] - self.retention
+            stream = database.fetch_iter(
+                "SELECT account_id, action, created_at FROM account_logs WHERE created_at >= %s;",
+                (since, ),
+                compact=True
+            )
+            if not stream['success']:
+                return False
+
+            rows = stream['data']
+            try:
+                for account_id, action, created_at in rows:
+                    self.observe(account_id, action, created_at)
+                    if self.watermark is None or created_at > self.watermark:
+                        self.watermark = created_at
+            finally:
+                rows.close()
+
+            if self.watermark is None:
+                self.watermark = since
+
+            # forget buckets older than the retention window
+            oldest = self._bucket(now['data'] - self.retention)
+            for bucket in [bucket for bucket in self.buckets if bucket < oldest]:
+                del self.buckets[bucket]
+
+            self.now = now['data']
+            self.refreshed_at = time.monotonic()
+            return True
+
+    def estimate(self, window: timedelta, kind: str = "all") -> Optional[int]:
+        """Approximate distinct accounts over the last `window` (bucket-aligned), None when unavailable."""
+        if window > self.retention or not self.refresh():
+            return None
+
+        # database clock at the last refresh, advanced by the local clock since then
+        now = self.now + timedelta(seconds=time.monotonic() - self.refreshed_at)
+        first = self._bucket(now - window)
+        return HyperLogLog.union(
+            (sketches[kind] for bucket, sketches in list(self.buckets.items()) if bucket >= first),
+            self.precision
+        ).count()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "buckets": len(self.buckets),
+            "bucket_seconds": self.bucket_seconds,
+            "watermark": self.watermark.isoformat() if self.watermark else None,
+            "relative_error": round(float(1.04 / np.sqrt(1 << self.precision)), 4),
+        }
+
+
+active_accounts = ActiveAccountsTracker(
+    bucket_seconds=int(config.ACTIVE_ACCOUNTS_BUCKET_SECONDS),
+    retention=timedelta(hours=24),
+    precision=int(config.ACTIVE_ACCOUNTS_HLL_PRECISION),
+    overlap=timedelta(seconds=int(config.ACTIVE_ACCOUNTS_OVERLAP_SECONDS)),
+)
+
+
+def count_active_accounts(window: timedelta, logins_only: bool = False, exact: bool = False):
+    """Distinct accounts in account_logs over the last `window`: HyperLogLog estimate or exact COUNT(DISTINCT)."""
+    if not exact and not config.ACTIVE_ACCOUNTS_EXACT:
+        estimate = active_accounts.estimate(window, "login" if logins_only else "all")
+        if estimate is not None:
+            return {"success": True, "data": estimate}
+        log.warn("ACTIVE-ACCOUNTS", "Sketches unavailable, counting exactly")
+
+    query = """
+        SELECT COUNT(DISTINCT account_id) AS total
+        FROM account_logs
+        WHERE created_at >= NOW() - INTERVAL %s SECOND
+    """
+    if logins_only:
+        query += " AND action = 'login'"
+
+    return database.fetch_scalar(query + ";", (int(window.total_seconds()), ))
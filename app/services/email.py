@@ -1,11 +1,15 @@
-import smtplib
 from ..config import config
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from .core import get_mail_server
+from .mail_dispatcher import mail_dispatcher
 
 
-def send_email(receiver: str, subject: str, body: str, html_body: str = None):
+def send_email(receiver: str, subject: str, body: str, html_body: str = None, wait: bool = False):
+    """Queue an email for the background dispatcher; with `wait` block until it is sent or given up.
+
+    Without `wait` the result only says the message was accepted: it carries
+    `queued: True` and the delivery outcome is logged by the dispatcher.
+    """
     try:
         message = MIMEMultipart("alternative")
         message["From"] = f"{"System"} <{config.MAIL_ADDRESS}>"
@@ -27,14 +31,12 @@ def send_email(receiver: str, subject: str, body: str, html_body: str = None):
             """
             message.attach(MIMEText(html_content, "html"))
 
-        server = get_mail_server()
-        if not server:
-            return {"success": False, "msg": "Mail server connection failed"}
-
-        server.sendmail(config.MAIL_ADDRESS, receiver, message.as_string())
-        server.quit()
+        sent = mail_dispatcher.submit(message, receiver)
+        if wait or sent.done():
+            return sent.result()
 
-        return {"success": True, "msg": "Email sent successfully"}
+        # accepted, not delivered: callers that must know use wait=True
+        return {"success": True, "queued": True, "msg": "Email queued"}
 
     except Exception as err:
         return {"success": False, "msg": f"Failed to send email: {err}"}
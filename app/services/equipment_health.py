@@ -0,0 +1,271 @@
+from typing import Any, Dict, Iterable, List, Optional
+from ..config import config
+from . import database
+from .log import log
+
+HEALTH_TABLE = "equipment_set_health"
+
+# one bit per reason an equipment set needs attention
+POWER_CABLE_UNPLUGGED = 1 << 0
+DISPLAY_CABLE_UNPLUGGED = 1 << 1
+CONNECTIVITY_UNSTABLE = 1 << 2
+PERFORMANCE_UNSTABLE = 1 << 3
+UNDER_MAINTENANCE = 1 << 4
+ISSUE_REPORTED = 1 << 5
+SYSTEM_UNIT_INCOMPLETE = 1 << 6
+MONITOR_INCOMPLETE = 1 << 7
+KEYBOARD_INCOMPLETE = 1 << 8
+MOUSE_INCOMPLETE = 1 << 9
+AVR_INCOMPLETE = 1 << 10
+HEADSET_INCOMPLETE = 1 << 11
+
+ISSUE_NAMES = {
+    POWER_CABLE_UNPLUGGED: "power_cable_unplugged",
+    DISPLAY_CABLE_UNPLUGGED: "display_cable_unplugged",
+    CONNECTIVITY_UNSTABLE: "connectivity_unstable",
+    PERFORMANCE_UNSTABLE: "performance_unstable",
+    UNDER_MAINTENANCE: "under_maintenance",
+    ISSUE_REPORTED: "issue_reported",
+    SYSTEM_UNIT_INCOMPLETE: "system_unit_incomplete",
+    MONITOR_INCOMPLETE: "monitor_incomplete",
+    KEYBOARD_INCOMPLETE: "keyboard_incomplete",
+    MOUSE_INCOMPLETE: "mouse_incomplete",
+    AVR_INCOMPLETE: "avr_incomplete",
+    HEADSET_INCOMPLETE: "headset_incomplete",
+}
+
+# component prefix -> bit, and the set flag that makes the component required (None: always)
+_COMPONENTS = (
+    ("system_unit", SYSTEM_UNIT_INCOMPLETE, None),
+    ("monitor", MONITOR_INCOMPLETE, None),
+    ("keyboard", KEYBOARD_INCOMPLETE, None),
+    ("mouse", MOUSE_INCOMPLETE, None),
+    ("avr", AVR_INCOMPLETE, "requires_avr"),
+    ("headset", HEADSET_INCOMPLETE, "requires_headset"),
+)
+
+_SOURCE_QUERY = """
+    SELECT
+        es.id, es.location_id,
+        es.requires_avr, es.requires_headset,
+        es.plugged_power_cable, es.plugged_display_cable,
+        es.connectivity, es.performance, es.status, es.issue,
+        esc.system_unit_name, esc.system_unit_serial_number,
+        esc.monitor_name, esc.monitor_serial_number,
+        esc.keyboard_name, esc.keyboard_serial_number,
+        esc.mouse_name, esc.mouse_serial_number,
+        esc.avr_name, esc.avr_serial_number,
+        esc.headset_name, esc.headset_serial_number
+    FROM equipment_sets AS es
+    LEFT JOIN equipment_set_components AS esc
+        ON es.id = esc.equipment_set_id
+"""
+
+
+def _is_true(value: Any) -> bool:
+    return value is True or value == 1 or str(value).lower() in ("1", "true")
+
+
+def _is_false(value: Any) -> bool:
+    # NULL is unknown, not unplugged
+    return value is not None and (value is False or value == 0 or str(value).lower() in ("0", "false"))
+
+
+def _is_blank(value: Any) -> bool:
+    return value is None or str(value).strip() == ""
+
+
+def evaluate(row: Dict[str, Any]) -> int:
+    """Issue bitmask of one equipment set row joined with its components."""
+    mask = 0
+
+    if _is_false(row.get("plugged_power_cable")):
+        mask |= POWER_CABLE_UNPLUGGED
+    if _is_false(row.get("plugged_display_cable")):
+        mask |= DISPLAY_CABLE_UNPLUGGED
+    if row.get("connectivity") == "unstable":
+        mask |= CONNECTIVITY_UNSTABLE
+    if row.get("performance") == "unstable":
+        mask |= PERFORMANCE_UNSTABLE
+    if row.get("status") == "maintenance":
+        mask |= UNDER_MAINTENANCE
+    if not _is_blank(row.get("issue")):
+        mask |= ISSUE_REPORTED
+
+    for component, bit, required_by in _COMPONENTS:
+        if required_by is not None and not _is_true(row.get(required_by)):
+            continue
+        if _is_blank(row.get(f"{component}_name")) or _is_blank(row.get(f"{component}_serial_number")):
+            mask |= bit
+
+    return mask
+
+
+def describe(mask: int) -> List[str]:
+    return [name for bit, name in ISSUE_NAMES.items() if mask & bit]
+
+
+def ensure_health_table() -> bool:
+    created = database.execute_single(f"""
+        CREATE TABLE IF NOT EXISTS {HEALTH_TABLE} (
+            equipment_set_id VARCHAR(64) NOT NULL PRIMARY KEY,
+            location_id VARCHAR(64) NOT NULL,
+            issue_mask INT UNSIGNED NOT NULL DEFAULT 0,
+            has_issue BOOLEAN NOT NULL DEFAULT FALSE,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            INDEX idx_health_has_issue (has_issue),
+            INDEX idx_health_location_has_issue (location_id, has_issue)
+        );
+    """)
+    if not created['success']:
+        log.error("EQUIPMENT-HEALTH", f"Failed to create {HEALTH_TABLE}: {created['msg']}")
+        return False
+
+    # first deploy: evaluate every existing set
+    populated = database.fetch_scalar(f"SELECT 1 FROM {HEALTH_TABLE} LIMIT 1;")
+    if populated['success'] and populated['data'] is None:
+        rebuild_health()
+    return True
+
+
+_UPSERT_QUERY = f"""
+    INSERT INTO {HEALTH_TABLE} (equipment_set_id, location_id, issue_mask, has_issue)
+    VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        location_id = VALUES(location_id),
+        issue_mask = VALUES(issue_mask),
+        has_issue = VALUES(has_issue);
+"""
+
+
+def _store(rows: List[Dict[str, Any]]):
+    params_list = []
+    for row in rows:
+        mask = evaluate(row)
+        params_list.append((row["id"], row["location_id"], mask, mask != 0))
+    return database.execute_many(_UPSERT_QUERY, params_list)
+
+
+def refresh_health(equipment_set_ids: Iterable[str]):
+    """Re-evaluate the given sets after a write; joins the caller's transaction.
+
+    Sets that no longer exist lose their health row.
+    """
+    ids = list(dict.fromkeys(equipment_set_ids))
+    size = int(config.MYSQL_BATCH_CHUNK_SIZE)
+    result = {"success": True, "data": None}
+
+    for start in range(0, len(ids), size):
+        chunk = ids[start:start + size]
+        placeholders = ", ".join(["%s"] * len(chunk))
+
+        fetched = database.fetch_all(_SOURCE_QUERY + f" WHERE es.id IN ({placeholders});", tuple(chunk))
+        if not fetched['success']:
+            return fetched
+
+        found = {row["id"] for row in fetched['data']}
+        missing = [equipment_set_id for equipment_set_id in chunk if equipment_set_id not in found]
+
+        if fetched['data']:
+            result = _store(fetched['data'])
+            if not result['success']:
+                return result
+
+        if missing:
+            result = database.execute_single(
+                f"DELETE FROM {HEALTH_TABLE} WHERE equipment_set_id IN ({', '.join(['%s'] * len(missing))});",
+                tuple(missing)
+            )
+            if not result['success']:
+                return result
+
+    return result
+
+
+def refresh_location_health(location_id: str):
+    """Re-evaluate every set that is, or was until this write, in a location; joins the caller's transaction.
+
+    Called after a location is edited or deleted: the health rows still list
+    sets that a cascading delete has already removed.
+    """
+    fetched = database.fetch_all(
+        f"""
+            SELECT equipment_set_id AS id FROM {HEALTH_TABLE} WHERE location_id = %s
+            UNION
+            SELECT id FROM equipment_sets WHERE location_id = %s;
+        """,
+        (location_id, location_id)
+    )
+    if not fetched['success']:
+        return fetched
+    return refresh_health([row["id"] for row in fetched['data']])
+
+
+def rebuild_health():
+    """Re-evaluate every equipment set and drop rows of deleted sets."""
+    with database.transaction() as tx:
+        fetched = database.fetch_all(_SOURCE_QUERY + ";")
+        if fetched['success'] and fetched['data']:
+            _store(fetched['data'])
+        database.execute_single(
+            f"DELETE FROM {HEALTH_TABLE} WHERE equipment_set_id NOT IN (SELECT id FROM equipment_sets);"
+        )
+
+    if not tx.success:
+        log.error("EQUIPMENT-HEALTH", f"Failed to rebuild {HEALTH_TABLE}: {tx.error['msg']}")
+        return tx.error
+
+    log.inform("EQUIPMENT-HEALTH", f"Evaluated {len(fetched['data'])} equipment set/s")
+    return {"success": True, "data": len(fetched['data'])}
+
+
+def count_with_issues(location_id: Optional[str] = None):
+    """{total, issues} from the health table, optionally for one location."""
+    query = f"""
+        SELECT
+            COUNT(*) AS total,
+            COUNT(CASE WHEN has_issue THEN 1 END) AS issues
+        FROM {HEALTH_TABLE}
+    """
+    params = ()
+
+    if location_id is not None:
+        query += " WHERE location_id = %s"
+        params = (location_id, )
+
+    return database.fetch_one(query + ";", params)
+
+
+def location_breakdown():
+    """Per location: total sets, sets with issues and a count per issue type, in one grouped pass."""
+    issue_columns = ",\n            ".join(
+        f"COALESCE(SUM((h.issue_mask & {bit}) <> 0), 0) AS {name}" for bit, name in ISSUE_NAMES.items()
+    )
+    query = f"""
+        SELECT
+            l.id AS location_id,
+            l.name AS location_name,
+            COUNT(h.equipment_set_id) AS total,
+            COUNT(CASE WHEN h.has_issue THEN 1 END) AS issues,
+            {issue_columns}
+        FROM locations AS l
+        LEFT JOIN {HEALTH_TABLE} AS h
+            ON h.location_id = l.id
+        GROUP BY l.id, l.name
+        ORDER BY l.name;
+    """
+
+    fetched = database.fetch_all(query)
+    if not fetched['success']:
+        return fetched
+
+    return {"success": True, "data": [
+        {
+            "location_id": row["location_id"],
+            "location_name": row["location_name"],
+            "total": int(row["total"]),
+            "issues": int(row["issues"]),
+            "breakdown": {name: int(row[name]) for name in ISSUE_NAMES.values()},
+        }
+        for row in fetched['data']
+    ]}
@@ -0,0 +1,244 @@
+import itertools
+import json
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from ..config import config
+from . import database
+from .log import log
+
+
+class Subscription:
+    """One connected client: a bounded queue the broadcaster pushes into."""
+
+    def __init__(self, size: int):
+        self.queue: "queue.Queue[Optional[Tuple[str, str, Dict[str, Any]]]]" = queue.Queue(maxsize=size)
+        self.lagging = False
+
+
+class Broadcaster:
+    """In-process fan-out of feed events to SSE clients.
+
+    Every event gets an id `<boot>-<sequence>`. The last `history_size` events
+    are kept so a reconnecting client resumes from its Last-Event-ID; ids from
+    another process or older than the history get a `reset` event instead,
+    telling the client to reload the feed once. A client whose queue fills up
+    is disconnected rather than slowing the writers down.
+
+    Subscribers live in this process only: with several gunicorn workers a
+    client sees just the edits made through its own worker, so the app is
+    served by a single (threaded) worker. Each open stream holds one of its
+    threads, hence `max_subscribers`, kept below the thread count so ordinary
+    requests still get served.
+    """
+
+    def __init__(self, history_size: int, client_queue_size: int, max_subscribers: int):
+        self.boot = uuid.uuid4().hex[:8]
+        self.client_queue_size = client_queue_size
+        self.max_subscribers = max_subscribers
+        self.history: "deque[Tuple[int, str, Dict[str, Any]]]" = deque(maxlen=history_size)
+        self.subscribers: List[Subscription] = []
+        self._sequence = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def has_subscribers(self) -> bool:
+        return bool(self.subscribers)
+
+    def publish(self, kind: str, data: Dict[str, Any]) -> None:
+        with self._lock:
+            sequence = next(self._sequence)
+            self.history.append((sequence, kind, data))
+            event = (f"{self.boot}-{sequence}", kind, data)
+
+            for subscription in self.subscribers:
+                try:
+                    subscription.queue.put_nowait(event)
+                except queue.Full:
+                    subscription.lagging = True
+
+    def subscribe(self, last_event_id: Optional[str]) -> Tuple[Optional[Subscription], List[Tuple[str, str, Dict[str, Any]]]]:
+        """Register a client; returns it with the backlog it missed since `last_event_id`, or None when full."""
+        subscription = Subscription(self.client_queue_size)
+
+        with self._lock:
+            if len(self.subscribers) >= self.max_subscribers:
+                return None, []
+
+            backlog = []
+            if last_event_id:
+                boot, _, sequence = last_event_id.partition("-")
+                oldest = self.history[0][0] if self.history else None
+
+                if boot != self.boot or not sequence.isdigit() or (oldest is not None and int(sequence) < oldest - 1):
+                    backlog.append((f"{self.boot}-0", "reset", {}))
+                else:
+                    backlog = [
+                        (f"{self.boot}-{seq}", kind, data)
+                        for seq, kind, data in self.history if seq > int(sequence)
+                    ]
+
+            self.subscribers.append(subscription)
+        return subscription, backlog
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            if subscription in self.subscribers:
+                self.subscribers.remove(subscription)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"subscribers": len(self.subscribers), "max_subscribers": self.max_subscribers, "history": len(self.history)}
+
+
+broadcaster = Broadcaster(
+    history_size=int(config.EVENTS_HISTORY_SIZE),
+    client_queue_size=int(config.EVENTS_CLIENT_QUEUE_SIZE),
+    max_subscribers=int(config.EVENTS_MAX_SUBSCRIBERS),
+)
+
+
+def format_event(event_id: str, kind: str, data: Dict[str, Any]) -> str:
+    return f"id: {event_id}\nevent: {kind}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class EventStream:
+    """SSE body for one client; heartbeats keep proxies from closing an idle stream.
+
+    The client is subscribed before the response starts, and `close` (called by
+    the WSGI server even when the body was never iterated) releases its slot.
+    """
+
+    def __init__(self, subscription: Subscription, backlog: List[Tuple[str, str, Dict[str, Any]]]):
+        self.subscription = subscription
+        self.backlog = backlog
+
+    def __iter__(self) -> Iterator[str]:
+        _ensure_account_logs_tail()
+        heartbeat = float(config.EVENTS_HEARTBEAT_SECONDS)
+
+        try:
+            yield f"retry: {int(heartbeat * 1000)}\n\n"
+            for event in self.backlog:
+                yield format_event(*event)
+
+            while not self.subscription.lagging:
+                try:
+                    event = self.subscription.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": heartbeat\n\n"
+                    continue
+                yield format_event(*event)
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        broadcaster.unsubscribe(self.subscription)
+
+
+def stream(last_event_id: Optional[str]) -> Optional[EventStream]:
+    """Subscribe a client, or None when EVENTS_MAX_SUBSCRIBERS streams are already open."""
+    subscription, backlog = broadcaster.subscribe(last_event_id)
+    if subscription is None:
+        return None
+    return EventStream(subscription, backlog)
+
+
+def publish_equipment_activity(account_id: str, equipment_set_id: str, updates: List[Tuple[str, Any]]) -> None:
+    """Push committed equipment activity rows, shaped like /equipment_set_activity/recent."""
+    if not updates or not broadcaster.has_subscribers():
+        return
+
+    names = database.fetch_one(
+        """
+            SELECT
+                (SELECT name FROM equipment_sets WHERE id = %s) AS equipment_set_name,
+                (SELECT username FROM accounts WHERE id = %s) AS performed_by;
+        """,
+        (equipment_set_id, account_id)
+    )
+    names = names.get('data') or {}
+
+    for action, value in updates:
+        broadcaster.publish("equipment_activity", {
+            "equipment_set_id": equipment_set_id,
+            "equipment_set_name": names.get("equipment_set_name"),
+            "performed_by": names.get("performed_by"),
+            "action": action,
+            "value": value,
+        })
+
+
+# account_logs is written by another service: one tail per process replaces every client's polling
+_tail_thread: Optional[threading.Thread] = None
+_tail_lock = threading.Lock()
+
+TAIL_PAGE_SIZE = 500
+
+
+def _ensure_account_logs_tail() -> None:
+    global _tail_thread
+    with _tail_lock:
+        if _tail_thread is None or not _tail_thread.is_alive():
+            _tail_thread = threading.Thread(target=_tail_account_logs, name="account-logs-tail", daemon=True)
+            _tail_thread.start()
+
+
+def _publish_account_logs_after(watermark: Tuple[datetime, int]) -> Tuple[datetime, int]:
+    """Publish the account_logs rows past `watermark` in (created_at, id) order; returns the new watermark."""
+    # full pages mean more rows are waiting: keep reading until a short page
+    while True:
+        fetched = database.fetch_all(
+            """
+                SELECT al.id, al.account_id, a.username, al.action, al.created_at
+                FROM account_logs AS al
+                JOIN accounts AS a
+                    ON al.account_id = a.id
+                WHERE al.created_at >= %s AND (al.created_at, al.id) > (%s, %s)
+                ORDER BY al.created_at, al.id
+                LIMIT %s;
+            """,
+            (watermark[0], watermark[0], watermark[1], TAIL_PAGE_SIZE)
+        )
+        if not fetched['success']:
+            return watermark
+
+        for row in fetched['data']:
+            watermark = (row["created_at"], row["id"])
+            broadcaster.publish("account_log", {"username": row["username"], "action": row["action"]})
+
+        if len(fetched['data']) < TAIL_PAGE_SIZE:
+            return watermark
+
+
+def _tail_account_logs() -> None:
+    global _tail_thread
+    # (created_at, id) of the last published row; ids break ties between rows of one second
+    watermark: Optional[Tuple[datetime, int]] = None
+
+    idle_since = time.monotonic()
+    while True:
+        time.sleep(float(config.EVENTS_POLL_SECONDS))
+
+        # stop once nobody has listened for a while; the next client restarts it
+        if not broadcaster.has_subscribers():
+            if time.monotonic() - idle_since > 60:
+                with _tail_lock:
+                    if not broadcaster.has_subscribers():
+                        _tail_thread = None
+                        return
+            continue
+        idle_since = time.monotonic()
+
+        try:
+            if watermark is None:
+                start = database.fetch_scalar("SELECT NOW();")
+                if start['success'] and start['data'] is not None:
+                    watermark = (start['data'], 0)
+                continue
+
+            watermark = _publish_account_logs_after(watermark)
+        except Exception as err:
+            log.warn("EVENTS", f"Account log tail failed: {err}")
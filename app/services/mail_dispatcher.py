@@ -0,0 +1,234 @@
+import atexit
+import heapq
+import itertools
+import queue
+import smtplib
+import threading
+import time
+from concurrent.futures import Future
+from email.message import Message
+from typing import Any, Dict, List, Optional, Tuple
+from ..config import config
+from .log import log
+
+
+class _Outgoing:
+    def __init__(self, message: Message, receiver: str):
+        self.message = message
+        self.receiver = receiver
+        self.attempts = 0
+        self.future: "Future[Dict[str, Any]]" = Future()
+
+
+class MailDispatcher:
+    """Background sender reusing one authenticated SMTP session.
+
+    Messages are queued and sent by a single worker thread. The worker keeps the
+    connection open between batches and probes it with NOOP after a pause,
+    reconnecting when the server has dropped it; it is closed after
+    `idle_close` seconds without mail. Temporary failures (4xx, dropped
+    connections) are retried with exponential backoff up to `max_attempts`;
+    permanent 5xx rejections fail at once.
+    """
+
+    def __init__(self, max_size: int, batch_size: int, max_attempts: int, backoff: float, max_backoff: float, keepalive: float, idle_close: float):
+        self.queue: "queue.Queue[_Outgoing]" = queue.Queue(maxsize=max_size)
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.keepalive = keepalive
+        self.idle_close = idle_close
+        self.stats = {"queued": 0, "sent": 0, "retried": 0, "failed": 0, "connections": 0, "rejected": 0}
+        # (due, sequence, message) waiting for their next attempt
+        self.delayed: List[Tuple[float, int, _Outgoing]] = []
+        self._sequence = itertools.count()
+        self._connection: Optional[smtplib.SMTP] = None
+        self._used_at = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def submit(self, message: Message, receiver: str) -> "Future[Dict[str, Any]]":
+        """Queue a message; the future resolves to the usual {success, msg} result once it is sent or given up."""
+        outgoing = _Outgoing(message, receiver)
+        try:
+            self.queue.put_nowait(outgoing)
+        except queue.Full:
+            self.stats["rejected"] += 1
+            outgoing.future.set_result({"success": False, "msg": "Mail queue is full"})
+            return outgoing.future
+
+        self.stats["queued"] += 1
+        self._ensure_worker()
+        return outgoing.future
+
+    # ---------------------------------------------------------------- connection
+
+    def _connect(self) -> Optional[smtplib.SMTP]:
+        from .core import get_mail_server
+
+        if self._connection is not None and time.monotonic() - self._used_at > self.keepalive:
+            try:
+                if self._connection.noop()[0] != 250:
+                    raise smtplib.SMTPServerDisconnected("NOOP refused")
+            except (smtplib.SMTPException, OSError):
+                self._disconnect(quit=False)
+
+        if self._connection is None:
+            self._connection = get_mail_server()
+            if self._connection is not None:
+                self.stats["connections"] += 1
+        return self._connection
+
+    def _disconnect(self, quit: bool = True) -> None:
+        if self._connection is None:
+            return
+        try:
+            if quit:
+                self._connection.quit()
+            else:
+                self._connection.close()
+        except (smtplib.SMTPException, OSError):
+            pass
+        self._connection = None
+
+    # ---------------------------------------------------------------- worker
+
+    def _ensure_worker(self) -> None:
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="mail-dispatcher", daemon=True)
+                self._thread.start()
+
+    def _next_batch(self, timeout: float) -> List[_Outgoing]:
+        """Due retries first, then whatever is queued, up to batch_size; waits at most `timeout` for the first."""
+        batch = []
+        now = time.monotonic()
+        while self.delayed and self.delayed[0][0] <= now and len(batch) < self.batch_size:
+            batch.append(heapq.heappop(self.delayed)[2])
+
+        if not batch:
+            try:
+                batch.append(self.queue.get(timeout=timeout))
+            except queue.Empty:
+                return batch
+
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while not (self._stopping.is_set() and self.queue.empty() and not self.delayed):
+            wait = 1.0
+            if self.delayed:
+                wait = max(0.0, min(wait, self.delayed[0][0] - time.monotonic()))
+
+            batch = self._next_batch(wait)
+            if not batch:
+                if self._connection is not None and time.monotonic() - self._used_at > self.idle_close:
+                    self._disconnect()
+                # stopping with only delayed retries left: give them up
+                if self._stopping.is_set() and self.queue.empty():
+                    for _, _, outgoing in self.delayed:
+                        self._fail(outgoing, "Mail dispatcher stopped before retry")
+                    self.delayed = []
+                continue
+
+            self._send_batch(batch)
+        self._disconnect()
+
+    def _send_batch(self, batch: List[_Outgoing]) -> None:
+        for position, outgoing in enumerate(batch):
+            connection = self._connect()
+            if connection is None:
+                # no server: the whole remainder waits for the next attempt
+                for pending in batch[position:]:
+                    pending.attempts += 1
+                    self._retry(pending, "Mail server connection failed")
+                return
+
+            outgoing.attempts += 1
+            try:
+                refused = connection.sendmail(config.MAIL_ADDRESS, outgoing.receiver, outgoing.message.as_string())
+                self._used_at = time.monotonic()
+            except smtplib.SMTPResponseException as err:
+                self._used_at = time.monotonic()
+                if err.smtp_code == 421:
+                    # server is closing the session
+                    self._disconnect(quit=False)
+                if 400 <= err.smtp_code < 500:
+                    self._retry(outgoing, f"{err.smtp_code} {err.smtp_error!r}")
+                else:
+                    self._fail(outgoing, f"{err.smtp_code} {err.smtp_error!r}")
+                continue
+            except smtplib.SMTPRecipientsRefused as err:
+                self._used_at = time.monotonic()
+                self._fail(outgoing, f"Recipient refused: {err.recipients}")
+                continue
+            except (smtplib.SMTPException, OSError) as err:
+                # dropped session: reconnect for the next message
+                self._disconnect(quit=False)
+                self._retry(outgoing, str(err))
+                continue
+
+            if refused:
+                self._fail(outgoing, f"Recipient refused: {refused}")
+                continue
+
+            self.stats["sent"] += 1
+            outgoing.future.set_result({"success": True, "msg": "Email sent successfully"})
+
+    def _retry(self, outgoing: _Outgoing, reason: str) -> None:
+        if outgoing.attempts >= self.max_attempts:
+            self._fail(outgoing, reason)
+            return
+
+        delay = min(self.max_backoff, self.backoff * (2 ** max(0, outgoing.attempts - 1)))
+        self.stats["retried"] += 1
+        log.warn("MAIL-DISPATCH", f"Retrying mail to {outgoing.receiver} in {delay:.0f}s: {reason}")
+        heapq.heappush(self.delayed, (time.monotonic() + delay, next(self._sequence), outgoing))
+
+    def _fail(self, outgoing: _Outgoing, reason: str) -> None:
+        self.stats["failed"] += 1
+        log.error("MAIL-DISPATCH", f"Failed to send mail to {outgoing.receiver}: {reason}")
+        outgoing.future.set_result({"success": False, "msg": f"Failed to send email: {reason}"})
+
+    def shutdown(self, timeout: float = 10) -> None:
+        """Send what is queued (retries still waiting are given up) before the process exits."""
+        self._stopping.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=timeout)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "depth": self.queue.qsize(),
+            "capacity": self.queue.maxsize,
+            "waiting_retry": len(self.delayed),
+            "connected": self._connection is not None,
+            **self.stats,
+        }
+
+
+mail_dispatcher = MailDispatcher(
+    max_size=int(config.MAIL_QUEUE_SIZE),
+    batch_size=int(config.MAIL_BATCH_SIZE),
+    max_attempts=int(config.MAIL_MAX_ATTEMPTS),
+    backoff=float(config.MAIL_RETRY_BACKOFF_SECONDS),
+    max_backoff=float(config.MAIL_RETRY_BACKOFF_MAX_SECONDS),
+    keepalive=float(config.MAIL_KEEPALIVE_SECONDS),
+    idle_close=float(config.MAIL_IDLE_CLOSE_SECONDS),
+)
+
+atexit.register(mail_dispatcher.shutdown)
+
+if config.ENABLE_PROMETRICS:
+    from prometheus_client import Gauge
+    Gauge("mail_queue_depth", "Emails waiting to be sent").set_function(mail_dispatcher.queue.qsize)
+    Gauge("mail_queue_waiting_retry", "Emails waiting for another attempt").set_function(lambda: len(mail_dispatcher.delayed))
+    _mail_gauge = Gauge("mail_dispatch_events", "Mail dispatcher counters", ["event"])
+    for _event in mail_dispatcher.stats:
+        _mail_gauge.labels(_event).set_function(lambda event=_event: mail_dispatcher.stats[event])
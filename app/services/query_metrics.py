@@ -0,0 +1,195 @@
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+from flask import has_request_context, request
+from ..config import config
+from .log import log
+
+_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_STRINGS = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBERS = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDERS = re.compile(r"%s|%\(\w+\)s|:\w+|\?")
+_IN_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+# statements that are never timed or explained (the EXPLAIN capture itself)
+_SKIPPED_PREFIXES = ("explain",)
+
+_EXPLAINABLE_PREFIXES = ("select", "insert", "update", "delete", "replace", "with")
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(query: str) -> Tuple[str, str]:
+    """Normalized SQL shape and its short id: literals, placeholders and IN lists folded to `?`."""
+    text = _COMMENTS.sub(" ", query)
+    text = _STRINGS.sub("?", text)
+    text = _PLACEHOLDERS.sub("?", text)
+    text = _NUMBERS.sub("?", text)
+    text = _IN_LISTS.sub("(?+)", text)
+    text = _WHITESPACE.sub(" ", text).strip().rstrip(";").strip().lower()
+    return text, hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+def _caller() -> Tuple[str, str]:
+    if has_request_context():
+        return request.blueprint or "app", request.endpoint or "unknown"
+    return "background", "background"
+
+
+# prometheus histograms, created on first use so the client is optional
+_histograms: Dict[str, Any] = {}
+_histograms_lock = threading.Lock()
+
+
+def _histogram():
+    if not config.ENABLE_PROMETRICS:
+        return None
+
+    histogram = _histograms.get("duration")
+    if histogram is None:
+        with _histograms_lock:
+            histogram = _histograms.get("duration")
+            if histogram is None:
+                from prometheus_client import Histogram
+                histogram = Histogram(
+                    "db_query_duration_seconds",
+                    "Database statement latency by caller and SQL fingerprint",
+                    ["blueprint", "endpoint", "statement", "role"],
+                    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+                )
+                _histograms["duration"] = histogram
+    return histogram
+
+
+# slow query EXPLAIN capture, off the request thread
+_explain_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-explain")
+# statement id -> when it was last explained; least recently explained shapes drop out first
+_last_explained: "OrderedDict[str, float]" = OrderedDict()
+_LAST_EXPLAINED_SIZE = 1024
+_explain_lock = threading.Lock()
+
+
+def _should_explain(statement_id: str, query: str) -> bool:
+    if not config.DB_SLOW_QUERY_EXPLAIN:
+        return False
+    if not query.lstrip().lower().startswith(_EXPLAINABLE_PREFIXES):
+        return False
+    if random.random() >= float(config.DB_SLOW_QUERY_SAMPLE_RATE):
+        return False
+
+    # at most one plan per statement shape per cooldown window
+    now = time.monotonic()
+    with _explain_lock:
+        last = _last_explained.get(statement_id)
+        if last is not None and now - last < float(config.DB_SLOW_QUERY_EXPLAIN_COOLDOWN):
+            return False
+        _last_explained[statement_id] = now
+        _last_explained.move_to_end(statement_id)
+        while len(_last_explained) > _LAST_EXPLAINED_SIZE:
+            _last_explained.popitem(last=False)
+    return True
+
+
+def _explain_on(role: str, query: str, params: Any) -> Any:
+    """Plan of the query from the same server it ran on; the replica's can differ from the primary's."""
+    from mysql.connector import Error
+    from .database import REPLICA, _acquire_connection, _acquire_replica_connection, _close_quietly, _format_db_error
+
+    conn = None
+    try:
+        if role == REPLICA:
+            conn = _acquire_replica_connection()
+            if conn is None:
+                return "Replica unavailable"
+        else:
+            conn, failure = _acquire_connection()
+            if failure:
+                return failure.get("msg")
+
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute("EXPLAIN " + query, params or ())
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+    except Error as err:
+        return _format_db_error(err)
+    finally:
+        _close_quietly(conn)
+
+
+def _explain(query: str, params: Any, entry: Dict[str, Any]) -> None:
+    entry["explain"] = _explain_on(entry["role"], query, params)
+    log.warn("SLOW-QUERY", json.dumps(entry, default=str))
+
+
+def observe(query: str, params: Any, seconds: float, role: str, explainable: bool = True) -> None:
+    """Record one statement execution; slow ones go to the slow-query log."""
+    if not isinstance(query, str) or query.lstrip().lower().startswith(_SKIPPED_PREFIXES):
+        return
+
+    text, statement_id = fingerprint(query)
+    blueprint, endpoint = _caller()
+
+    histogram = _histogram()
+    if histogram is not None:
+        histogram.labels(blueprint, endpoint, statement_id, role).observe(seconds)
+
+    if seconds * 1000 < float(config.DB_SLOW_QUERY_MS):
+        return
+
+    entry = {
+        "ms": round(seconds * 1000, 2),
+        "blueprint": blueprint,
+        "endpoint": endpoint,
+        "role": role,
+        "statement": statement_id,
+        "fingerprint": text,
+    }
+
+    if explainable and _should_explain(statement_id, query):
+        _explain_executor.submit(_explain, query, params, entry)
+    else:
+        log.warn("SLOW-QUERY", json.dumps(entry))
+
+
+class TimedCursor:
+    """Cursor proxy timing every execute/executemany call."""
+
+    def __init__(self, cursor, role: str):
+        self._cursor = cursor
+        self._role = role
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+    def __getattr__(self, name: str):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def execute(self, query: str, params: Optional[Any] = None, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(query, params, *args, **kwargs)
+        finally:
+            observe(query, params, time.perf_counter() - started, self._role)
+
+    def executemany(self, query: str, params_list, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(query, params_list, *args, **kwargs)
+        finally:
+            # plans of batched statements are not captured
+            observe(query, None, time.perf_counter() - started, self._role, explainable=False)
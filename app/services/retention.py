@@ -0,0 +1,209 @@
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from ..config import config
+from . import database
+from .log import log
+
+# raw log tables that are moved into monthly archive tables once they leave the hot window
+RETAINED_TABLES = ("equipment_set_activity", "equipment_set_edits", "account_logs")
+
+# the event tail, active account sketches and rollup refresh read the last day or two
+MIN_HOT_DAYS = 2
+
+
+def archive_table(source: str, month: date) -> str:
+    return f"{source}_archive_{month:%Y%m}"
+
+
+def _month(moment) -> date:
+    return date(moment.year, moment.month, 1)
+
+
+def _next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def hot_cutoff() -> datetime:
+    """Rows created before this belong in the archive."""
+    days = max(MIN_HOT_DAYS, int(config.RETENTION_HOT_DAYS))
+    return datetime.combine(date.today() - timedelta(days=days), datetime.min.time())
+
+
+# source -> (checked at, {month: table}); information_schema is not read on every query
+_archives: Dict[str, Tuple[float, Dict[date, str]]] = {}
+_archives_lock = threading.Lock()
+
+
+def archived_months(source: str, refresh: bool = False) -> Dict[date, str]:
+    with _archives_lock:
+        cached = _archives.get(source)
+        if cached is not None and not refresh and time.monotonic() - cached[0] < 60:
+            return cached[1]
+
+    fetched = database.fetch_all(
+        """
+            SELECT table_name AS name
+            FROM information_schema.tables
+            WHERE table_schema = DATABASE() AND table_name LIKE %s;
+        """,
+        (source.replace("_", "\\_") + "\\_archive\\_%", ),
+    )
+    if not fetched['success']:
+        return cached[1] if cached is not None else {}
+
+    months = {}
+    for row in fetched['data']:
+        suffix = row["name"].rsplit("_", 1)[-1]
+        if len(suffix) == 6 and suffix.isdigit():
+            months[date(int(suffix[:4]), int(suffix[4:]), 1)] = row["name"]
+
+    with _archives_lock:
+        _archives[source] = (time.monotonic(), months)
+    return months
+
+
+def log_relation(source: str, start_at: Optional[datetime] = None, end_at: Optional[datetime] = None) -> Tuple[str, tuple]:
+    """FROM clause relation for `source` over [start_at, end_at), and its parameters.
+
+    Ranges inside the hot window read the live table alone. Older ranges get a
+    UNION ALL of the live table and every archive month they overlap, with the
+    range predicate pushed into each branch so the created_at indexes are used.
+    Use it in place of the table name: f"FROM {relation} AS l".
+    """
+    from .activity_diffs import LEGACY_TABLE, EDITS_TABLE, storing_diffs, expand
+
+    # equipment activity stored as edit rows is read through their per-action expansion
+    if source == LEGACY_TABLE and storing_diffs():
+        relation, params = log_relation(EDITS_TABLE, start_at, end_at)
+        return expand(relation), params
+
+    if start_at is not None and start_at >= hot_cutoff():
+        return source, ()
+
+    tables = [source] + [
+        table for month, table in sorted(archived_months(source).items())
+        if (start_at is None or _next_month(month) > start_at.date())
+        and (end_at is None or datetime.combine(month, datetime.min.time()) < end_at)
+    ]
+    if len(tables) == 1:
+        return source, ()
+
+    predicates, range_params = [], []
+    if start_at is not None:
+        predicates.append("created_at >= %s")
+        range_params.append(start_at)
+    if end_at is not None:
+        predicates.append("created_at < %s")
+        range_params.append(end_at)
+    where = f" WHERE {' AND '.join(predicates)}" if predicates else ""
+
+    union = " UNION ALL ".join(f"SELECT * FROM {table}{where}" for table in tables)
+    return f"({union})", tuple(range_params) * len(tables)
+
+
+def _ensure_archive_tables(source: str, cutoff: datetime) -> bool:
+    """Create the archive months between the oldest live row and the cutoff; DDL commits, so never in a transaction."""
+    oldest = database.fetch_scalar(f"SELECT MIN(created_at) FROM {source} WHERE created_at < %s;", (cutoff, ))
+    if not oldest['success']:
+        return False
+    if oldest['data'] is None:
+        return True
+
+    existing = archived_months(source, refresh=True)
+    month = _month(oldest['data'])
+    while month <= _month(cutoff):
+        if month not in existing:
+            created = database.execute_single(f"CREATE TABLE IF NOT EXISTS {archive_table(source, month)} LIKE {source};")
+            if not created['success']:
+                log.error("RETENTION", f"Failed to create {archive_table(source, month)}: {created['msg']}")
+                return False
+        month = _next_month(month)
+
+    archived_months(source, refresh=True)
+    return True
+
+
+def archive_batch(source: str, cutoff: datetime, batch_size: int):
+    """Move the oldest `batch_size` rows before `cutoff` into their archive months, in one short transaction."""
+    with database.transaction() as tx:
+        locked = database.fetch_all(
+            f"""
+                SELECT id, created_at FROM {source}
+                WHERE created_at < %s
+                ORDER BY created_at, id
+                LIMIT %s
+                FOR UPDATE;
+            """,
+            (cutoff, batch_size)
+        )
+        rows = locked.get('data') or []
+
+        by_month: Dict[date, List] = {}
+        for row in rows:
+            by_month.setdefault(_month(row["created_at"]), []).append(row["id"])
+
+        for month, ids in by_month.items():
+            placeholders = ", ".join(["%s"] * len(ids))
+            database.execute_single(
+                f"INSERT INTO {archive_table(source, month)} SELECT * FROM {source} WHERE id IN ({placeholders});",
+                tuple(ids)
+            )
+            database.execute_single(f"DELETE FROM {source} WHERE id IN ({placeholders});", tuple(ids))
+
+    if not tx.success:
+        return tx.error
+    return {"success": True, "data": len(rows)}
+
+
+def drop_expired_archives(source: str):
+    """Drop archive months older than RETENTION_ARCHIVE_MONTHS (0 keeps them forever)."""
+    keep = int(config.RETENTION_ARCHIVE_MONTHS)
+    if keep <= 0:
+        return {"success": True, "data": []}
+
+    oldest_kept = _month(hot_cutoff())
+    for _ in range(keep):
+        oldest_kept = date(oldest_kept.year - (oldest_kept.month == 1), (oldest_kept.month - 2) % 12 + 1, 1)
+
+    dropped = []
+    for month, table in sorted(archived_months(source, refresh=True).items()):
+        if month >= oldest_kept:
+            continue
+        result = database.execute_single(f"DROP TABLE IF EXISTS {table};")
+        if not result['success']:
+            return result
+        dropped.append(table)
+
+    if dropped:
+        archived_months(source, refresh=True)
+        log.inform("RETENTION", f"Dropped expired archive/s {', '.join(dropped)}")
+    return {"success": True, "data": dropped}
+
+
+def run_archive(source: str, max_batches: Optional[int] = None):
+    """Move everything older than the hot window out of `source`, batch by batch, pausing between batches."""
+    cutoff = hot_cutoff()
+    if not _ensure_archive_tables(source, cutoff):
+        return {"success": False, "msg": f"Could not prepare archive tables of {source}"}
+
+    batch_size = int(config.RETENTION_BATCH_SIZE)
+    pause = float(config.RETENTION_BATCH_PAUSE_SECONDS)
+    moved = batches = 0
+
+    while max_batches is None or batches < max_batches:
+        result = archive_batch(source, cutoff, batch_size)
+        if not result['success']:
+            log.error("RETENTION", f"Archiving {source} stopped after {moved} row/s: {result['msg']}")
+            return result
+
+        moved += result['data']
+        batches += 1
+        if result['data'] < batch_size:
+            break
+        # let the writers in between batches
+        time.sleep(pause)
+
+    log.inform("RETENTION", f"Archived {moved} {source} row/s older than {cutoff:%Y-%m-%d}")
+    return {"success": True, "data": moved}
@@ -0,0 +1,148 @@
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Iterable, Optional
+from ..config import config
+from . import database
+from .log import log
+from .retention import log_relation
+
+ACCOUNT_LOGS = "account_logs"
+EQUIPMENT_SET_ACTIVITY = "equipment_set_activity"
+
+# raw log table -> per day / per action counter table
+ROLLUP_TABLES = {
+    ACCOUNT_LOGS: "account_logs_daily",
+    EQUIPMENT_SET_ACTIVITY: "equipment_set_activity_daily",
+}
+
+
+def ensure_rollup_tables() -> bool:
+    for source, table in ROLLUP_TABLES.items():
+        created = database.execute_single(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                day DATE NOT NULL,
+                action VARCHAR(64) NOT NULL,
+                total INT UNSIGNED NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, action)
+            );
+        """)
+        if not created['success']:
+            log.error("ROLLUPS", f"Failed to create {table}: {created['msg']}")
+            return False
+
+        # first deploy: backfill from the existing log
+        populated = database.fetch_scalar(f"SELECT 1 FROM {table} LIMIT 1;")
+        if populated['success'] and populated['data'] is None:
+            rebuild_rollup(source)
+    return True
+
+
+def record_activity(source: str, actions: Iterable[str], day: Optional[date] = None):
+    """Add counts for freshly written log rows to `day` (the database's today by default); joins the caller's transaction."""
+    counts = Counter(actions)
+    if not counts:
+        return {"success": True, "data": None}
+
+    query = f"""
+        INSERT INTO {ROLLUP_TABLES[source]} (day, action, total)
+        VALUES ({'CURDATE()' if day is None else '%s'}, %s, %s)
+        ON DUPLICATE KEY UPDATE total = total + VALUES(total);
+    """
+    if day is None:
+        return database.execute_many(query, list(counts.items()))
+    return database.execute_many(query, [(day, action, total) for action, total in counts.items()])
+
+
+def rebuild_rollup(source: str, since: Optional[date] = None):
+    """Recount the rollup from the raw log, for every day from `since` (or all days)."""
+    table = ROLLUP_TABLES[source]
+
+    start_at = datetime.combine(since, datetime.min.time()) if since is not None else None
+    # archived months count too
+    relation, relation_params = log_relation(source, start_at)
+
+    delete_query = f"DELETE FROM {table}"
+    insert_query = f"""
+        INSERT INTO {table} (day, action, total)
+        SELECT DATE(created_at), action, COUNT(*)
+        FROM {relation} AS l
+    """
+    params = ()
+
+    # range predicate on created_at so the index is usable
+    if start_at is not None:
+        delete_query += " WHERE day >= %s"
+        insert_query += " WHERE created_at >= %s"
+        params = (start_at, )
+
+    insert_query += " GROUP BY DATE(created_at), action;"
+
+    with database.transaction() as tx:
+        database.execute_single(delete_query + ";", params)
+        rebuilt = database.execute_single(insert_query, relation_params + params)
+
+    if not tx.success:
+        log.error("ROLLUPS", f"Failed to rebuild {table}: {tx.error['msg']}")
+        return tx.error
+
+    log.inform("ROLLUPS", f"Rebuilt {table} since {since or 'the beginning'} ({rebuilt['data']['rowcount']} row/s)")
+    return rebuilt
+
+
+# account_logs is written by another service, so its rollup is caught up on read
+_refreshed_at = 0.0
+_refresh_lock = threading.Lock()
+
+
+def refresh_account_logs_rollup(force: bool = False) -> None:
+    """Recount the days since the last rolled-up day, at most once per ROLLUP_REFRESH_SECONDS."""
+    global _refreshed_at
+
+    now = time.monotonic()
+    if not force and now - _refreshed_at < float(config.ROLLUP_REFRESH_SECONDS):
+        return
+
+    # another request is already refreshing
+    if not _refresh_lock.acquire(blocking=False):
+        return
+
+    try:
+        if not force and now - _refreshed_at < float(config.ROLLUP_REFRESH_SECONDS):
+            return
+
+        last_day = database.fetch_scalar(f"SELECT MAX(day) FROM {ROLLUP_TABLES[ACCOUNT_LOGS]};")
+        if not last_day['success']:
+            return
+
+        # yesterday too, rows committed around midnight land there late
+        since = None
+        if last_day['data'] is not None:
+            since = min(last_day['data'], date.today() - timedelta(days=1))
+
+        if rebuild_rollup(ACCOUNT_LOGS, since)['success']:
+            _refreshed_at = time.monotonic()
+    finally:
+        _refresh_lock.release()
+
+
+def fetch_daily_totals(source: str, start_date: date, action: Optional[str] = None):
+    """Per day totals from the rollup, oldest first: rows of {day, total}."""
+    if source == ACCOUNT_LOGS:
+        refresh_account_logs_rollup()
+
+    query = f"""
+        SELECT day, SUM(total) AS total
+        FROM {ROLLUP_TABLES[source]}
+        WHERE day >= %s
+    """
+    params = [start_date]
+
+    if action is not None:
+        query += " AND action = %s"
+        params.append(action)
+
+    query += " GROUP BY day ORDER BY day;"
+
+    return database.fetch_all(query, tuple(params))
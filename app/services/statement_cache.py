@@ -0,0 +1,222 @@
+import re
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from mysql.connector import Error
+from mysql.connector.cursor import MySQLCursorPrepared, MySQLCursorPreparedDict, RE_SQL_FIND_PARAM
+from ..config import config
+from .log import log
+
+# server errors meaning a statement handle no longer exists (e.g. after a reconnect)
+UNKNOWN_STATEMENT_ERRNOS = (1243,)
+
+_WHITESPACE = re.compile(r"\s+")
+
+# counters shared by every connection cache
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "fallbacks": 0}
+
+
+def _count(counter: str) -> None:
+    with _stats_lock:
+        _stats[counter] += 1
+
+
+def statement_cache_stats() -> Dict[str, int]:
+    """Snapshot of the prepared statement cache counters across all connections."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def normalize_sql(query: str) -> str:
+    """Cache key for a query: collapsed whitespace, no trailing semicolons."""
+    return _WHITESPACE.sub(" ", query).strip().rstrip(";").strip()
+
+
+class StatementCache:
+    """LRU of server-side prepared statement handles owned by one connection."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.connection_id: Optional[int] = None
+        self.entries: "OrderedDict[str, Optional[dict]]" = OrderedDict()
+
+    def _sync(self, cnx) -> None:
+        # a reconnected socket starts a new server session without our handles
+        connection_id = getattr(cnx, "connection_id", None)
+        if connection_id != self.connection_id:
+            self.entries.clear()
+            self.connection_id = connection_id
+
+    def lookup(self, cnx, query: str) -> Optional[dict]:
+        """Return a prepared handle for the query, preparing it on a miss.
+
+        Returns None when the statement cannot be prepared; that result is cached
+        too so the server is not asked again for the same text.
+        """
+        self._sync(cnx)
+        key = normalize_sql(query)
+
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            handle = self.entries[key]
+            _count("hits" if handle is not None else "fallbacks")
+            return handle
+
+        _count("misses")
+        handle = None
+        try:
+            # the key only identifies the query; the server gets the text as written,
+            # since collapsing lines would swallow everything after a -- comment
+            statement = query.encode(cnx.python_charset)
+            statement = re.sub(RE_SQL_FIND_PARAM, b"?", statement)
+            handle = cnx.cmd_stmt_prepare(statement)
+        except Error as err:
+            log.warn("statement-cache", f"Statement not preparable, using text protocol: {err}")
+            _count("fallbacks")
+
+        self.entries[key] = handle
+        self._evict(cnx)
+        return handle
+
+    def invalidate(self, query: str) -> None:
+        self.entries.pop(normalize_sql(query), None)
+
+    def _evict(self, cnx) -> None:
+        while len(self.entries) > self.capacity:
+            _, handle = self.entries.popitem(last=False)
+            _count("evictions")
+            if handle is None:
+                continue
+            try:
+                cnx.cmd_stmt_close(handle["statement_id"])
+            except Error:
+                # deallocation is best effort; the session drops it on close anyway
+                pass
+
+
+# caches keyed by the physical connection, so they survive pool check-ins
+_caches: "weakref.WeakKeyDictionary[Any, StatementCache]" = weakref.WeakKeyDictionary()
+_caches_lock = threading.Lock()
+
+
+def get_statement_cache(conn) -> Optional[StatementCache]:
+    capacity = int(config.MYSQL_STATEMENT_CACHE_SIZE)
+    if capacity <= 0:
+        return None
+
+    cnx = getattr(conn, "_cnx", conn)
+    with _caches_lock:
+        cache = _caches.get(cnx)
+        if cache is None:
+            cache = StatementCache(capacity)
+            _caches[cnx] = cache
+    return cache
+
+
+class _CachedPreparedCursor(MySQLCursorPrepared):
+    def reset(self, free: bool = True) -> None:
+        # the handle belongs to the connection cache, so never deallocate it here
+        self._prepared = None
+        super().reset(free)
+
+
+class _CachedPreparedDictCursor(MySQLCursorPreparedDict):
+    def reset(self, free: bool = True) -> None:
+        self._prepared = None
+        super().reset(free)
+
+
+class CachedStatementCursor:
+    """Cursor facade that executes through the connection's prepared statement cache.
+
+    Queries that cannot be prepared, named-parameter queries and `executemany`
+    batches go through a regular buffered cursor instead.
+    """
+
+    def __init__(self, conn, cache: StatementCache, dictionary: bool = True):
+        self._conn = conn
+        self._cnx = getattr(conn, "_cnx", conn)
+        self._cache = cache
+        self._dictionary = dictionary
+        self._cursor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getattr__(self, name: str):
+        if self._cursor is None:
+            raise AttributeError(name)
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def _text_cursor(self):
+        return self._conn.cursor(dictionary=self._dictionary, buffered=True)
+
+    def _prepared_cursor(self, handle: dict, query: str):
+        cursor_class = _CachedPreparedDictCursor if self._dictionary else _CachedPreparedCursor
+        cursor = self._conn.cursor(cursor_class=cursor_class)
+        cursor._prepared = handle
+        cursor._executed = query
+        return cursor
+
+    def execute(self, query: str, params: Any = None) -> None:
+        self.close()
+
+        handle = None if isinstance(params, dict) else self._cache.lookup(self._cnx, query)
+        if handle is None:
+            self._cursor = self._text_cursor()
+            self._cursor.execute(query, params or ())
+            return
+
+        self._cursor = self._prepared_cursor(handle, query)
+        try:
+            self._cursor.execute(query, tuple(params or ()))
+        except Error as err:
+            if getattr(err, "errno", None) not in UNKNOWN_STATEMENT_ERRNOS:
+                raise
+
+            # handle vanished server-side; prepare it again once
+            self._cache.invalidate(query)
+            handle = self._cache.lookup(self._cnx, query)
+            self._cursor = self._prepared_cursor(handle, query) if handle else self._text_cursor()
+            self._cursor.execute(query, tuple(params or ()) if handle else (params or ()))
+
+    def executemany(self, query: str, params_list) -> None:
+        # the text protocol rewrites INSERT batches into one multi-row statement
+        self.close()
+        self._cursor = self._text_cursor()
+        self._cursor.executemany(query, params_list)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self) -> None:
+        cursor, self._cursor = self._cursor, None
+        if cursor is None:
+            return
+
+        try:
+            # prepared cursors are unbuffered; drain them so the connection stays usable
+            if isinstance(cursor, MySQLCursorPrepared) and getattr(self._cnx, "unread_result", False):
+                cursor.fetchall()
+            cursor.close()
+        except Error as err:
+            log.warn("statement-cache", f"Failed to close cursor: {err}")
+
+
+def open_cursor(conn, dictionary: bool = True):
+    """Cursor used by the database helpers: cached prepared statements when enabled."""
+    cache = get_statement_cache(conn)
+    if cache is None:
+        return conn.cursor(dictionary=dictionary, buffered=True)
+    return CachedStatementCursor(conn, cache, dictionary)
@@ -49,10 +49,23 @@ def system_check() -> bool:
 
 
     from .initialize import check_account_roles, check_accounts, initialize_root_role, initialize_root_account
+    from .rollups import ensure_rollup_tables, refresh_account_logs_rollup
+    from .equipment_health import ensure_health_table
+    from .activity_digest import ensure_last_emailed_table
+    from .activity_queue import activity_queue
+    from .activity_diffs import ensure_edits_storage
 
     initialize_root_role()
     initialize_root_account()
 
+    if ensure_rollup_tables():
+        refresh_account_logs_rollup(force=True)
+    ensure_health_table()
+    ensure_edits_storage()
+    ensure_last_emailed_table()
+    # rows a crashed worker journaled but never wrote
+    activity_queue.recover()
+
     check_account_roles()
     check_accounts()
 
@@ -1,5 +1,12 @@
-from flask import jsonify, request
-from typing import Dict, Any, Optional, List, Tuple
+import base64
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from flask import jsonify, request, current_app, Response
+from typing import Dict, Any, Iterable, Optional, List, Tuple
+from .log import log
 
 
 
@@ -44,6 +51,56 @@ def check_order_parameter(order_param: str) -> str:
     return "ASC"
 
 
+def is_columnar_request() -> bool:
+    """`?format=columnar` asks list endpoints for {"columns": [...], "rows": [[...]]} data."""
+    return request.args.get("format", "").lower() == "columnar"
+
+
+def check_page_limit(default: int = 50, maximum: int = 500) -> Tuple[Optional[int], Optional[Tuple]]:
+    try:
+        limit = int(request.args.get("limit", default))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= maximum:
+        return None, common_error_response(f"limit must be between 1 and {maximum}")
+    return limit, None
+
+
+def check_date_filters() -> Tuple[Tuple[Optional[datetime], Optional[datetime]], Optional[Tuple]]:
+    """?start_date / ?end_date as datetimes (None when absent)."""
+    try:
+        start_at = datetime.fromisoformat(request.args['start_date']) if request.args.get('start_date') else None
+        end_at = datetime.fromisoformat(request.args['end_date']) if request.args.get('end_date') else None
+    except ValueError:
+        return (None, None), common_error_response("start_date and end_date must be ISO dates")
+    return (start_at, end_at), None
+
+
+EXPORT_FORMATS = ("csv", "ndjson")
+
+
+def check_export_format() -> Tuple[Optional[str], Optional[Tuple]]:
+    export_format = request.args.get("format", "csv").lower()
+    if export_format not in EXPORT_FORMATS:
+        return None, common_error_response(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    return export_format, None
+
+
+def encode_cursor(created_at: datetime, row_id: Any) -> str:
+    """Opaque keyset cursor for the row a page ended on."""
+    raw = json.dumps([created_at.isoformat(), row_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[datetime, Any]]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), row_id
+    except (ValueError, TypeError):
+        return None
+
+
 # standardized responses
 def common_success_response(data: Any = None, message: str = "Success") -> Tuple:
     response = {"success": True, "message": message}
@@ -53,6 +110,108 @@ def common_success_response(data: Any = None, message: str = "Success") -> Tuple
     return jsonify(response), 200
 
 
+def common_success_stream_response(rows: Iterable[Any], message: str = "Success", chunk_size: int = 500, columns: Optional[List[str]] = None) -> Tuple:
+    """Same envelope as `common_success_response`, with `data` written as a streamed JSON array.
+
+    Rows are serialized `chunk_size` at a time so memory stays flat regardless of
+    the row count. When `columns` is given the rows are tuples and `data` becomes
+    {"columns": [...], "rows": [...]}. An error after the body has started is
+    reported as an `error` key following the (truncated) data.
+    """
+    dumps = current_app.json.dumps
+    opening = '"data": ['
+    closing = "]}"
+    if columns is not None:
+        opening = '"data": {"columns": %s, "rows": [' % dumps(list(columns))
+        closing = "]}}"
+
+    def generate():
+        yield '{"message": %s, "success": true, ' % dumps(message) + opening
+
+        separator = ""
+        chunk = []
+        try:
+            for row in rows:
+                chunk.append(dumps(row))
+                if len(chunk) >= chunk_size:
+                    yield separator + ",".join(chunk)
+                    separator = ","
+                    chunk = []
+
+            if chunk:
+                yield separator + ",".join(chunk)
+            yield closing
+
+        except Exception as err:
+            log.error("stream-response", f"Stream interrupted: {err}")
+            yield closing[:-1] + ', "error": %s}' % dumps("Stream interrupted")
+
+    response = Response(generate(), mimetype="application/json")
+
+    # release the underlying cursor even if the client disconnects early
+    if hasattr(rows, "close"):
+        response.call_on_close(rows.close)
+
+    return response, 200
+
+
+def common_export_response(rows: Any, name: str, export_format: str, chunk_rows: int = 1000) -> Tuple:
+    """Download of a `RowStream` (compact rows) as CSV or NDJSON, gzipped on the fly with ?gzip=true.
+
+    Output is flushed every `chunk_rows` rows, so memory stays flat however long
+    the export runs. A failure mid-stream aborts the response instead of ending it
+    cleanly, so clients see a broken transfer rather than a short file.
+    """
+    columns = list(rows.column_names)
+    compress = request.args.get("gzip", "false").lower() in ("1", "true", "yes", "on")
+
+    def lines():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if export_format == "csv":
+            writer.writerow(columns)
+
+        for count, row in enumerate(rows, 1):
+            # ISO timestamps and column order in both formats
+            values = [value.isoformat() if isinstance(value, datetime) else value for value in row]
+            if export_format == "csv":
+                writer.writerow(values)
+            else:
+                buffer.write(json.dumps(dict(zip(columns, values)), default=str) + "\n")
+
+            if count % chunk_rows == 0:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+
+        yield buffer.getvalue().encode("utf-8")
+
+    def generate():
+        encoder = zlib.compressobj(wbits=31) if compress else None
+        try:
+            for chunk in lines():
+                chunk = encoder.compress(chunk) if encoder else chunk
+                if chunk:
+                    yield chunk
+            if encoder:
+                yield encoder.flush()
+        except Exception as err:
+            log.error("export-response", f"Export of {name} interrupted: {err}")
+            raise
+
+    filename = f"{name}.{export_format}" + (".gz" if compress else "")
+    mimetype = "application/gzip" if compress else ("text/csv" if export_format == "csv" else "application/x-ndjson")
+
+    response = Response(generate(), mimetype=mimetype, headers={
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "X-Accel-Buffering": "no",
+    })
+
+    # release the underlying cursor even if the client disconnects early
+    response.call_on_close(rows.close)
+    return response, 200
+
+
 def common_error_response(message: str, status_code: int = 400, details: Dict = None) -> Tuple:
     response = {"success": False, "error": message}
     if details:
@@ -62,6 +221,16 @@ def common_error_response(message: str, status_code: int = 400, details: Dict =
 
 
 def common_database_error_response(db_result: Dict[str, Any]) -> Tuple:
+    # circuit breaker open: tell clients to come back later instead of a hard failure
+    if db_result.get('unavailable'):
+        return common_error_response(
+            message="Database unavailable",
+            status_code=503,
+            details={
+                "database_error": db_result.get('msg', 'Database temporarily unavailable')
+            }
+        )
+
     return common_error_response(
         message="Database failed",
         status_code=500,
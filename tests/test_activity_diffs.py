@@ -0,0 +1,133 @@
+import json
+from contextlib import contextmanager
+from datetime import datetime
+from types import SimpleNamespace
+
+from app.config import config
+from app.services import activity_diffs, database
+from app.services.activity_diffs import FIELD_SLOTS, activity_rows, encode_diff, mark_emailed
+
+
+class FakeStream:
+    def __init__(self, rows):
+        self.rows = rows
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def close(self):
+        self.closed = True
+
+
+@contextmanager
+def fake_transaction():
+    yield SimpleNamespace(success=True, error=None)
+
+
+def expand(edit_id, diff, mask):
+    """What the JSON_TABLE view yields for one edit row: (id, action, old, new, status)."""
+    return [
+        (
+            edit_id * FIELD_SLOTS + position - 1,
+            entry["a"],
+            entry.get("o"),
+            entry.get("n"),
+            "emailed" if mask & (1 << (position - 1)) else "pending",
+        )
+        for position, entry in enumerate(json.loads(diff), start=1)
+    ]
+
+
+def test_encode_diff_stores_values_like_the_legacy_columns():
+    diff = json.loads(encode_diff([
+        ("requires_avr", False, True),
+        ("monitor_name", None, "Dell"),
+        ("issue", "loose cable", None),
+        ("updated_at", None, datetime(2026, 1, 2, 3, 4, 5)),
+    ]))
+
+    assert diff == [
+        {"a": "requires_avr", "o": "0", "n": "1"},
+        {"a": "monitor_name", "n": "Dell"},
+        {"a": "issue", "o": "loose cable"},
+        {"a": "updated_at", "n": "2026-01-02 03:04:05"},
+    ]
+
+
+def test_mark_emailed_sets_the_bits_the_view_reads(monkeypatch):
+    calls = []
+    monkeypatch.setattr(database, "execute_many", lambda query, params_list: calls.append(params_list))
+
+    diff = encode_diff([("a", None, 1), ("b", None, 2), ("c", None, 3), ("d", None, 4)])
+    ids = [row[0] for row in expand(2, diff, 0)]
+    mark_emailed([ids[0], ids[2], 3])
+
+    masks = {edit_id: mask for mask, edit_id in calls[0]}
+    assert masks == {2: 0b101, 0: 0b1000}
+    statuses = [row[4] for row in expand(2, diff, masks[2])]
+    assert statuses == ["emailed", "pending", "emailed", "pending"]
+
+
+def test_activity_rows_reads_edits_by_primary_key(monkeypatch):
+    monkeypatch.setattr(config, "ACTIVITY_STORAGE", "diff")
+    relation, params = activity_rows([65, 66, 3])
+
+    assert params == (0, 2, 65, 66, 3)
+    assert f"FROM {activity_diffs.EDITS_TABLE} WHERE id IN (%s, %s)" in relation
+
+    monkeypatch.setattr(config, "ACTIVITY_STORAGE", "rows")
+    relation, params = activity_rows([65, 3])
+    assert params == (65, 3)
+    assert activity_diffs.LEGACY_TABLE in relation
+
+
+def test_migrate_table_folds_rows_of_one_edit(monkeypatch):
+    first, second = datetime(2026, 1, 1, 9), datetime(2026, 1, 1, 10)
+    stream = FakeStream([
+        (1, "acc", "set-1", "monitor_name", "Dell", "emailed", first, first),
+        (2, "acc", "set-1", "keyboard_name", "Logi", "pending", None, first),
+        (3, "acc", "set-1", "monitor_name", "HP", "pending", None, second),
+    ])
+    inserted, deleted, roles = [], [], []
+
+    def fetch_iter(query, parameters=None, fetch_size=None, compact=False, role=database.REPLICA):
+        roles.append(role)
+        return {"success": True, "data": stream}
+
+    monkeypatch.setattr(database, "fetch_iter", fetch_iter)
+    monkeypatch.setattr(database, "transaction", fake_transaction)
+    monkeypatch.setattr(database, "execute_many", lambda query, params_list: inserted.extend(params_list))
+    monkeypatch.setattr(database, "execute_single", lambda query, params=None: deleted.extend(params))
+
+    result = activity_diffs._migrate_table("legacy", "edits", batch_size=100)
+
+    assert result == {"success": True, "data": 3}
+    assert roles == [database.PRIMARY]
+    assert stream.closed
+    assert sorted(deleted) == [1, 2, 3]
+
+    assert len(inserted) == 2
+    account_id, set_id, diff, mask, emailed_at, created_at = inserted[0]
+    assert (account_id, set_id, mask, emailed_at, created_at) == ("acc", "set-1", 0b1, first, first)
+    assert json.loads(diff) == [{"a": "monitor_name", "n": "Dell"}, {"a": "keyboard_name", "n": "Logi"}]
+    # the old value of a field is the value of its previous row
+    assert json.loads(inserted[1][2]) == [{"a": "monitor_name", "o": "Dell", "n": "HP"}]
+
+
+def test_migrate_table_never_splits_an_edit_across_batches(monkeypatch):
+    moment = datetime(2026, 1, 1, 9)
+    later = datetime(2026, 1, 1, 10)
+    rows = [(i, "acc", "set-1", f"field_{i}", str(i), "pending", None, moment) for i in range(1, 4)]
+    rows.append((4, "acc", "set-1", "field_4", "4", "pending", None, later))
+    batches = []
+
+    monkeypatch.setattr(database, "fetch_iter", lambda *args, **kwargs: {"success": True, "data": FakeStream(rows)})
+    monkeypatch.setattr(database, "transaction", fake_transaction)
+    monkeypatch.setattr(database, "execute_many", lambda query, params_list: batches.append(list(params_list)))
+    monkeypatch.setattr(database, "execute_single", lambda query, params=None: None)
+
+    result = activity_diffs._migrate_table("legacy", "edits", batch_size=2)
+
+    assert result["data"] == 4
+    assert [len(json.loads(batch[0][2])) for batch in batches] == [3, 1]
@@ -0,0 +1,78 @@
+from datetime import datetime
+
+import pytest
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+
+from app.config import config
+from app.routes import equipment_set_activity
+from app.services import database
+from app.services.validation import decode_cursor, encode_cursor
+
+ROWS = [
+    {"id": 70, "created_at": datetime(2026, 1, 2, 10), "action": "issue"},
+    {"id": 69, "created_at": datetime(2026, 1, 2, 10), "action": "status"},
+    {"id": 5, "created_at": datetime(2026, 1, 1, 9), "action": "issue"},
+]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    queries = []
+
+    def fetch_all(query, parameters=None, compact=False):
+        queries.append((query, parameters))
+        limit = parameters[-1] if "LIMIT %s;" in query else len(ROWS)
+        return {"success": True, "data": ROWS[:limit]}
+
+    monkeypatch.setattr(database, "fetch_all", fetch_all)
+
+    app = Flask(__name__)
+    app.config["JWT_SECRET_KEY"] = "test-secret-key-that-is-long-enough"
+    JWTManager(app)
+    app.register_blueprint(equipment_set_activity.bp_equipment_set_activity, url_prefix="/activity")
+    with app.app_context():
+        token = create_access_token("account")
+
+    test_client = app.test_client()
+    test_client.environ_base["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+    test_client.queries = queries
+    return test_client
+
+
+def test_unpaged_listing_keeps_the_list_response(client):
+    data = client.get("/activity/").get_json()["data"]
+
+    assert [row["id"] for row in data] == [70, 69, 5]
+    query, _ = client.queries[0]
+    assert "LIMIT" not in query
+
+
+def test_paged_listing_returns_a_cursor_after_the_last_row(client):
+    data = client.get("/activity/?limit=2").get_json()["data"]
+
+    assert [row["id"] for row in data["rows"]] == [70, 69]
+    created_at, row_id = decode_cursor(data["next_cursor"])
+    assert row_id == 69
+    assert created_at == datetime(2026, 1, 2, 10)
+
+
+def test_invalid_cursor_is_rejected(client):
+    response = client.get("/activity/?cursor=not-a-cursor")
+    assert response.status_code == 400
+
+
+def test_diff_storage_pages_on_the_edits_index(client, monkeypatch):
+    monkeypatch.setattr(config, "ACTIVITY_STORAGE", "diff")
+    cursor = encode_cursor(datetime(2026, 1, 2, 10), 69)
+
+    client.get(f"/activity/?limit=2&cursor={cursor}&account_id=acc")
+
+    query, params = client.queries[0]
+    inner = query[query.index("FROM (SELECT * FROM equipment_set_edits AS e"):]
+    assert "e.performed_by_account_id = %s" in inner
+    assert "(e.created_at, e.id) <= (%s, %s DIV 32)" in inner
+    assert "ORDER BY e.created_at DESC, e.id DESC LIMIT %s" in inner
+    # edit-level params first: filter, cursor, then two edits past the page size
+    assert params[:5] == ("acc", datetime(2026, 1, 2, 10), datetime(2026, 1, 2, 10), 69, 4)
+    assert params[-1] == 3
@@ -0,0 +1,51 @@
+import json
+from datetime import datetime
+
+from app.services import activity_queue
+from app.services.activity_queue import ActivityWriteBehind, _Segment
+
+
+def make_queue(journal_dir):
+    return ActivityWriteBehind(max_size=10, batch_size=10, flush_interval=0.1, put_timeout=0.1, journal_dir=str(journal_dir), segment_size=100)
+
+
+def test_recover_replays_abandoned_segments_and_removes_them(tmp_path, monkeypatch):
+    inserted = []
+    monkeypatch.setattr(activity_queue, "_insert", lambda records: inserted.extend(records) or {"success": True, "data": len(records)})
+
+    moment = datetime(2026, 1, 2, 3, 4, 5)
+    segment = tmp_path / "activity-1-1-1.jsonl"
+    segment.write_text(
+        json.dumps(["acc", "set-1", "issue", "loose", moment.isoformat()]) + "\n"
+        + json.dumps(["acc", "set-1", "status", "ok", moment.isoformat()]) + "\n"
+        # torn final line from the crash
+        + '["acc", "set-1", "iss'
+    )
+
+    queue = make_queue(tmp_path)
+    assert queue.recover() == 2
+
+    assert inserted == [("acc", "set-1", "issue", "loose", moment), ("acc", "set-1", "status", "ok", moment)]
+    assert not segment.exists()
+    assert queue.stats["replayed"] == 2
+
+
+def test_recover_skips_segments_a_live_writer_holds(tmp_path, monkeypatch):
+    monkeypatch.setattr(activity_queue, "_insert", lambda records: {"success": True, "data": len(records)})
+    live = _Segment(str(tmp_path / "activity-2-1-1.jsonl"))
+    live.append([("acc", "set-1", "issue", "x", datetime(2026, 1, 1))])
+
+    try:
+        assert make_queue(tmp_path).recover() == 0
+        assert (tmp_path / "activity-2-1-1.jsonl").exists()
+    finally:
+        live.remove()
+
+
+def test_failed_replay_keeps_the_segment(tmp_path, monkeypatch):
+    monkeypatch.setattr(activity_queue, "_insert", lambda records: {"success": False, "msg": "down"})
+    segment = tmp_path / "activity-3-1-1.jsonl"
+    segment.write_text(json.dumps(["acc", "set-1", "issue", "x", "2026-01-01T00:00:00"]) + "\n")
+
+    assert make_queue(tmp_path).recover() == 0
+    assert segment.exists()
@@ -0,0 +1,60 @@
+import time
+
+from app.services.circuit_breaker import CircuitBreaker
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_failures_open_the_circuit_and_a_probe_half_opens_it():
+    healthy = []
+    breaker = CircuitBreaker("test", probe=lambda: bool(healthy), failure_threshold=2, probe_interval=0.01, max_probe_interval=0.02)
+
+    breaker.record_failure("timeout")
+    assert breaker.allow_request()
+    breaker.record_failure("timeout")
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+    healthy.append(True)
+    wait_for(lambda: breaker.state == CircuitBreaker.HALF_OPEN)
+
+    # one trial request at a time; its success closes the circuit
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.failures == 0
+
+
+def test_failed_trial_reopens_and_released_slot_is_reusable():
+    breaker = CircuitBreaker("test", probe=lambda: True, probe_interval=0.01)
+    breaker.trip("missing")
+    wait_for(lambda: breaker.state == CircuitBreaker.HALF_OPEN)
+
+    assert breaker.allow_request()
+    breaker.release()
+    assert breaker.allow_request()
+
+    breaker.record_failure("still down")
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.times_opened == 2
+
+
+def test_trial_without_a_verdict_expires():
+    breaker = CircuitBreaker("test", probe=lambda: False, probe_interval=60.0, half_open_timeout=30.0)
+    breaker.state = CircuitBreaker.HALF_OPEN
+    breaker.half_opened_at = time.monotonic()
+
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    breaker.half_opened_at -= 31
+    assert not breaker.allow_request()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.trial_calls == 0
@@ -0,0 +1,54 @@
+from flask import Blueprint, Flask
+
+from app.routes import analytics
+from app.services.analytics_cache import analytics_cache, cached
+from app.services.validation import common_success_response
+
+
+def make_app():
+    widgets = Blueprint("widgets", __name__)
+
+    @widgets.route("/one")
+    @cached("widget_table")
+    def one():
+        return common_success_response(data="one")
+
+    @widgets.route("/two")
+    @cached("widget_table")
+    def two():
+        return common_success_response(data="two")
+
+    app = Flask(__name__)
+    app.register_blueprint(widgets, url_prefix="/widgets")
+    app.register_blueprint(analytics.bp_analytics, url_prefix="/analytics")
+    return app
+
+
+def test_cached_widgets_keep_their_own_bodies(monkeypatch):
+    monkeypatch.setattr(analytics, "DASHBOARD_WIDGETS", {"one": "widgets.one", "two": "widgets.two"})
+    monkeypatch.setattr(analytics_cache, "ttl", 60.0)
+    analytics_cache.clear()
+    client = make_app().test_client()
+
+    # first call fills the cache, second is served from it
+    for _ in range(2):
+        widgets = client.get("/analytics/dashboard").get_json()["data"]["widgets"]
+        assert widgets["one"]["data"] == "one"
+        assert widgets["two"]["data"] == "two"
+
+    assert analytics_cache.snapshot()["hits"] >= 2
+
+
+def test_invalidation_drops_entries_and_refuses_stale_puts():
+    analytics_cache.clear()
+    generation = analytics_cache.generation(("widget_table", "other_table"))
+    analytics_cache.put("fresh", ("widget_table",), "body", generation[:1])
+    analytics_cache.put("unrelated", ("other_table",), "body", generation[1:])
+
+    analytics_cache.invalidate("widget_table")
+    assert analytics_cache.get("fresh") is None
+    assert analytics_cache.get("unrelated") == "body"
+
+    # computed before the write: not stored
+    analytics_cache.put("slow", ("widget_table",), "pre-write", generation[:1])
+    assert analytics_cache.get("slow") is None
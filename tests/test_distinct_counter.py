@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+
+from app.services.distinct_counter import ActiveAccountsTracker, HyperLogLog
+
+
+def test_estimate_stays_within_a_few_standard_errors():
+    sketch = HyperLogLog(12)
+    sketch.update(f"account-{i}" for i in range(20000))
+
+    assert abs(sketch.count() - 20000) / 20000 < 3 * sketch.relative_error
+
+
+def test_repeated_values_do_not_change_the_sketch():
+    once, repeated = HyperLogLog(12), HyperLogLog(12)
+    once.update(range(100))
+    for _ in range(5):
+        repeated.update(range(100))
+
+    assert (once.registers == repeated.registers).all()
+    # linear counting keeps small counts close
+    assert abs(repeated.count() - 100) <= 2
+
+
+def test_merged_sketches_do_not_double_count():
+    morning, evening = HyperLogLog(10), HyperLogLog(10)
+    morning.update(range(0, 6000))
+    evening.update(range(3000, 9000))
+
+    union = HyperLogLog.union([morning, evening], 10)
+    assert abs(union.count() - 9000) / 9000 < 3 * union.relative_error
+    assert HyperLogLog.from_bytes(union.to_bytes()).count() == union.count()
+
+
+def test_tracker_buckets_by_time_and_kind():
+    tracker = ActiveAccountsTracker(bucket_seconds=3600, retention=timedelta(hours=24), precision=10, overlap=timedelta(0))
+    moment = datetime(2026, 1, 1, 12, 30)
+    tracker.observe("a", "login", moment)
+    tracker.observe("a", "logout", moment)
+    tracker.observe("b", "logout", moment + timedelta(hours=1))
+
+    assert len(tracker.buckets) == 2
+    sketches = tracker.buckets[tracker._bucket(moment)]
+    assert (sketches["all"].count(), sketches["login"].count()) == (1, 1)
@@ -0,0 +1,64 @@
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+
+from app.config import config
+from app.routes import locations
+from app.services import database, equipment_health
+from app.services.analytics_cache import analytics_cache
+from app.services.equipment_health import (
+    AVR_INCOMPLETE, DISPLAY_CABLE_UNPLUGGED, HEADSET_INCOMPLETE, ISSUE_REPORTED, describe, evaluate,
+)
+
+COMPLETE = {
+    f"{component}_{field}": "x"
+    for component in ("system_unit", "monitor", "keyboard", "mouse")
+    for field in ("name", "serial_number")
+}
+
+
+def test_evaluate_flags_only_what_needs_attention():
+    assert evaluate({**COMPLETE, "plugged_power_cable": 1, "plugged_display_cable": None}) == 0
+
+    mask = evaluate({**COMPLETE, "plugged_display_cable": 0, "issue": "flickers", "requires_avr": 1})
+    assert mask == DISPLAY_CABLE_UNPLUGGED | ISSUE_REPORTED | AVR_INCOMPLETE
+    assert describe(mask) == ["display_cable_unplugged", "issue_reported", "avr_incomplete"]
+
+    assert evaluate({**COMPLETE, "requires_headset": "true", "headset_name": "h", "headset_serial_number": " "}) == HEADSET_INCOMPLETE
+
+
+def test_deleting_a_location_drops_its_health_rows_and_cached_health(monkeypatch):
+    executed = []
+
+    @contextmanager
+    def transaction():
+        yield SimpleNamespace(success=True, error=None)
+
+    def fetch_all(query, parameters=None, compact=False):
+        if "UNION" in query:
+            # health rows still list the sets the delete cascaded away
+            return {"success": True, "data": [{"id": "set-1"}, {"id": "set-2"}]}
+        return {"success": True, "data": []}
+
+    monkeypatch.setattr(database, "transaction", transaction)
+    monkeypatch.setattr(database, "fetch_all", fetch_all)
+    monkeypatch.setattr(database, "execute_single", lambda query, params=None: executed.append((query, params)) or {"success": True})
+
+    app = Flask(__name__)
+    app.config["JWT_SECRET_KEY"] = "test-secret-key-that-is-long-enough"
+    JWTManager(app)
+    app.register_blueprint(locations.bp_locations, url_prefix="/locations")
+    with app.app_context():
+        token = create_access_token("root", additional_claims={"acc": min(config.access_levels.values())})
+
+    generation = analytics_cache.generations.get("locations", 0)
+    response = app.test_client().delete("/locations/L", headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 200
+    assert "delete from locations" in executed[0][0]
+    health_delete = executed[1]
+    assert health_delete[0].startswith(f"DELETE FROM {equipment_health.HEALTH_TABLE}")
+    assert health_delete[1] == ("set-1", "set-2")
+    assert analytics_cache.generations["locations"] == generation + 1
@@ -0,0 +1,43 @@
+from datetime import datetime
+
+from app.services import database, event_stream
+from app.services.event_stream import Broadcaster
+
+
+def test_account_log_tail_pages_past_rows_sharing_one_timestamp(monkeypatch):
+    moment = datetime(2026, 1, 1, 12)
+    rows = [
+        {"id": row_id, "account_id": "acc", "username": f"user-{row_id}", "action": "login", "created_at": moment}
+        for row_id in range(1, 1201)
+    ]
+
+    def fetch_all(query, parameters=None, compact=False):
+        _, created_at, row_id, limit = parameters
+        after = [row for row in rows if (row["created_at"], row["id"]) > (created_at, row_id)]
+        return {"success": True, "data": after[:limit]}
+
+    broadcaster = Broadcaster(history_size=2000, client_queue_size=10, max_subscribers=1)
+    monkeypatch.setattr(database, "fetch_all", fetch_all)
+    monkeypatch.setattr(event_stream, "broadcaster", broadcaster)
+
+    watermark = event_stream._publish_account_logs_after((moment, 0))
+
+    assert watermark == (moment, 1200)
+    published = [data["username"] for _, _, data in broadcaster.history]
+    assert published == [f"user-{row_id}" for row_id in range(1, 1201)]
+
+    # nothing new: the watermark stays and nothing is published twice
+    assert event_stream._publish_account_logs_after(watermark) == watermark
+    assert len(broadcaster.history) == 1200
+
+
+def test_subscribers_past_the_cap_are_refused():
+    broadcaster = Broadcaster(history_size=10, client_queue_size=10, max_subscribers=1)
+
+    first, _ = broadcaster.subscribe(None)
+    second, _ = broadcaster.subscribe(None)
+    assert first is not None and second is None
+
+    broadcaster.unsubscribe(first)
+    third, _ = broadcaster.subscribe(None)
+    assert third is not None
@@ -0,0 +1,65 @@
+from datetime import date, datetime
+
+import pytest
+
+from app.services import database, timeseries
+from app.services.timeseries import bucket_axis, fetch_timeseries, parse_range
+
+
+@pytest.fixture
+def rows(monkeypatch):
+    returned = []
+
+    def fetch_all(query, parameters=None, compact=False):
+        return {"success": True, "data": {"columns": [], "rows": returned}}
+
+    monkeypatch.setattr(database, "fetch_all", fetch_all)
+    monkeypatch.setattr(timeseries, "log_relation", lambda source, start_at, end_at: (source, ()))
+    return returned
+
+
+def test_daily_series_are_zero_filled_per_group(rows):
+    rows.extend([
+        (date(2026, 1, 5), "login", 2),
+        (date(2026, 1, 7), "logout", 1),
+        (date(2026, 1, 5), "logout", 4),
+    ])
+
+    data = fetch_timeseries("account_logs", datetime(2026, 1, 5), datetime(2026, 1, 8), "day", "action")["data"]
+
+    assert data["labels"] == ["2026-01-05", "2026-01-06", "2026-01-07"]
+    assert data["datasets"] == [
+        {"label": "login", "data": [2, 0, 0]},
+        {"label": "logout", "data": [4, 0, 1]},
+    ]
+
+
+def test_hourly_rows_fold_into_weeks_starting_monday(rows):
+    rows.extend([
+        (date(2026, 1, 7), 23, 3),
+        (date(2026, 1, 11), 0, 1),
+        (date(2026, 1, 12), 5, 2),
+    ])
+
+    data = fetch_timeseries("account_logs", datetime(2026, 1, 7), datetime(2026, 1, 20), "week")["data"]
+
+    assert data["labels"] == ["2026-01-05", "2026-01-12", "2026-01-19"]
+    assert data["datasets"] == [{"label": "total", "data": [4, 2, 0]}]
+
+
+def test_empty_range_still_has_every_bucket(rows):
+    data = fetch_timeseries("account_logs", datetime(2026, 1, 1, 22), datetime(2026, 1, 2, 1), "hour")["data"]
+
+    assert data["labels"] == ["2026-01-01T22:00", "2026-01-01T23:00", "2026-01-02T00:00"]
+    assert data["datasets"] == [{"label": "total", "data": [0, 0, 0]}]
+
+
+def test_month_axis_includes_the_partial_last_month():
+    axis = bucket_axis(datetime(2026, 1, 31), datetime(2026, 3, 1, 0, 0, 1), "month")
+    assert [str(month) for month in axis] == ["2026-01", "2026-02", "2026-03"]
+
+
+def test_date_only_end_includes_that_day():
+    assert parse_range("2026-01-01", "2026-01-03") == (datetime(2026, 1, 1), datetime(2026, 1, 4))
+    with pytest.raises(ValueError):
+        parse_range("2026-01-03", "2026-01-02T00:00")
@@ -0,0 +1,19 @@
+from datetime import datetime
+
+from app.services.validation import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trips_timestamp_and_id():
+    moment = datetime(2026, 1, 2, 3, 4, 5, 678901)
+
+    for row_id in (1, 9007199254740993, "set-1"):
+        cursor = encode_cursor(moment, row_id)
+        assert "=" not in cursor
+        assert decode_cursor(cursor) == (moment, row_id)
+
+
+def test_malformed_cursors_decode_to_none():
+    assert decode_cursor("not-a-cursor") is None
+    assert decode_cursor(encode_cursor(datetime(2026, 1, 1), 1)[:-3]) is None
+    # valid base64 and JSON, wrong shape
+    assert decode_cursor("WzFd") is None